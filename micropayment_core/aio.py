@@ -0,0 +1,177 @@
+# coding: utf-8
+# Copyright (c) 2016 Fabian Barkhau <fabian.barkhau@gmail.com>
+# License: MIT (see LICENSE file)
+
+
+import asyncio
+from pycoin.tx import Tx
+from micropayment_core import scripts
+from micropayment_core import util
+
+
+# Asyncio forms of load_tx and the scripts.sign_* functions, requires
+# python 3.5.2 or later.
+#
+# get_txs arguments are coroutine functions taking a list of txids and
+# returning a dict txid -> raw transaction, like the get_txs_func of the
+# sync api. Input transactions are fetched without blocking the event loop
+# and the sync signing code runs on the prefetched transactions in the
+# loop's default executor, so signing does not block the loop either. Outputs
+# in the util.load_tx output cache are not fetched at all. Wrap the fetch
+# coroutine in a TxFetcher so concurrent signing requests share their
+# fetches.
+
+
+class TxFetcher(object):
+    """ Coalesces concurrent transaction fetches into shared requests.
+
+    Txids requested in the same event loop iteration are fetched with a
+    single get_txs call, and a txid already being fetched is not
+    requested again. Use from a single event loop.
+
+    Args:
+        get_txs (coroutine function): txid list -> raw transactions dict.
+    """
+
+    def __init__(self, get_txs):
+        self._get_txs = get_txs
+        self._futures = {}  # txid -> future of queued or running fetches
+        self._queued = []
+        self._tasks = set()  # running fetches, the loop only keeps weakrefs
+        self.requests = 0
+
+    async def __call__(self, txids):
+        """ Get raw transactions for txids, missing ones are left out. """
+        loop = asyncio.get_event_loop()
+        futures = []
+        for txid in txids:
+            future = self._futures.get(txid)
+            if future is None:
+                future = loop.create_future()
+                self._futures[txid] = future
+                if not self._queued:
+                    loop.call_soon(self._flush)
+                self._queued.append(txid)
+            futures.append(future)
+        rawtxs = {}
+        for txid, future in zip(txids, futures):
+            rawtx = await asyncio.shield(future)  # others may share it
+            if rawtx is not None:
+                rawtxs[txid] = rawtx
+        return rawtxs
+
+    def _flush(self):
+        txids, self._queued = self._queued, []
+        self.requests += 1
+        task = asyncio.ensure_future(self._fetch(txids))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fetch(self, txids):
+        futures = [self._futures[txid] for txid in txids]
+        try:
+            rawtxs = await self._get_txs(txids)
+            for txid, future in zip(txids, futures):
+                future.set_result(rawtxs.get(txid))
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            for txid, future in zip(txids, futures):
+                if not future.done():  # fetch was cancelled
+                    future.cancel()
+                del self._futures[txid]
+
+
+async def load_tx_async(get_txs, rawtx, txout_cache=None):
+    """ Load transaction and its unspent outputs, see util.load_tx.
+
+    Args:
+        get_txs (coroutine function): txid list -> raw transactions dict.
+        rawtx (str): Raw transaction to load.
+        txout_cache (LRUCache): Output cache, the util one if None.
+
+    Return:
+        pycoin.tx.Tx: Transaction with its unspents set.
+    """
+    Tx.ALLOW_SEGWIT = False  # FIXME remove on next pycoin version
+    tx = Tx.from_hex(rawtx)
+    txouts, txids = util.cached_txouts(tx, txout_cache)
+    utxo_rawtxs = await get_txs(txids) if txids else {}
+    return util.add_unspents(tx, txouts, utxo_rawtxs, txout_cache)
+
+
+async def sign_deposit_async(get_txs, payer_wif, rawtx):
+    """ Async form of scripts.sign_deposit, see load_tx_async. """
+    get_txs_func = await _prefetch(get_txs, rawtx)
+    return await _run(scripts.sign_deposit, get_txs_func, payer_wif, rawtx)
+
+
+async def sign_created_commit_async(get_txs, payer_wif, rawtx,
+                                    deposit_script_hex):
+    """ Async form of scripts.sign_created_commit, see load_tx_async. """
+    get_txs_func = await _prefetch(get_txs, rawtx)
+    return await _run(scripts.sign_created_commit, get_txs_func,
+                      payer_wif, rawtx, deposit_script_hex)
+
+
+async def sign_finalize_commit_async(get_txs, payee_wif, rawtx,
+                                     deposit_script_hex):
+    """ Async form of scripts.sign_finalize_commit, see load_tx_async. """
+    get_txs_func = await _prefetch(get_txs, rawtx)
+    return await _run(scripts.sign_finalize_commit, get_txs_func,
+                      payee_wif, rawtx, deposit_script_hex)
+
+
+async def sign_revoke_recover_async(get_txs, payer_wif, rawtx,
+                                    commit_script_hex, revoke_secret):
+    """ Async form of scripts.sign_revoke_recover, see load_tx_async. """
+    get_txs_func = await _prefetch(get_txs, rawtx)
+    return await _run(scripts.sign_revoke_recover, get_txs_func,
+                      payer_wif, rawtx, commit_script_hex, revoke_secret)
+
+
+async def sign_payout_recover_async(get_txs, payee_wif, rawtx,
+                                    commit_script_hex, spend_secret):
+    """ Async form of scripts.sign_payout_recover, see load_tx_async. """
+    get_txs_func = await _prefetch(get_txs, rawtx)
+    return await _run(scripts.sign_payout_recover, get_txs_func,
+                      payee_wif, rawtx, commit_script_hex, spend_secret)
+
+
+async def sign_change_recover_async(get_txs, payer_wif, rawtx,
+                                    deposit_script_hex, spend_secret):
+    """ Async form of scripts.sign_change_recover, see load_tx_async. """
+    get_txs_func = await _prefetch(get_txs, rawtx)
+    return await _run(scripts.sign_change_recover, get_txs_func,
+                      payer_wif, rawtx, deposit_script_hex, spend_secret)
+
+
+async def sign_expire_recover_async(get_txs, payer_wif, rawtx,
+                                    deposit_script_hex):
+    """ Async form of scripts.sign_expire_recover, see load_tx_async. """
+    get_txs_func = await _prefetch(get_txs, rawtx)
+    return await _run(scripts.sign_expire_recover, get_txs_func,
+                      payer_wif, rawtx, deposit_script_hex)
+
+
+async def _prefetch(get_txs, rawtx):
+    # load the inputs so their outputs are cached, the returned sync
+    # get_txs_func serves the fetched transactions for the rest
+    fetched = {}
+
+    async def fetch(txids):
+        fetched.update(await get_txs(txids))
+        return fetched
+    await load_tx_async(fetch, rawtx)
+
+    def get_txs_func(txids):
+        return dict((txid, fetched[txid]) for txid in txids if txid in fetched)
+    return get_txs_func
+
+
+def _run(func, *args):
+    # signing is cpu bound, run it in the default executor
+    loop = asyncio.get_event_loop()
+    return loop.run_in_executor(None, func, *args)
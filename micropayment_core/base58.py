@@ -0,0 +1,188 @@
+# coding: utf-8
+# Copyright (c) 2016 Fabian Barkhau <fabian.barkhau@gmail.com>
+# License: MIT (see LICENSE file)
+
+
+from pycoin.encoding import EncodingError, double_sha256
+from pycoin.serialize import b2h, h2b
+from micropayment_core import util
+
+
+# Base58 and base58check codec, same results as the pycoin.encoding ones.
+#
+# Values are converted in limbs of ten base58 digits, so there is one big
+# integer divmod or multiplication per ten characters instead of one per
+# character, the digits of a limb are converted with small integers.
+#
+# Decoding base58check can be memoized in a small cache, as servers decode
+# the same few wifs and addresses again and again. It is opt-in, as cached
+# wifs keep their secrets in memory.
+
+
+_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+_LOOKUP = dict((c, i) for i, c in enumerate(_ALPHABET))
+_PAIRS = [a + b for a in _ALPHABET for b in _ALPHABET]  # 2 digits per entry
+_LIMB_DIGITS = 10
+_LIMB = 58 ** _LIMB_DIGITS
+_DECODE_CACHE = None  # opt-in, see enable_decode_cache
+
+
+def enable_decode_cache(maxsize=256):
+    """ Memoize decoded base58check strings.
+
+    Disabled by default, as decoded wifs are secrets. Replaces the current
+    cache with an empty one.
+
+    Args:
+        maxsize (int): Maximum number of decoded strings cached.
+    """
+    global _DECODE_CACHE
+    _DECODE_CACHE = util.LRUCache(maxsize=maxsize)
+
+
+def disable_decode_cache():
+    """ Disable the decode cache and drop all cached strings. """
+    global _DECODE_CACHE
+    cache, _DECODE_CACHE = _DECODE_CACHE, None
+    if cache is not None:
+        cache.clear()
+
+
+def clear_decode_cache():
+    """ Drop all cached strings, the cache stays enabled. """
+    cache = _DECODE_CACHE
+    if cache is not None:
+        cache.clear()
+
+
+def decode_cache_stats():
+    """ Return decode cache statistics dict or None if disabled. """
+    cache = _DECODE_CACHE
+    return cache.stats() if cache is not None else None
+
+
+def b2a_base58(data):
+    """ Encode binary data as base58.
+
+    Args:
+        data (bytes): Data to encode.
+
+    Return:
+        str: Base58 encoded data.
+    """
+    data = bytes(data)
+    stripped = data.lstrip(b"\0")
+    value = int(b2h(stripped), 16) if stripped else 0
+    parts = []
+    while value:
+        value, limb = divmod(value, _LIMB)
+        for _ in range(_LIMB_DIGITS // 2):
+            limb, pair = divmod(limb, 3364)
+            parts.append(_PAIRS[pair])
+    encoded = "".join(reversed(parts)).lstrip("1")
+    return "1" * (len(data) - len(stripped)) + encoded
+
+
+def a2b_base58(text):
+    """ Decode base58 encoded data.
+
+    Args:
+        text (str): Base58 encoded data.
+
+    Return:
+        bytes: Decoded data.
+
+    Raises:
+        EncodingError: If text has characters outside the base58 alphabet.
+    """
+    stripped = text.lstrip("1")
+    value = 0
+    start, end = 0, len(stripped) % _LIMB_DIGITS or _LIMB_DIGITS
+    lookup = _LOOKUP
+    try:
+        while start < len(stripped):
+            limb = 0
+            for char in stripped[start:end]:
+                limb = limb * 58 + lookup[char]
+            value = value * 58 ** (end - start) + limb
+            start, end = end, end + _LIMB_DIGITS
+    except KeyError:
+        raise EncodingError("invalid base58 string: {0}".format(text))
+    zeros = b"\0" * (len(text) - len(stripped))
+    if not value:
+        return zeros
+    hexdata = "%x" % value
+    return zeros + h2b("0" * (len(hexdata) % 2) + hexdata)
+
+
+def b2a_hashed_base58(data):
+    """ Encode binary data as base58check with a 4Byte checksum.
+
+    Args:
+        data (bytes): Data to encode.
+
+    Return:
+        str: Base58check encoded data.
+    """
+    data = bytes(data)
+    return b2a_base58(data + double_sha256(data)[:4])
+
+
+def a2b_hashed_base58(text):
+    """ Decode base58check data and validate its checksum.
+
+    Args:
+        text (str): Base58check encoded data.
+
+    Return:
+        bytes: Decoded data without checksum.
+
+    Raises:
+        EncodingError: If text is not valid base58check.
+    """
+    cache = _DECODE_CACHE
+    if cache is not None:
+        data = cache.get(text)
+        if data is not None:
+            return data
+    data = _a2b_hashed_base58(text)
+    if cache is not None:
+        cache.put(text, data)
+    return data
+
+
+def b2a_hashed_base58_batch(items):
+    """ Encode many binary data items as base58check.
+
+    Args:
+        items (list): Data to encode.
+
+    Return:
+        list: Base58check encoded data in the same order.
+    """
+    return [b2a_hashed_base58(data) for data in items]
+
+
+def a2b_hashed_base58_batch(texts):
+    """ Decode many base58check strings, see a2b_hashed_base58.
+
+    Bypasses the decode cache so bulk input doesn't evict hot entries.
+
+    Args:
+        texts (list): Base58check encoded data.
+
+    Return:
+        list: Decoded data without checksums in the same order.
+
+    Raises:
+        EncodingError: If any text is not valid base58check.
+    """
+    return [_a2b_hashed_base58(text) for text in texts]
+
+
+def _a2b_hashed_base58(text):
+    data = a2b_base58(text)
+    data, checksum = data[:-4], data[-4:]
+    if double_sha256(data)[:4] != checksum:
+        raise EncodingError("hashed base58 has bad checksum {0}".format(text))
+    return data
@@ -0,0 +1,651 @@
+# coding: utf-8
+# Copyright (c) 2016 Fabian Barkhau <fabian.barkhau@gmail.com>
+# License: MIT (see LICENSE file)
+
+
+import collections
+import hashlib
+import threading
+from pycoin.ecdsa import deterministic_generate_k
+from pycoin.encoding import to_bytes_32, from_bytes_32
+from pycoin.serialize import h2b
+from pycoin.tx.script.der import sigencode_der
+from .util import LRUCache, write_file
+
+
+# secp256k1 elliptic curve engine used for key derivation, signing and
+# verification. The curve operations are done by a backend: a native one
+# when importable (see CoincurveBackend), else the pure python one.
+#
+# Signing always uses the RFC6979 nonce and formula of pycoin.ecdsa.sign,
+# the backend only does the point multiplication, so signatures are byte
+# identical to pycoin whichever backend is used.
+#
+# Points are (x, y) affine tuples or (X, Y, Z) jacobian tuples with
+# x = X / Z^2 and y = Y / Z^3, the point at infinity has Z == 0.
+#
+# Multiplications by the generator use a fixed base table holding
+# d * 2^(window * i) * G for every window digit d and window position i,
+# built on first use or loaded from the file set with
+# set_generator_table_file.
+
+
+P = 0xfffffffffffffffffffffffffffffffffffffffffffffffffffffffefffffc2f
+N = 0xfffffffffffffffffffffffffffffffebaaedce6af48a03bbfd25e8cd0364141
+G = (
+    0x79be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b16f81798,
+    0x483ada7726a3c4655da4fbfc0e1108a8fd17b448a68554199c47d08ffb10d4b8
+)
+
+_INFINITY = (0, 1, 0)
+_POINT_WINDOW = 5  # wNAF window for other points, table built per call
+_G_TABLE_WINDOW = 8  # bits per fixed base table row
+_G_TABLE_MAGIC = b"MPCGTAB1"
+
+# sha256 of the encoded table points, tables are deterministic so a cache
+# file is only used if it holds exactly the expected points
+_G_TABLE_SHA256 = h2b(
+    "063ba44b38195e8af0d2eb0e2c570d9939e4df16633c19b7c03e54d40eea92dd"
+)
+
+_G_TABLE = None  # rows of affine points, see _generator_table
+_G_TABLE_FILE = None
+_G_TABLE_LOCK = threading.Lock()
+
+_KEY_TABLE_WINDOW = 4  # bits per per key table row, 960 points per key
+_KEY_TABLES = LRUCache(maxsize=64)  # public pair -> fixed base table
+_KEY_USES = LRUCache(maxsize=64 * 64)  # public pair -> verifications
+_HOT_KEY_USES = 8
+
+
+def public_pair(secret_exponent):
+    """ Get the public pair for a secret exponent.
+
+    Args:
+        secret_exponent (int): Private key in range [1, N - 1].
+
+    Return:
+        tuple: (x, y) public pair.
+
+    Raises:
+        ValueError: If the secret exponent is out of range.
+    """
+    if not 0 < secret_exponent < N:
+        raise ValueError("secret exponent out of range")
+    return _BACKEND.public_pair(secret_exponent)
+
+
+def public_pairs(secret_exponents):
+    """ Get the public pairs for many secret exponents.
+
+    Same result as public_pair for each item, the python backend converts
+    all points to affine coordinates with a single field inversion.
+
+    Args:
+        secret_exponents (list): Private keys in range [1, N - 1].
+
+    Return:
+        list: (x, y) public pairs.
+
+    Raises:
+        ValueError: If a secret exponent is out of range.
+    """
+    secret_exponents = list(secret_exponents)
+    for secret_exponent in secret_exponents:
+        if not 0 < secret_exponent < N:
+            raise ValueError("secret exponent out of range")
+    backend_public_pairs = getattr(_BACKEND, "public_pairs", None)
+    if backend_public_pairs is not None:
+        return backend_public_pairs(secret_exponents)
+    return [_BACKEND.public_pair(se) for se in secret_exponents]
+
+
+def public_pair_for_x(x, is_even):
+    """ Get the public pair with the given x coordinate and y parity.
+
+    Args:
+        x (int): X coordinate.
+        is_even (bool): True for the point with an even y coordinate.
+
+    Return:
+        tuple: (x, y) public pair.
+
+    Raises:
+        ValueError: If no curve point has the x coordinate.
+    """
+    if not 0 <= x < P:
+        raise ValueError("x coordinate out of range")
+    y_squared = (x * x * x + 7) % P
+    y = pow(y_squared, (P + 1) // 4, P)  # square root as P % 4 == 3
+    if (y * y) % P != y_squared:
+        raise ValueError("x coordinate not on the curve")
+    if bool(y & 1) == is_even:
+        y = P - y
+    return x, y
+
+
+def sign(secret_exponent, val):
+    """ Sign an integer value, same result as pycoin.ecdsa.sign.
+
+    Args:
+        secret_exponent (int): Private key in range [1, N - 1].
+        val (int): Value to sign, usually a 32Byte hash.
+
+    Return:
+        tuple: (r, s) signature values.
+    """
+    k = deterministic_generate_k(N, secret_exponent, val)
+    r = _BACKEND.public_pair(k)[0]
+    if r == 0:
+        raise RuntimeError("amazingly unlucky random number r")
+    s = (_inverse(k, N) * (val + (secret_exponent * r) % N)) % N
+    if s == 0:
+        raise RuntimeError("amazingly unlucky random number s")
+    return r, s
+
+
+def verify(public_pair, val, signature):
+    """ Verify a signature, same result as pycoin.ecdsa.verify.
+
+    Args:
+        public_pair (tuple): (x, y) public pair of the signer.
+        val (int): Signed value, usually a 32Byte hash.
+        signature (tuple): (r, s) signature values.
+
+    Return:
+        bool: True if the signature is valid.
+    """
+    r, s = signature
+    if not (0 < r < N and 0 < s < N):
+        return False
+    if not is_on_curve(public_pair):
+        return False
+    return _BACKEND.verify(public_pair, val, (r, s))
+
+
+def verify_batch(items):
+    """ Verify many signatures, same result as verify for each item.
+
+    Args:
+        items (list): (public_pair, val, (r, s)) tuples.
+
+    Return:
+        list: True for each valid signature, False otherwise.
+    """
+    results = [False] * len(items)
+    positions, checked = [], []
+    for position, item in enumerate(items):
+        public_pair, val, (r, s) = item
+        if 0 < r < N and 0 < s < N and is_on_curve(public_pair):
+            positions.append(position)
+            checked.append(item)
+    backend_verify_batch = getattr(_BACKEND, "verify_batch", None)
+    if backend_verify_batch is not None:
+        valid = backend_verify_batch(checked)
+    else:
+        valid = [_BACKEND.verify(*item) for item in checked]
+    for position, result in zip(positions, valid):
+        results[position] = result
+    return results
+
+
+def is_on_curve(point):
+    """ Return True if the (x, y) point is on the curve. """
+    x, y = point
+    return 0 <= x < P and 0 <= y < P and (y * y - x * x * x - 7) % P == 0
+
+
+def set_generator_table_file(path):
+    """ Persist the fixed base generator table in a cache file.
+
+    The table is loaded from the file on first use if it exists and is
+    valid, else it is computed and written to the file. Invalid files are
+    ignored and replaced.
+
+    Args:
+        path (str): Cache file path, None to only keep the table in memory.
+    """
+    global _G_TABLE_FILE
+    _G_TABLE_FILE = path
+
+
+def generator_mul(scalar):
+    """ Multiply the generator with the fixed base table.
+
+    Args:
+        scalar (int): Scalar in range [0, N - 1].
+
+    Return:
+        tuple: (X, Y, Z) jacobian point scalar * G.
+    """
+    return _fixed_base_mul(_generator_table(), _G_TABLE_WINDOW, scalar)
+
+
+def enable_key_tables(maxsize=64, hot_key_uses=8):
+    """ Precompute verification tables for frequently verified keys.
+
+    Once a public key was used in hot_key_uses verifications, a fixed base
+    table is built for it and kept in a bounded LRU cache, which makes
+    later multiplications by the key several times cheaper. Only used by
+    the python backend. Enabled by default.
+
+    Args:
+        maxsize (int): Maximum number of key tables cached (about 150KB
+                       each).
+        hot_key_uses (int): Verifications before a table is built.
+    """
+    global _KEY_TABLES, _KEY_USES, _HOT_KEY_USES
+    _KEY_TABLES = LRUCache(maxsize=maxsize)
+    _KEY_USES = LRUCache(maxsize=maxsize * 64)
+    _HOT_KEY_USES = hot_key_uses
+
+
+def disable_key_tables():
+    """ Disable and drop the per key verification tables. """
+    global _KEY_TABLES, _KEY_USES
+    _KEY_TABLES = None
+    _KEY_USES = None
+
+
+def key_tables_stats():
+    """ Return per key verification table cache statistics.
+
+    Return:
+        dict: hits, misses, evictions, size and maxsize or None if disabled.
+    """
+    cache = _KEY_TABLES
+    return cache.stats() if cache is not None else None
+
+
+def get_backend():
+    """ Return the curve backend in use. """
+    return _BACKEND
+
+
+def set_backend(backend=None):
+    """ Set the curve backend.
+
+    Args:
+        backend: Object with public_pair(secret_exponent) and
+                 verify(public_pair, val, signature) methods taking
+                 in range arguments, optionally a verify_batch(items)
+                 method, the default backend if None.
+    """
+    global _BACKEND
+    _BACKEND = backend if backend is not None else _default_backend()
+
+
+class PythonBackend(object):
+    """ Pure python backend using jacobian coordinates and wNAF.
+
+    Multiplications by the generator use the fixed base table, other points
+    are multiplied with wNAF. Verification checks r without an inversion,
+    batches share one inversion for all s values and one wNAF table per
+    distinct public key.
+    """
+
+    name = "python"
+
+    def public_pair(self, secret_exponent):
+        return _to_affine(generator_mul(secret_exponent))
+
+    def public_pairs(self, secret_exponents):
+        return _batch_to_affine([generator_mul(se) for se in secret_exponents])
+
+    def verify(self, public_pair, val, signature):
+        return self.verify_batch([(public_pair, val, signature)])[0]
+
+    def verify_batch(self, items):
+        if not items:
+            return []
+        s_inverses = _batch_inverse([s for _, _, (r, s) in items], N)
+        key_tables, wnaf_keys = _key_tables(
+            [public_pair for public_pair, _, _ in items]
+        )
+        wnaf_tables = dict(zip(wnaf_keys,
+                               _odd_multiples(wnaf_keys, _POINT_WINDOW)))
+        results = []
+        for (public_pair, val, (r, s)), c in zip(items, s_inverses):
+            u1 = (val * c) % N
+            u2 = (r * c) % N
+            key_table = key_tables.get(public_pair)
+            if key_table is not None:
+                u2_point = _fixed_base_mul(key_table, _KEY_TABLE_WINDOW, u2)
+            else:
+                u2_point = _mul_wnaf([
+                    (wnaf_tables[public_pair], _wnaf(u2, _POINT_WINDOW)),
+                ])
+            point = _add(generator_mul(u1), u2_point)
+            results.append(_has_x_mod_n(point, r))
+        return results
+
+
+class CoincurveBackend(object):
+    """ Native libsecp256k1 backend, requires the coincurve package.
+
+    Raises:
+        ImportError: If coincurve is not installed.
+    """
+
+    name = "coincurve"
+
+    def __init__(self):
+        import coincurve
+        self._coincurve = coincurve
+        self._python = PythonBackend()
+        self._public_keys = LRUCache(maxsize=4096)  # public pair -> key
+
+    def public_pair(self, secret_exponent):
+        public_key = self._coincurve.PublicKey.from_secret(
+            to_bytes_32(secret_exponent)
+        )
+        sec = public_key.format(compressed=False)
+        return from_bytes_32(sec[1:33]), from_bytes_32(sec[33:65])
+
+    def verify(self, public_pair, val, signature):
+        return self.verify_batch([(public_pair, val, signature)])[0]
+
+    def verify_batch(self, items):
+        public_keys = self._public_keys
+        results = []
+        for public_pair, val, (r, s) in items:
+            if val >> 256:  # libsecp256k1 only takes 32Byte values
+                results.append(self._python.verify(public_pair, val, (r, s)))
+                continue
+            if s + s > N:  # libsecp256k1 only accepts low s values
+                s = N - s
+            public_key = public_keys.get(public_pair)
+            if public_key is None:
+                sec = (b"\x04" + to_bytes_32(public_pair[0]) +
+                       to_bytes_32(public_pair[1]))
+                public_key = self._coincurve.PublicKey(sec)
+                public_keys.put(public_pair, public_key)
+            results.append(public_key.verify(
+                sigencode_der(r, s), to_bytes_32(val), hasher=None
+            ))
+        return results
+
+
+def _default_backend():
+    try:
+        return CoincurveBackend()
+    except ImportError:
+        return PythonBackend()
+
+
+try:
+    pow(2, -1, 3)
+except (TypeError, ValueError):  # pragma: no cover, python < 3.8
+    def _inverse(value, modulus):
+        return pow(value, modulus - 2, modulus)  # modulus is prime
+else:
+    def _inverse(value, modulus):
+        return pow(value, -1, modulus)
+
+
+def _generator_table():
+    table = _G_TABLE
+    if table is not None:
+        return table
+    with _G_TABLE_LOCK:
+        if _G_TABLE is None:
+            _set_generator_table(_load_generator_table())
+        return _G_TABLE
+
+
+def _set_generator_table(table):
+    global _G_TABLE
+    _G_TABLE = table
+
+
+def _load_generator_table():
+    path = _G_TABLE_FILE
+    if path is not None:
+        try:
+            with open(path, "rb") as f:
+                table = _decode_generator_table(f.read())
+            if table is not None:
+                return table
+        except (IOError, OSError):
+            pass
+    table = _build_generator_table()
+    if path is not None:
+        try:
+            write_file(path, _encode_generator_table(table))
+        except (IOError, OSError):
+            pass  # cache file is optional
+    return table
+
+
+def _build_generator_table():
+    return _fixed_base_table(G, _G_TABLE_WINDOW)
+
+
+def _key_tables(public_pairs):
+    # fixed base tables of hot keys and the other keys of a batch
+    tables = _KEY_TABLES
+    uses = _KEY_USES
+    if tables is None or uses is None:
+        return {}, list(set(public_pairs))
+    key_tables, other_keys = {}, []
+    for public_pair, count in collections.Counter(public_pairs).items():
+        table = tables.get(public_pair)
+        if table is None:
+            count += uses.get(public_pair, 0)
+            if count >= _HOT_KEY_USES:
+                table = _fixed_base_table(public_pair, _KEY_TABLE_WINDOW)
+                tables.put(public_pair, table)
+                uses.pop(public_pair)
+            else:
+                uses.put(public_pair, count)
+        if table is not None:
+            key_tables[public_pair] = table
+        else:
+            other_keys.append(public_pair)
+    return key_tables, other_keys
+
+
+def _fixed_base_table(base, window):
+    # rows of d * 2^(window * i) * base for d in [1, 2^window - 1]
+    rows = []
+    for _ in range((256 + window - 1) // window):
+        row = [(base[0], base[1], 1)]
+        for _ in range((1 << window) - 2):
+            row.append(_add_affine(row[-1], base))
+        base = _to_affine(_add_affine(row[-1], base))
+        rows.append(_batch_to_affine(row))
+    return rows
+
+
+def _fixed_base_mul(table, window, scalar):
+    result = _INFINITY
+    mask = (1 << window) - 1
+    for row in table:
+        digit = scalar & mask
+        if digit:
+            result = _add_affine(result, row[digit - 1])
+        scalar >>= window
+        if not scalar:
+            break
+    return result
+
+
+def _encode_generator_table(table):
+    return _G_TABLE_MAGIC + b"".join(
+        to_bytes_32(x) + to_bytes_32(y) for row in table for x, y in row
+    )
+
+
+def _decode_generator_table(data):
+    # None unless the data is exactly the expected table
+    body = data[len(_G_TABLE_MAGIC):]
+    if not data.startswith(_G_TABLE_MAGIC):
+        return None
+    if hashlib.sha256(body).digest() != _G_TABLE_SHA256:
+        return None
+    row_size = (1 << _G_TABLE_WINDOW) - 1
+    points = [
+        (from_bytes_32(body[i:i + 32]), from_bytes_32(body[i + 32:i + 64]))
+        for i in range(0, len(body), 64)
+    ]
+    return [points[i:i + row_size] for i in range(0, len(points), row_size)]
+
+
+def _wnaf(scalar, window):
+    # little endian digits, odd digits in (-2^(window-1), 2^(window-1))
+    digits = []
+    width = 1 << window
+    half = width >> 1
+    while scalar:
+        if scalar & 1:
+            digit = scalar & (width - 1)
+            if digit >= half:
+                digit -= width
+            scalar -= digit
+        else:
+            digit = 0
+        digits.append(digit)
+        scalar >>= 1
+    return digits
+
+
+def _mul_wnaf(terms):
+    # sum of scalar * point for (odd multiples table, wNAF digits) terms,
+    # sharing one doubling chain between all terms
+    length = max(len(digits) for table, digits in terms)
+    result = _INFINITY
+    for i in range(length - 1, -1, -1):
+        result = _double(result)
+        for table, digits in terms:
+            if i >= len(digits):
+                continue
+            digit = digits[i]
+            if digit > 0:
+                result = _add_affine(result, table[digit >> 1])
+            elif digit < 0:
+                x, y = table[(-digit) >> 1]
+                result = _add_affine(result, (x, P - y))
+    return result
+
+
+def _odd_multiples(points, window):
+    # per point: point, 3 * point, ... (2^(window-1) - 1) * point as affine
+    count = 1 << (window - 2)
+    doubles = _batch_to_affine([_double((x, y, 1)) for x, y in points])
+    multiples = []
+    for (x, y), double in zip(points, doubles):
+        multiples.append((x, y, 1))
+        for _ in range(count - 1):
+            multiples.append(_add_affine(multiples[-1], double))
+    multiples = _batch_to_affine(multiples)
+    return [multiples[i:i + count] for i in range(0, len(multiples), count)]
+
+
+def _has_x_mod_n(point, r):
+    # x / Z^2 mod N == r, x < P so only r and r + N are candidates
+    X, Y, Z = point
+    if not Z:
+        return False
+    zz = (Z * Z) % P
+    if X == (r * zz) % P:
+        return True
+    return r + N < P and X == ((r + N) * zz) % P
+
+
+def _double(point):
+    X, Y, Z = point
+    if not Z or not Y:
+        return _INFINITY
+    YY = (Y * Y) % P
+    S = (4 * X * YY) % P
+    M = (3 * X * X) % P
+    X3 = (M * M - 2 * S) % P
+    Y3 = (M * (S - X3) - 8 * YY * YY) % P
+    Z3 = (2 * Y * Z) % P
+    return X3, Y3, Z3
+
+
+def _add(point_a, point_b):
+    X1, Y1, Z1 = point_a
+    X2, Y2, Z2 = point_b
+    if not Z1:
+        return point_b
+    if not Z2:
+        return point_a
+    Z1Z1 = (Z1 * Z1) % P
+    Z2Z2 = (Z2 * Z2) % P
+    U1 = (X1 * Z2Z2) % P
+    U2 = (X2 * Z1Z1) % P
+    S1 = (Y1 * Z2 * Z2Z2) % P
+    S2 = (Y2 * Z1 * Z1Z1) % P
+    H = (U2 - U1) % P
+    R = (S2 - S1) % P
+    if not H:
+        return _double(point_a) if not R else _INFINITY
+    HH = (H * H) % P
+    HHH = (H * HH) % P
+    V = (U1 * HH) % P
+    X3 = (R * R - HHH - 2 * V) % P
+    Y3 = (R * (V - X3) - S1 * HHH) % P
+    Z3 = (Z1 * Z2 * H) % P
+    return X3, Y3, Z3
+
+
+def _add_affine(point, affine):
+    X1, Y1, Z1 = point
+    x2, y2 = affine
+    if not Z1:
+        return x2, y2, 1
+    Z1Z1 = (Z1 * Z1) % P
+    U2 = (x2 * Z1Z1) % P
+    S2 = (y2 * Z1 * Z1Z1) % P
+    H = (U2 - X1) % P
+    R = (S2 - Y1) % P
+    if not H:
+        return _double(point) if not R else _INFINITY
+    HH = (H * H) % P
+    HHH = (H * HH) % P
+    V = (X1 * HH) % P
+    X3 = (R * R - HHH - 2 * V) % P
+    Y3 = (R * (V - X3) - Y1 * HHH) % P
+    Z3 = (Z1 * H) % P
+    return X3, Y3, Z3
+
+
+def _to_affine(point):
+    X, Y, Z = point
+    if not Z:
+        raise ValueError("point at infinity")
+    z_inv = _inverse(Z, P)
+    zz_inv = (z_inv * z_inv) % P
+    return (X * zz_inv) % P, (Y * zz_inv * z_inv) % P
+
+
+def _batch_to_affine(points):
+    result = []
+    z_inverses = _batch_inverse([Z for X, Y, Z in points], P)
+    for (X, Y, Z), z_inv in zip(points, z_inverses):
+        zz_inv = (z_inv * z_inv) % P
+        result.append(((X * zz_inv) % P, (Y * zz_inv * z_inv) % P))
+    return result
+
+
+def _batch_inverse(values, modulus):
+    # Montgomery's trick, one inversion for all non zero values
+    if not values:
+        return []
+    products = []
+    product = 1
+    for value in values:
+        product = (product * value) % modulus
+        products.append(product)
+    inverse = _inverse(product, modulus)
+    result = [None] * len(values)
+    for i in range(len(values) - 1, 0, -1):
+        result[i] = (inverse * products[i - 1]) % modulus
+        inverse = (inverse * values[i]) % modulus
+    result[0] = inverse
+    return result
+
+
+_BACKEND = _default_backend()
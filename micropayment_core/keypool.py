@@ -0,0 +1,150 @@
+# coding: utf-8
+# Copyright (c) 2016 Fabian Barkhau <fabian.barkhau@gmail.com>
+# License: MIT (see LICENSE file)
+
+
+import collections
+import threading
+from pycoin.serialize import b2h
+from pycoin import encoding, networks
+from micropayment_core import base58
+from micropayment_core import ecc
+from micropayment_core import keys
+
+
+class KeyPool(object):
+    """ Bounded buffer of fresh keys refilled by a background thread.
+
+    Keys are handed out in O(1) from the buffer, or generated inline if
+    the buffer ran dry. Buffered private keys and wifs are held in
+    bytearrays, which are zeroized when the key is handed out or the pool
+    is closed. This only limits how long secrets stay in the buffer: get
+    returns them as immutable strings and generating a key leaves
+    immutable intermediates, none of which can be wiped.
+
+    Args:
+        size (int): Maximum number of keys held ready.
+        netcode (str): Netcode for generated wifs and addresses.
+        refill_at (int): Refill the buffer to its size once a get leaves
+                         at most this many keys, defaults to half the size.
+
+    Raises:
+        ValueError: If size, refill_at or netcode are invalid.
+    """
+
+    def __init__(self, size=64, netcode="BTC", refill_at=None):
+        if size < 1:
+            raise ValueError("size must be positive: {0}".format(size))
+        if refill_at is None:
+            refill_at = size // 2
+        if not 0 <= refill_at < size:
+            raise ValueError("Invalid refill_at: {0}".format(refill_at))
+        if networks.wif_prefix_for_netcode(netcode) is None:
+            raise ValueError("Unknown netcode: {0}".format(netcode))
+        self.size = size
+        self.netcode = netcode
+        self.refill_at = refill_at
+        self.hits = 0
+        self.misses = 0
+        self._keys = collections.deque()
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._refill, name="KeyPool")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def get(self):
+        """ Take a fresh key from the pool.
+
+        Return:
+            tuple: (privkey, pubkey, wif, address) with hex encoded private
+                   key and compressed public key.
+
+        Raises:
+            ValueError: If the pool was closed.
+        """
+        with self._condition:
+            if self._closed:
+                raise ValueError("KeyPool is closed")
+            if self._keys:
+                entry = self._keys.popleft()
+                self.hits += 1
+            else:
+                entry = None
+                self.misses += 1
+            if len(self._keys) <= self.refill_at:
+                self._condition.notify()
+        if entry is None:
+            entry = _generate(self.netcode)
+        try:
+            privkey_bin, pubkey_bin, wif, address = entry
+            return (b2h(bytes(privkey_bin)), b2h(pubkey_bin),
+                    bytes(wif).decode("ascii"), address)
+        finally:
+            _zeroize(entry)
+
+    def close(self):
+        """ Stop refilling and zeroize all keys left in the pool. """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        with self._condition:
+            while self._keys:
+                _zeroize(self._keys.popleft())
+
+    def stats(self):
+        """ Return dict with hits, misses, size and maxsize. """
+        with self._condition:
+            return {
+                "hits": self.hits, "misses": self.misses,
+                "size": len(self._keys), "maxsize": self.size
+            }
+
+    def _refill(self):
+        while True:
+            with self._condition:
+                while not self._closed and len(self._keys) > self.refill_at:
+                    self._condition.wait()
+            while True:  # top up to size, keys may be taken meanwhile
+                with self._condition:
+                    if self._closed:
+                        return
+                    if len(self._keys) >= self.size:
+                        break
+                entry = _generate(self.netcode)  # outside lock, get stays O(1)
+                with self._condition:
+                    if self._closed:
+                        _zeroize(entry)
+                        return
+                    self._keys.append(entry)
+
+
+def _generate(netcode):
+    # secrets are kept in bytearrays so they can be wiped on discard
+    privkey_bin = keys.generate_privkey_bytes()
+    secret_exponent = encoding.from_bytes_32(privkey_bin)
+    pubkey_bin = encoding.public_pair_to_sec(ecc.public_pair(secret_exponent))
+    wif = base58.b2a_hashed_base58(
+        networks.wif_prefix_for_netcode(netcode) + privkey_bin + b"\x01"
+    )
+    address = base58.b2a_hashed_base58(
+        networks.address_prefix_for_netcode(netcode) +
+        encoding.hash160(pubkey_bin)
+    )
+    return (bytearray(privkey_bin), pubkey_bin,
+            bytearray(wif.encode("ascii")), address)
+
+
+def _zeroize(entry):
+    for secret in (entry[0], entry[2]):
+        secret[:] = bytearray(len(secret))
@@ -5,17 +5,18 @@
 
 import os
 import hashlib
+import mmap
+from multiprocessing.pool import ThreadPool
 from ecdsa import SigningKey
 from ecdsa.curves import SECP256k1
 from pycoin.serialize import b2h, h2b
 from pycoin.key import Key
+from pycoin.key.Key import InvalidSecretExponentError
 from pycoin import encoding, networks
-from pycoin.ecdsa import sign as ecdsa_sign
-from pycoin.ecdsa import verify as ecdsa_verify
 from pycoin.ecdsa import generator_secp256k1 as G
-from pycoin.key.BIP32Node import BIP32Node
+from micropayment_core import base58
+from micropayment_core import ecc
 from micropayment_core import util
-from pycoin.encoding import a2b_hashed_base58
 from pycoin.key.validate import netcode_and_type_for_data
 import ecdsa
 
@@ -27,6 +28,172 @@ import ecdsa
 # * PrivKey: Hex encoded 32Byte secret exponent.
 # * PubKey: Hex encoded 33Byte compressed public key
 # * Address: Bitcoin address format
+#
+# Every function taking or returning hex encoded data has a *_bytes variant
+# taking and returning the same data as bytes, the hex functions wrap them.
+#
+# Public keys derived from secret exponents can be memoized in a process wide
+# LRU cache, see enable_derivation_cache. It is opt-in as its keys are secrets.
+# Parsed public keys are memoized the same way, see enable_pubkey_cache.
+
+
+_STREAM_CHUNK_SIZE = 1024 * 1024
+_DERIVATION_CACHE = None  # opt-in, see enable_derivation_cache
+_PUBKEY_CACHE = util.LRUCache(maxsize=4096)
+
+
+def enable_derivation_cache(maxsize=1024):
+    """ Memoize public key derivations from secret exponents.
+
+    Disabled by default, as the cached secret exponents are private keys.
+    Replaces the current cache with an empty one.
+
+    Args:
+        maxsize (int): Maximum number of secret exponents cached.
+    """
+    global _DERIVATION_CACHE
+    _DERIVATION_CACHE = util.LRUCache(maxsize=maxsize)
+
+
+def disable_derivation_cache():
+    """ Disable the derivation cache and drop all cached secret exponents.
+
+    Also drops decoded wifs from the base58 decode cache.
+    """
+    global _DERIVATION_CACHE
+    cache, _DERIVATION_CACHE = _DERIVATION_CACHE, None
+    if cache is not None:
+        cache.clear()
+    base58.clear_decode_cache()
+
+
+def clear_derivation_cache():
+    """ Drop all cached secret exponents and decoded base58check strings. """
+    cache = _DERIVATION_CACHE
+    if cache is not None:
+        cache.clear()
+    base58.clear_decode_cache()
+
+
+def derivation_cache_stats():
+    """ Return derivation cache statistics.
+
+    Return:
+        dict: hits, misses, evictions, size and maxsize or None if disabled.
+    """
+    cache = _DERIVATION_CACHE
+    return cache.stats() if cache is not None else None
+
+
+def derive_public_key(secret_exponent):
+    """ Derive the public key for a secret exponent, using the cache.
+
+    Args:
+        secret_exponent (int): Private key secret exponent.
+
+    Return:
+        tuple: (public_pair, compressed sec, hash160 of compressed sec)
+    """
+    cache = _DERIVATION_CACHE
+    if cache is not None:
+        derived = cache.get(secret_exponent)
+        if derived is not None:
+            return derived
+    public_pair = ecc.public_pair(secret_exponent)
+    sec = encoding.public_pair_to_sec(public_pair, compressed=True)
+    derived = (public_pair, sec, encoding.hash160(sec))
+    if cache is not None:
+        cache.put(secret_exponent, derived)
+    return derived
+
+
+def enable_pubkey_cache(maxsize=4096):
+    """ Memoize parsed public keys, enabled by default.
+
+    Replaces the current cache with an empty one.
+
+    Args:
+        maxsize (int): Maximum number of public keys cached.
+    """
+    global _PUBKEY_CACHE
+    _PUBKEY_CACHE = util.LRUCache(maxsize=maxsize)
+
+
+def disable_pubkey_cache():
+    """ Disable and drop the parsed public key cache. """
+    global _PUBKEY_CACHE
+    _PUBKEY_CACHE = None
+
+
+def pubkey_cache_stats():
+    """ Return parsed public key cache statistics.
+
+    Return:
+        dict: hits, misses, evictions, size and maxsize or None if disabled.
+    """
+    cache = _PUBKEY_CACHE
+    return cache.stats() if cache is not None else None
+
+
+def public_pair_from_sec(pubkey_bin):
+    """ Parse and validate a sec public key, using the pubkey cache.
+
+    Args:
+        pubkey_bin (bytes): Compressed or uncompressed sec public key.
+
+    Return:
+        tuple: (x, y) public pair.
+
+    Raises:
+        EncodingError: If the public key is not a valid curve point.
+    """
+    pubkey_bin = bytes(pubkey_bin)
+    cache = _PUBKEY_CACHE
+    if cache is not None:
+        public_pair = cache.get(pubkey_bin)
+        if public_pair is not None:
+            return public_pair
+    public_pair = _parse_sec(pubkey_bin)
+    if cache is not None:
+        cache.put(pubkey_bin, public_pair)
+    return public_pair
+
+
+def _parse_sec(pubkey_bin):
+    prefix = pubkey_bin[:1]
+    if len(pubkey_bin) == 33 and prefix in (b"\x02", b"\x03"):
+        x = encoding.from_bytes_32(pubkey_bin[1:33])
+        try:
+            return ecc.public_pair_for_x(x, is_even=(prefix == b"\x02"))
+        except ValueError:
+            raise encoding.EncodingError("invalid public key")
+    public_pair = encoding.sec_to_public_pair(pubkey_bin)
+    if not ecc.is_on_curve(public_pair):
+        raise encoding.EncodingError("invalid public key")
+    return public_pair
+
+
+def _parse_wif(wif):
+    data = base58.a2b_hashed_base58(wif)
+    netcode, key_type, length = netcode_and_type_for_data(data)
+    if key_type != "wif":  # other key formats, i.e. bip32
+        key = Key.from_text(wif)
+        return key.secret_exponent(), len(key.sec()) == 33, key.netcode()
+    data = data[1:]
+    compressed = len(data) > 32
+    secret_exponent = encoding.from_bytes_32(data[:32])
+    if not 0 < secret_exponent < G.order():
+        raise InvalidSecretExponentError()
+    return secret_exponent, compressed, netcode
+
+
+def _wif_public_key(wif):
+    secret_exponent, compressed, netcode = _parse_wif(wif)
+    public_pair, sec, hash160 = derive_public_key(secret_exponent)
+    if not compressed:
+        sec = encoding.public_pair_to_sec(public_pair, compressed=False)
+        hash160 = encoding.hash160(sec)
+    return sec, hash160, netcode
 
 
 def pubkey_from_wif(wif):
@@ -38,7 +205,12 @@ def pubkey_from_wif(wif):
     Return:
         str: Hex encoded 33Byte compressed public key.
     """
-    return b2h(Key.from_text(wif).sec())
+    return b2h(pubkey_from_wif_bytes(wif))
+
+
+def pubkey_from_wif_bytes(wif):
+    """ Get 33Byte compressed public key from given bitcoin wif. """
+    return _wif_public_key(wif)[0]
 
 
 def address_from_privkey(privkey, netcode="BTC"):
@@ -51,7 +223,15 @@ def address_from_privkey(privkey, netcode="BTC"):
     Return:
         str: Bitcoin address
     """
-    return address_from_pubkey(pubkey_from_privkey(privkey), netcode=netcode)
+    return address_from_privkey_bytes(h2b(privkey), netcode=netcode)
+
+
+def address_from_privkey_bytes(privkey_bin, netcode="BTC"):
+    """ Get bitcoin address from given 32Byte secret exponent. """
+    prefix = networks.address_prefix_for_netcode(netcode)
+    secret_exponent = encoding.from_bytes_32(privkey_bin)
+    hash160 = derive_public_key(secret_exponent)[2]
+    return base58.b2a_hashed_base58(prefix + hash160)
 
 
 def pem_to_privkey(pem):
@@ -63,9 +243,14 @@ def pem_to_privkey(pem):
     Return:
         str: Hex encoded 32Byte secret exponent
     """
+    return b2h(pem_to_privkey_bytes(pem))
+
+
+def pem_to_privkey_bytes(pem):
+    """ Get 32Byte secret exponent from given PEM encoded private key. """
     sk = SigningKey.from_pem(pem)
     assert(sk.curve.openssl_name == 'secp256k1')
-    return b2h(sk.to_string())
+    return sk.to_string()
 
 
 def privkey_to_pem(privkey):
@@ -77,7 +262,12 @@ def privkey_to_pem(privkey):
     Return:
         str: Private key in base64 encoded PEM format.
     """
-    return SigningKey.from_string(h2b(privkey), curve=SECP256k1).to_pem()
+    return privkey_to_pem_bytes(h2b(privkey))
+
+
+def privkey_to_pem_bytes(privkey_bin):
+    """ Get 32Byte secret exponent in PEM encoded private key format. """
+    return SigningKey.from_string(privkey_bin, curve=SECP256k1).to_pem()
 
 
 def der_to_privkey(der):
@@ -89,9 +279,14 @@ def der_to_privkey(der):
     Return:
         str: Hex encoded 32Byte secret exponent
     """
+    return b2h(der_to_privkey_bytes(der))
+
+
+def der_to_privkey_bytes(der):
+    """ Get 32Byte secret exponent from given DER encoded private key. """
     sk = SigningKey.from_der(der)
     assert(sk.curve.openssl_name == 'secp256k1')
-    return b2h(sk.to_string())
+    return sk.to_string()
 
 
 def privkey_to_der(privkey):
@@ -103,7 +298,12 @@ def privkey_to_der(privkey):
     Return:
         str: Private key in binary encoded DER format.
     """
-    return SigningKey.from_string(h2b(privkey), curve=SECP256k1).to_der()
+    return privkey_to_der_bytes(h2b(privkey))
+
+
+def privkey_to_der_bytes(privkey_bin):
+    """ Get 32Byte secret exponent in DER encoded private key format. """
+    return SigningKey.from_string(privkey_bin, curve=SECP256k1).to_der()
 
 
 def wif_to_privkey(wif):
@@ -115,7 +315,12 @@ def wif_to_privkey(wif):
     Return:
         str: Hex encoded 32Byte secret exponent
     """
-    return b2h(encoding.to_bytes_32(Key.from_text(wif).secret_exponent()))
+    return b2h(wif_to_privkey_bytes(wif))
+
+
+def wif_to_privkey_bytes(wif):
+    """ Get 32Byte secret exponent from given bitcoin wif. """
+    return encoding.to_bytes_32(_parse_wif(wif)[0])
 
 
 def privkey_to_wif(privkey, netcode="BTC"):
@@ -127,9 +332,16 @@ def privkey_to_wif(privkey, netcode="BTC"):
     Return:
         str: Private key encode in bitcoin wif format.
     """
+    return privkey_to_wif_bytes(h2b(privkey), netcode=netcode)
+
+
+def privkey_to_wif_bytes(privkey_bin, netcode="BTC"):
+    """ Get bitcoin wif for given 32Byte secret exponent. """
     prefix = networks.wif_prefix_for_netcode(netcode)
-    secret_exponent = encoding.from_bytes_32(h2b(privkey))
-    return encoding.secret_exponent_to_wif(secret_exponent, wif_prefix=prefix)
+    secret_exponent = encoding.from_bytes_32(privkey_bin)
+    return base58.b2a_hashed_base58(
+        prefix + encoding.to_bytes_32(secret_exponent) + b"\x01"
+    )
 
 
 def pubkey_from_privkey(privkey):
@@ -141,7 +353,13 @@ def pubkey_from_privkey(privkey):
     Return:
         str: Hex encoded 33Byte compressed public key
     """
-    return pubkey_from_wif(privkey_to_wif(privkey))
+    return b2h(pubkey_from_privkey_bytes(h2b(privkey)))
+
+
+def pubkey_from_privkey_bytes(privkey_bin):
+    """ Get 33Byte compressed public key from given 32Byte secret exponent. """
+    secret_exponent = encoding.from_bytes_32(privkey_bin)
+    return derive_public_key(secret_exponent)[1]
 
 
 def address_from_pubkey(pubkey, netcode="BTC"):
@@ -154,11 +372,15 @@ def address_from_pubkey(pubkey, netcode="BTC"):
     Return:
         str: Bitcoin address
     """
+    return address_from_pubkey_bytes(h2b(pubkey), netcode=netcode)
+
+
+def address_from_pubkey_bytes(pubkey_bin, netcode="BTC"):
+    """ Get bitcoin address from given public key in sec format. """
     prefix = networks.address_prefix_for_netcode(netcode)
-    public_pair = encoding.sec_to_public_pair(h2b(pubkey))
-    return encoding.public_pair_to_bitcoin_address(
-        public_pair, address_prefix=prefix
-    )
+    public_pair = public_pair_from_sec(pubkey_bin)
+    sec = encoding.public_pair_to_sec(public_pair, compressed=True)
+    return base58.b2a_hashed_base58(prefix + encoding.hash160(sec))
 
 
 def address_from_wif(wif):
@@ -170,17 +392,19 @@ def address_from_wif(wif):
     Return:
         str: Bitcoin address
     """
-    return Key.from_text(wif).address()
+    sec, hash160, netcode = _wif_public_key(wif)
+    prefix = networks.address_prefix_for_netcode(netcode)
+    return base58.b2a_hashed_base58(prefix + hash160)
 
 
 def netcode_from_wif(wif):
     """ Returns netcode for given bitcoin wif. """
-    return Key.from_text(wif).netcode()
+    return _parse_wif(wif)[2]
 
 
 def netcode_from_address(address):
     """ Returns netcode for given bitcoin address. """
-    data = a2b_hashed_base58(address)
+    data = base58.a2b_hashed_base58(address)
     netcode, key_type, length = netcode_and_type_for_data(data)
     return netcode
 
@@ -194,8 +418,13 @@ def uncompress_pubkey(pubkey):
     Return:
         str: Hex encoded uncompressed 65byte public key (4 + x + y).
     """
-    public_pair = encoding.sec_to_public_pair(h2b(pubkey))
-    return b2h(encoding.public_pair_to_sec(public_pair, compressed=False))
+    return b2h(uncompress_pubkey_bytes(h2b(pubkey)))
+
+
+def uncompress_pubkey_bytes(pubkey_bin):
+    """ Convert 33Byte compressed to 65Byte uncompressed public key. """
+    public_pair = public_pair_from_sec(pubkey_bin)
+    return encoding.public_pair_to_sec(public_pair, compressed=False)
 
 
 def compress_pubkey(uncompressed_pubkey):
@@ -207,8 +436,187 @@ def compress_pubkey(uncompressed_pubkey):
     Return:
         str: Hex encoded 33Byte compressed public key
     """
-    public_pair = encoding.sec_to_public_pair(h2b(uncompressed_pubkey))
-    return b2h(encoding.public_pair_to_sec(public_pair, compressed=True))
+    return b2h(compress_pubkey_bytes(h2b(uncompressed_pubkey)))
+
+
+def compress_pubkey_bytes(uncompressed_pubkey_bin):
+    """ Convert 65Byte uncompressed to 33Byte compressed public key. """
+    public_pair = public_pair_from_sec(uncompressed_pubkey_bin)
+    return encoding.public_pair_to_sec(public_pair, compressed=True)
+
+
+def pubkeys_from_privkeys(privkeys):
+    """ Get public keys for many private keys, see pubkey_from_privkey.
+
+    Args:
+        privkeys (list): Hex encoded private keys
+
+    Return:
+        list: Hex encoded 33Byte compressed public keys
+    """
+    privkeys_bin = [h2b(privkey) for privkey in privkeys]
+    return [b2h(sec) for sec in pubkeys_from_privkeys_bytes(privkeys_bin)]
+
+
+def pubkeys_from_privkeys_bytes(privkeys_bin):
+    """ Get compressed public keys for many 32Byte secret exponents.
+
+    Takes a list of bytes or a NumPy uint8 array with a key per row, a
+    NumPy array is returned for NumPy input.
+    """
+    rows = _array_rows(privkeys_bin)
+    public_pairs = _public_pairs_from_privkeys(rows)
+    secs = [encoding.public_pair_to_sec(pp) for pp in public_pairs]
+    return _as_input_type(privkeys_bin, secs)
+
+
+def addresses_from_privkeys(privkeys, netcode="BTC"):
+    """ Get bitcoin addresses for many private keys.
+
+    Args:
+        privkeys (list): Hex encoded private keys
+        netcode (str): Netcode for resulting bitcoin addresses.
+
+    Return:
+        list: Bitcoin addresses
+    """
+    privkeys_bin = [h2b(privkey) for privkey in privkeys]
+    return addresses_from_privkeys_bytes(privkeys_bin, netcode=netcode)
+
+
+def addresses_from_privkeys_bytes(privkeys_bin, netcode="BTC"):
+    """ Get bitcoin addresses for many 32Byte secret exponents.
+
+    Takes a list of bytes or a NumPy uint8 array with a key per row, a
+    NumPy bytes array is returned for NumPy input.
+    """
+    rows = _array_rows(privkeys_bin)
+    public_pairs = _public_pairs_from_privkeys(rows)
+    secs = [encoding.public_pair_to_sec(pp) for pp in public_pairs]
+    addresses = _addresses(secs, netcode)
+    return _as_input_type(privkeys_bin, addresses, addresses=True)
+
+
+def addresses_from_pubkeys(pubkeys, netcode="BTC"):
+    """ Get bitcoin addresses for many public keys.
+
+    Args:
+        pubkeys (list): Hex encoded 33Byte compressed public keys
+        netcode (str): Netcode for resulting bitcoin addresses.
+
+    Return:
+        list: Bitcoin addresses
+    """
+    pubkeys_bin = [h2b(pubkey) for pubkey in pubkeys]
+    return addresses_from_pubkeys_bytes(pubkeys_bin, netcode=netcode)
+
+
+def addresses_from_pubkeys_bytes(pubkeys_bin, netcode="BTC"):
+    """ Get bitcoin addresses for many public keys in sec format.
+
+    Takes a list of bytes or a NumPy uint8 array with a key per row, a
+    NumPy bytes array is returned for NumPy input.
+    """
+    secs = [
+        sec if len(sec) == 33 else encoding.public_pair_to_sec(pp)
+        for sec, pp in _public_pairs_from_secs(_array_rows(pubkeys_bin))
+    ]
+    addresses = _addresses(secs, netcode)
+    return _as_input_type(pubkeys_bin, addresses, addresses=True)
+
+
+def uncompress_pubkeys(pubkeys):
+    """ Convert many compressed public keys to uncompressed public keys.
+
+    Args:
+        pubkeys (list): Hex encoded 33Byte compressed public keys
+
+    Return:
+        list: Hex encoded uncompressed 65byte public keys (4 + x + y).
+    """
+    pubkeys_bin = [h2b(pubkey) for pubkey in pubkeys]
+    return [b2h(sec) for sec in uncompress_pubkeys_bytes(pubkeys_bin)]
+
+
+def uncompress_pubkeys_bytes(pubkeys_bin):
+    """ Convert many 33Byte compressed to 65Byte uncompressed public keys.
+
+    Takes a list of bytes or a NumPy uint8 array with a key per row, a
+    NumPy array is returned for NumPy input.
+    """
+    secs = [
+        encoding.public_pair_to_sec(pp, compressed=False)
+        for sec, pp in _public_pairs_from_secs(_array_rows(pubkeys_bin))
+    ]
+    return _as_input_type(pubkeys_bin, secs)
+
+
+def compress_pubkeys(uncompressed_pubkeys):
+    """ Convert many uncompressed public keys to compressed public keys.
+
+    Args:
+        pubkeys (list): Hex encoded 65Byte uncompressed public keys
+
+    Return:
+        list: Hex encoded 33Byte compressed public keys
+    """
+    pubkeys_bin = [h2b(pubkey) for pubkey in uncompressed_pubkeys]
+    return [b2h(sec) for sec in compress_pubkeys_bytes(pubkeys_bin)]
+
+
+def compress_pubkeys_bytes(uncompressed_pubkeys_bin):
+    """ Convert many 65Byte uncompressed to 33Byte compressed public keys.
+
+    Takes a list of bytes or a NumPy uint8 array with a key per row, a
+    NumPy array is returned for NumPy input.
+    """
+    rows = _array_rows(uncompressed_pubkeys_bin)
+    secs = [
+        encoding.public_pair_to_sec(pp, compressed=True)
+        for sec, pp in _public_pairs_from_secs(rows)
+    ]
+    return _as_input_type(uncompressed_pubkeys_bin, secs)
+
+
+def _public_pairs_from_privkeys(privkeys_bin):
+    secret_exponents = [encoding.from_bytes_32(p) for p in privkeys_bin]
+    return ecc.public_pairs(secret_exponents)
+
+
+def _public_pairs_from_secs(pubkeys_bin):
+    # bulk input bypasses the pubkey cache to not evict the hot keys
+    return [(sec, _parse_sec(sec)) for sec in pubkeys_bin]
+
+
+def _addresses(secs, netcode):
+    prefix = networks.address_prefix_for_netcode(netcode)
+    return base58.b2a_hashed_base58_batch(
+        [prefix + encoding.hash160(sec) for sec in secs]
+    )
+
+
+def _array_rows(items):
+    if not hasattr(items, "ndim"):  # not a NumPy array
+        return [bytes(item) for item in items]
+    if items.ndim != 2:
+        raise ValueError("Expected an array with a key per row.")
+    import numpy
+    if items.dtype != numpy.uint8:
+        raise ValueError("Expected a uint8 array, got {0}.".format(
+            items.dtype))
+    data, width = items.tobytes(), items.shape[1]
+    return [data[i:i + width] for i in range(0, len(data), width)]
+
+
+def _as_input_type(items, results, addresses=False):
+    if not hasattr(items, "ndim"):  # not a NumPy array
+        return results
+    import numpy
+    if addresses:
+        return numpy.array([r.encode("ascii") for r in results], dtype="S")
+    width = len(results[0]) if results else 0
+    column = numpy.frombuffer(b"".join(results), dtype=numpy.uint8)
+    return column.reshape(len(results), width)
 
 
 def sign(privkey, data):
@@ -221,10 +629,17 @@ def sign(privkey, data):
     Return:
         str: Hex encoded signature in DER format.
     """
-    secret_exponent = Key.from_text(privkey_to_wif(privkey)).secret_exponent()
-    e = util.bytestoint(h2b(data))
-    r, s = ecdsa_sign(G, secret_exponent, e)
-    return b2h(ecdsa.util.sigencode_der(r, s, G.order()))
+    return b2h(sign_bytes(h2b(privkey), h2b(data)))
+
+
+def sign_bytes(privkey_bin, data_bin):
+    """ Sign data with given 32Byte secret exponent, return DER signature. """
+    secret_exponent = encoding.from_bytes_32(privkey_bin)
+    if not 0 < secret_exponent < G.order():
+        raise InvalidSecretExponentError()
+    e = util.bytestoint(data_bin)
+    r, s = ecc.sign(secret_exponent, e)
+    return ecdsa.util.sigencode_der(r, s, G.order())
 
 
 def verify(pubkey, signature, data):
@@ -237,10 +652,15 @@ def verify(pubkey, signature, data):
     Return:
         bool: True if signature is valid.
     """
-    public_pair = encoding.sec_to_public_pair(h2b(pubkey))
-    val = util.bytestoint(h2b(data))
-    sig = ecdsa.util.sigdecode_der(h2b(signature), G.order())
-    return ecdsa_verify(G, public_pair, val, sig)
+    return verify_bytes(h2b(pubkey), h2b(signature), h2b(data))
+
+
+def verify_bytes(pubkey_bin, signature_bin, data_bin):
+    """ Verify DER signature of data for given public key in sec format. """
+    public_pair = public_pair_from_sec(pubkey_bin)
+    val = util.bytestoint(data_bin)
+    sig = ecdsa.util.sigdecode_der(signature_bin, G.order())
+    return ecc.verify(public_pair, val, sig)
 
 
 def sign_sha256(privkey, data):
@@ -255,9 +675,17 @@ def sign_sha256(privkey, data):
     Return:
         str: Hex encoded signature in DER format.
     """
+    return b2h(sign_sha256_bytes(h2b(privkey), data))
+
+
+def sign_sha256_bytes(privkey_bin, data):
+    """ Sign sha256(data) with given 32Byte secret exponent.
+
+    Return DER signature, data (str or bytes) is hashed as in sign_sha256.
+    """
     if not isinstance(data, bytes):
         data = data.encode("utf-8")
-    return sign(privkey, hashlib.sha256(data).hexdigest())
+    return sign_bytes(privkey_bin, hashlib.sha256(data).digest())
 
 
 def verify_sha256(pubkey, signature, data):
@@ -272,9 +700,234 @@ def verify_sha256(pubkey, signature, data):
     Return:
         bool: True if signature is valid.
     """
+    return verify_sha256_bytes(h2b(pubkey), h2b(signature), data)
+
+
+def verify_sha256_bytes(pubkey_bin, signature_bin, data):
+    """ Verify DER signature of sha256(data) for given sec public key. """
     if not isinstance(data, bytes):
         data = data.encode("utf-8")
-    return verify(pubkey, signature, hashlib.sha256(data).hexdigest())
+    digest = hashlib.sha256(data).digest()
+    return verify_bytes(pubkey_bin, signature_bin, digest)
+
+
+def sign_sha256_stream(privkey, stream):
+    """ Sign data read incrementally from a stream.
+
+    Same signature as sign_sha256 of all the stream data, but the data is
+    hashed in bounded chunks and never held in memory at once.
+
+    Args:
+        privkey (str): Hex encoded private key
+        stream: Binary file object, bytes, bytearray, memoryview or an
+                iterable of bytes or str chunks.
+
+    Return:
+        str: Hex encoded signature in DER format.
+    """
+    return b2h(sign_sha256_stream_bytes(h2b(privkey), stream))
+
+
+def sign_sha256_stream_bytes(privkey_bin, stream):
+    """ Sign sha256 of stream data, see sign_sha256_stream. """
+    return sign_bytes(privkey_bin, _sha256_stream(stream))
+
+
+def verify_sha256_stream(pubkey, signature, stream):
+    """ Verify data read incrementally from a stream is signed by a key.
+
+    Args:
+        pubkey (str): Hex encoded 33Byte compressed public key
+        signature (str): Hex encoded signature in DER format.
+        stream: Stream as taken by sign_sha256_stream.
+
+    Return:
+        bool: True if signature is valid.
+    """
+    return verify_sha256_stream_bytes(h2b(pubkey), h2b(signature), stream)
+
+
+def verify_sha256_stream_bytes(pubkey_bin, signature_bin, stream):
+    """ Verify DER signature of sha256 of stream data, see verify_sha256. """
+    return verify_bytes(pubkey_bin, signature_bin, _sha256_stream(stream))
+
+
+def sign_sha256_file(privkey, path):
+    """ Sign the content of a file, same signature as sign_sha256.
+
+    The file is memory mapped and hashed without copying it.
+
+    Args:
+        privkey (str): Hex encoded private key
+        path (str): Path of the file to sign.
+
+    Return:
+        str: Hex encoded signature in DER format.
+    """
+    return b2h(sign_bytes(h2b(privkey), _sha256_file(path)))
+
+
+def verify_sha256_file(pubkey, signature, path):
+    """ Verify the content of a file is signed by a key.
+
+    Args:
+        pubkey (str): Hex encoded 33Byte compressed public key
+        signature (str): Hex encoded signature in DER format.
+        path (str): Path of the signed file.
+
+    Return:
+        bool: True if signature is valid.
+    """
+    return verify_bytes(h2b(pubkey), h2b(signature), _sha256_file(path))
+
+
+def sign_sha256_files(privkey, paths, workers=4):
+    """ Sign the content of many files in parallel, see sign_sha256_file.
+
+    Hashing releases the GIL, so the files are hashed by a thread pool.
+
+    Args:
+        privkey (str): Hex encoded private key
+        paths (list): Paths of the files to sign.
+        workers (int): Number of threads hashing files.
+
+    Return:
+        list: Hex encoded DER signatures in the order of the paths.
+    """
+    paths = list(paths)
+    if len(paths) < 2 or workers < 2:
+        return [sign_sha256_file(privkey, path) for path in paths]
+    pool = ThreadPool(min(workers, len(paths)))
+    try:
+        digests = pool.map(_sha256_file, paths)
+    finally:
+        pool.close()
+        pool.join()
+    privkey_bin = h2b(privkey)
+    return [b2h(sign_bytes(privkey_bin, digest)) for digest in digests]
+
+
+def _sha256_stream(stream, chunk_size=_STREAM_CHUNK_SIZE):
+    sha256 = hashlib.sha256()
+    if isinstance(stream, (bytes, bytearray, memoryview)):
+        view = memoryview(stream)
+        for offset in range(0, len(view), chunk_size):
+            sha256.update(view[offset:offset + chunk_size])
+    elif hasattr(stream, "readinto"):
+        buf = bytearray(chunk_size)
+        view = memoryview(buf)
+        size = stream.readinto(buf)
+        while size:
+            sha256.update(view[:size])
+            size = stream.readinto(buf)
+    elif hasattr(stream, "read"):
+        for chunk in iter(lambda: stream.read(chunk_size), b""):
+            sha256.update(chunk)
+    else:
+        for chunk in stream:
+            if not isinstance(chunk, (bytes, bytearray, memoryview)):
+                chunk = chunk.encode("utf-8")
+            sha256.update(chunk)
+    return sha256.digest()
+
+
+def _sha256_file(path, chunk_size=_STREAM_CHUNK_SIZE):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return hashlib.sha256(b"").digest()  # empty files can't be mapped
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            data = memoryview(mapped)  # hash slices of the mapping, no copy
+        except TypeError:  # pragma: no cover, python 2 mmap has no buffer
+            data = mapped
+        try:
+            return _sha256_stream(data, chunk_size=chunk_size)
+        finally:
+            if isinstance(data, memoryview):
+                data.release()  # mmaps with exported buffers can't close
+            mapped.close()
+
+
+def verify_batch(items):
+    """ Verify many signatures at once.
+
+    Args:
+        items (list): (pubkey, signature, data) tuples as taken by verify.
+
+    Return:
+        list: True for each valid signature, malformed items are invalid.
+    """
+    return verify_batch_bytes([
+        (_h2b_or_empty(pubkey), _h2b_or_empty(signature), _h2b_or_empty(data))
+        for pubkey, signature, data in items
+    ])
+
+
+def verify_batch_bytes(items):
+    """ Verify many (sec pubkey, DER signature, data) tuples at once.
+
+    Public keys are parsed through the pubkey cache and the signatures are
+    checked by ecc.verify_batch, see verify_batch.
+    """
+    invalid_pubkeys = set()
+    positions, checked = [], []
+    for position, (pubkey_bin, signature_bin, data_bin) in enumerate(items):
+        try:
+            pubkey_bin = bytes(pubkey_bin)  # hashable, may be a bytearray
+        except TypeError:  # malformed input only fails its item
+            continue
+        if pubkey_bin in invalid_pubkeys:
+            continue
+        try:
+            public_pair = public_pair_from_sec(pubkey_bin)
+        except Exception:  # malformed input only fails its item
+            invalid_pubkeys.add(pubkey_bin)
+            continue
+        try:
+            sig = ecdsa.util.sigdecode_der(signature_bin, G.order())
+            val = util.bytestoint(data_bin)
+        except Exception:  # malformed input only fails its item
+            continue
+        positions.append(position)
+        checked.append((public_pair, val, sig))
+    results = [False] * len(items)
+    for position, valid in zip(positions, ecc.verify_batch(checked)):
+        results[position] = valid
+    return results
+
+
+def verify_sha256_batch(items):
+    """ Verify many signatures of sha256(data) at once.
+
+    Args:
+        items (list): (pubkey, signature, data) tuples as taken by
+                      verify_sha256.
+
+    Return:
+        list: True for each valid signature, malformed items are invalid.
+    """
+    return verify_sha256_batch_bytes([
+        (_h2b_or_empty(pubkey), _h2b_or_empty(signature), data)
+        for pubkey, signature, data in items
+    ])
+
+
+def verify_sha256_batch_bytes(items):
+    """ Verify many signatures of sha256(data), see verify_batch_bytes. """
+    hashed = []
+    for pubkey_bin, signature_bin, data in items:
+        if not isinstance(data, bytes):
+            data = data.encode("utf-8")
+        hashed.append((pubkey_bin, signature_bin,
+                       hashlib.sha256(data).digest()))
+    return verify_batch_bytes(hashed)
+
+
+def _h2b_or_empty(hexdata):
+    try:
+        return h2b(hexdata)
+    except (TypeError, ValueError):
+        return b""
 
 
 def generate_wif(netcode="BTC"):
@@ -286,7 +939,7 @@ def generate_wif(netcode="BTC"):
     Return:
         str: Private key encode in bitcoin wif format.
     """
-    return BIP32Node.from_master_secret(os.urandom(32), netcode=netcode).wif()
+    return privkey_to_wif_bytes(generate_privkey_bytes(), netcode=netcode)
 
 
 def generate_privkey():
@@ -295,4 +948,12 @@ def generate_privkey():
     Return:
         str: Hex encoded 32Byte secret exponent
     """
-    return wif_to_privkey(generate_wif())
+    return b2h(generate_privkey_bytes())
+
+
+def generate_privkey_bytes():
+    """ Generate a new 32Byte secret exponent with secure random data. """
+    while True:
+        privkey_bin = os.urandom(32)
+        if 0 < encoding.from_bytes_32(privkey_bin) < ecc.N:
+            return privkey_bin
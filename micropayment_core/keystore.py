@@ -0,0 +1,320 @@
+# coding: utf-8
+# Copyright (c) 2016 Fabian Barkhau <fabian.barkhau@gmail.com>
+# License: MIT (see LICENSE file)
+
+
+import hashlib
+import hmac
+import mmap
+import os
+import struct
+from pycoin import encoding
+from pycoin.serialize import b2h, h2b
+from micropayment_core import ecc
+from micropayment_core import keys
+from micropayment_core import util
+
+
+# Compact keystore file holding many private keys, opened with mmap so
+# lookups only touch the pages they need.
+#
+# Layout: a header (magic, flags, record count, nonce, key check), the key
+# records sorted by public key and an index sorted by hash160.
+#
+#     record: secret (32) + compressed public key (33) + hash160 (20)
+#             [+ tag (32) in encrypted stores]
+#     index:  hash160 (20) + record number (4)
+#
+# Encrypted stores xor each secret with HMAC-SHA256(key, nonce + record
+# number) using a per store 32Byte key. Public keys and hash160s are kept
+# in the clear so lookups work without decrypting. The key check is a MAC
+# of the nonce, so a wrong key is detected when opening the store.
+#
+# The xor encryption is not authenticated, so encrypted records carry an
+# HMAC-SHA256 tag of the record number and data, keyed with a MAC key
+# derived from the store key. Unencrypted records have no key to tag them
+# with, their secrets are checked against the public key instead. Either
+# way a corrupted or tampered record raises instead of returning a
+# different secret.
+
+
+_MAGIC = b"MPCKST02"
+_HEADER = struct.Struct(">8sBI16s32s")
+_FLAG_ENCRYPTED = 1
+_RECORD_SIZE = 85
+_TAG_SIZE = 32
+_INDEX_ENTRY = struct.Struct(">20sI")
+
+
+def create(path, privkeys, key=None):
+    """ Write a keystore file holding the given private keys.
+
+    The file is written atomically, duplicate keys are stored once.
+
+    Args:
+        path (str): Keystore file path.
+        privkeys (list): Hex encoded 32Byte secret exponents.
+        key (str): Hex encoded 32Byte store key to encrypt secrets with,
+                   None to store them unencrypted.
+
+    Return:
+        int: Number of keys stored.
+
+    Raises:
+        ValueError: If the store key is not 32Byte.
+    """
+    key_bin = _key_bin(key) if key is not None else None
+    return _create(path, [h2b(privkey) for privkey in privkeys], key_bin)
+
+
+def import_keys(path, wifs=(), pems=(), ders=(), key=None):
+    """ Write a keystore file holding keys in wif, PEM and DER formats.
+
+    Args:
+        path (str): Keystore file path.
+        wifs (list): Private keys encoded in bitcoin wif format.
+        pems (list): Private keys in PEM format.
+        ders (list): Private keys in binary DER format.
+        key (str): Hex encoded 32Byte store key, see create.
+
+    Return:
+        int: Number of keys stored.
+
+    Raises:
+        ValueError: If the store key is not 32Byte.
+    """
+    privkeys_bin = (
+        [keys.wif_to_privkey_bytes(wif) for wif in wifs] +
+        [keys.pem_to_privkey_bytes(pem) for pem in pems] +
+        [keys.der_to_privkey_bytes(der) for der in ders]
+    )
+    key_bin = _key_bin(key) if key is not None else None
+    return _create(path, privkeys_bin, key_bin)
+
+
+class KeyStore(object):
+    """ Read only view of a memory mapped keystore file.
+
+    Args:
+        path (str): Keystore file path.
+        key (str): Hex encoded 32Byte store key for encrypted stores.
+
+    Raises:
+        ValueError: If the file is no valid keystore or the key is missing
+                    or wrong. Lookups raise it for corrupted records.
+    """
+
+    def __init__(self, path, key=None):
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            self._file.close()
+            raise ValueError("Invalid keystore: {0}".format(path))
+        try:
+            self._open(path, key)
+        except Exception:
+            self.close()
+            raise
+
+    def _open(self, path, key):
+        if len(self._map) < _HEADER.size:
+            raise ValueError("Invalid keystore: {0}".format(path))
+        magic, flags, count, nonce, check = _HEADER.unpack(
+            self._map[:_HEADER.size]
+        )
+        self._record_size = _record_size(flags & _FLAG_ENCRYPTED)
+        size = _HEADER.size + count * (self._record_size + _INDEX_ENTRY.size)
+        if magic != _MAGIC or len(self._map) != size:
+            raise ValueError("Invalid keystore: {0}".format(path))
+        self._count = count
+        self._nonce = nonce
+        self._index_offset = _HEADER.size + count * self._record_size
+        self._key = None
+        if flags & _FLAG_ENCRYPTED:
+            if key is None:
+                raise ValueError("Keystore is encrypted: {0}".format(path))
+            self._key = _key_bin(key)
+            if not hmac.compare_digest(_key_check(self._key, nonce), check):
+                raise ValueError("Invalid keystore key: {0}".format(path))
+            self._mac_key = _mac_key(self._key, nonce)
+
+    def __len__(self):
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        for number in range(self._count):
+            privkey_bin, pubkey_bin, hash160 = self._record(number)
+            yield b2h(privkey_bin), b2h(pubkey_bin), b2h(hash160)
+
+    def close(self):
+        """ Unmap and close the keystore file. """
+        if getattr(self, "_map", None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def privkey_for_pubkey(self, pubkey):
+        """ Find the private key of a public key.
+
+        Args:
+            pubkey (str): Hex encoded 33Byte compressed public key
+
+        Return:
+            str: Hex encoded private key or None if not in the store.
+        """
+        privkey_bin = self.privkey_for_pubkey_bytes(h2b(pubkey))
+        return b2h(privkey_bin) if privkey_bin is not None else None
+
+    def privkey_for_pubkey_bytes(self, pubkey_bin):
+        """ Find the 32Byte secret exponent of a sec public key. """
+        number = self._search(self._pubkey, bytes(pubkey_bin))
+        return self._record(number)[0] if number is not None else None
+
+    def privkey_for_hash160(self, hash160):
+        """ Find the private key of a compressed public key hash160.
+
+        Args:
+            hash160 (str): Hex encoded hash160 of the public key.
+
+        Return:
+            str: Hex encoded private key or None if not in the store.
+        """
+        privkey_bin = self.privkey_for_hash160_bytes(h2b(hash160))
+        return b2h(privkey_bin) if privkey_bin is not None else None
+
+    def privkey_for_hash160_bytes(self, hash160_bin):
+        """ Find the 32Byte secret exponent of a 20Byte hash160. """
+        index = self._search(self._index_hash160, bytes(hash160_bin))
+        if index is None:
+            return None
+        offset = self._index_offset + index * _INDEX_ENTRY.size
+        number = _INDEX_ENTRY.unpack(
+            self._map[offset:offset + _INDEX_ENTRY.size]
+        )[1]
+        if number >= self._count:
+            raise ValueError("Invalid keystore index entry: {0}".format(index))
+        privkey_bin, pubkey_bin, record_hash160 = self._record(number)
+        if record_hash160 != hash160_bin:
+            raise ValueError("Invalid keystore index entry: {0}".format(index))
+        return privkey_bin
+
+    def _record_offset(self, number):
+        return _HEADER.size + number * self._record_size
+
+    def _pubkey(self, number):
+        offset = self._record_offset(number)
+        return self._map[offset + 32:offset + 65]
+
+    def _index_hash160(self, index):
+        offset = self._index_offset + index * _INDEX_ENTRY.size
+        return self._map[offset:offset + 20]
+
+    def _search(self, item, wanted):
+        # binary search over the sorted records or index entries
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            found = item(mid)
+            if found < wanted:
+                lo = mid + 1
+            elif found > wanted:
+                hi = mid
+            else:
+                return mid
+        return None
+
+    def _record(self, number):
+        offset = self._record_offset(number)
+        record = self._map[offset:offset + self._record_size]
+        privkey_bin, pubkey_bin, hash160 = (record[:32], record[32:65],
+                                            record[65:_RECORD_SIZE])
+        if self._key is not None:
+            tag = _record_tag(self._mac_key, number, record[:_RECORD_SIZE])
+            if not hmac.compare_digest(tag, record[_RECORD_SIZE:]):
+                raise ValueError("Invalid keystore record: {0}".format(
+                    number
+                ))
+            privkey_bin = _xor(privkey_bin,
+                               _keystream(self._key, self._nonce, number))
+        elif _public_key(privkey_bin) != (pubkey_bin, hash160):
+            raise ValueError("Invalid keystore record: {0}".format(number))
+        return privkey_bin, pubkey_bin, hash160
+
+
+def _create(path, privkeys_bin, key_bin):
+    privkeys_bin = sorted(set(bytes(privkey) for privkey in privkeys_bin))
+    pubkeys_bin = keys.pubkeys_from_privkeys_bytes(privkeys_bin)
+    records = sorted(zip(pubkeys_bin, privkeys_bin))
+    index = sorted(
+        (encoding.hash160(pubkey_bin), number)
+        for number, (pubkey_bin, privkey_bin) in enumerate(records)
+    )
+    flags, nonce, check = 0, b"\0" * 16, b"\0" * 32
+    if key_bin is not None:
+        flags, nonce = _FLAG_ENCRYPTED, os.urandom(16)
+        check = _key_check(key_bin, nonce)
+        mac_key = _mac_key(key_bin, nonce)
+    parts = [_HEADER.pack(_MAGIC, flags, len(records), nonce, check)]
+    for number, (pubkey_bin, privkey_bin) in enumerate(records):
+        if key_bin is not None:
+            privkey_bin = _xor(privkey_bin,
+                               _keystream(key_bin, nonce, number))
+        record = privkey_bin + pubkey_bin + encoding.hash160(pubkey_bin)
+        if key_bin is not None:
+            record += _record_tag(mac_key, number, record)
+        parts.append(record)
+    parts.extend(_INDEX_ENTRY.pack(*entry) for entry in index)
+    util.write_file(path, b"".join(parts))
+    return len(records)
+
+
+def _key_bin(key):
+    key_bin = h2b(key)
+    if len(key_bin) != 32:
+        raise ValueError("Invalid keystore key length: {0}".format(
+            len(key_bin)
+        ))
+    return key_bin
+
+
+def _public_key(privkey_bin):
+    # -> (sec, hash160) or None if the secret exponent is out of range
+    secret_exponent = encoding.from_bytes_32(privkey_bin)
+    if not 0 < secret_exponent < ecc.N:
+        return None
+    return keys.derive_public_key(secret_exponent)[1:]
+
+
+def _record_size(encrypted):
+    return _RECORD_SIZE + _TAG_SIZE if encrypted else _RECORD_SIZE
+
+
+def _key_check(key_bin, nonce):
+    return hmac.new(key_bin, nonce + b"check", hashlib.sha256).digest()
+
+
+def _mac_key(key_bin, nonce):
+    return hmac.new(key_bin, nonce + b"mac", hashlib.sha256).digest()
+
+
+def _record_tag(mac_key, number, record):
+    message = struct.pack(">Q", number) + record
+    return hmac.new(mac_key, message, hashlib.sha256).digest()
+
+
+def _keystream(key_bin, nonce, number):
+    message = nonce + struct.pack(">Q", number)
+    return hmac.new(key_bin, message, hashlib.sha256).digest()
+
+
+def _xor(data, keystream):
+    value = encoding.from_bytes_32(data) ^ encoding.from_bytes_32(keystream)
+    return encoding.to_bytes_32(value)
@@ -3,20 +3,33 @@
 # License: MIT (see LICENSE file)
 
 
-from pycoin import ecdsa
+import itertools
+import multiprocessing
+import string
 from pycoin import encoding
-from pycoin.key import Key
+from pycoin import networks
 from pycoin.tx import Tx
+from pycoin.tx.exceptions import SolvingError
+from pycoin.tx.script import errno
+from pycoin.tx.script import opcodes
 from pycoin.tx.script import tools
-from pycoin.tx.pay_to import SUBCLASSES
+from pycoin.tx.script import ScriptError
 from pycoin.tx.pay_to.ScriptType import DEFAULT_PLACEHOLDER_SIGNATURE
 from pycoin.tx.pay_to.ScriptType import ScriptType
 from pycoin.tx.script.check_signature import parse_signature_blob
-from pycoin.tx.script.der import UnexpectedDER
-from pycoin.tx.pay_to import build_hash160_lookup, build_p2sh_lookup
-from pycoin.serialize import b2h, h2b
-from .util import load_tx
-from .util import xxx_capture_out
+from pycoin.tx.script.der import sigencode_der, UnexpectedDER
+from pycoin.tx.pay_to import build_p2sh_lookup
+from pycoin.intbytes import byte_to_int, bytes_from_int
+from pycoin.serialize import b2h, b2h_rev, h2b
+from . import base58
+from . import ecc
+from . import keys
+from .util import load_tx_bytes
+from .util import LRUCache
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None  # batch validation falls back to per script checks
 
 
 MAX_SEQUENCE = 0x0000FFFF
@@ -48,6 +61,8 @@ CHANGE_SCRIPTSIG = "{sig} {secret} OP_1 OP_0"
 COMMIT_SCRIPTSIG = "OP_0 {payer_sig} {payee_sig} OP_1"
 PAYOUT_SCRIPTSIG = "{sig} {spend_secret} OP_1"
 REVOKE_SCRIPTSIG = "{sig} {revoke_secret} OP_0"
+_PLACEHOLDER = h2b("deadbeef")
+_SCRIPT_CACHE = None  # opt-in, see enable_script_cache
 
 
 class InvalidScript(Exception):
@@ -55,6 +70,10 @@ class InvalidScript(Exception):
     def __init__(self, x):
         msg = "Invalid script: '{0}'"
         super(InvalidScript, self).__init__(msg.format(x))
+        self.x = x
+
+    def __reduce__(self):  # pickle the argument, not the message
+        return type(self), (self.x,)
 
 
 class InvalidPayerSignature(Exception):
@@ -62,6 +81,10 @@ class InvalidPayerSignature(Exception):
     def __init__(self, reason):
         msg = "Invalid payer signature: {0}!".format(reason)
         super(InvalidPayerSignature, self).__init__(msg)
+        self.reason = reason
+
+    def __reduce__(self):  # pickle the argument, not the message
+        return type(self), (self.reason,)
 
 
 class InvalidSequenceValue(Exception):
@@ -69,12 +92,288 @@ class InvalidSequenceValue(Exception):
     def __init__(self, x):
         msg = "Invalid sequence value: {0}"
         super(InvalidSequenceValue, self).__init__(msg.format(x))
+        self.x = x
+
+    def __reduce__(self):  # pickle the argument, not the message
+        return type(self), (self.x,)
 
 
 class BadSignature(Exception):
     pass
 
 
+class _ScriptRecord(object):
+    """ Immutable record of the fields of a parsed script. """
+
+    __slots__ = ()
+
+    def __init__(self, *values):
+        if len(values) != len(self.__slots__):
+            raise TypeError("expected {0} values".format(len(self.__slots__)))
+        for name, value in zip(self.__slots__, values):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("{0} is immutable".format(type(self).__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError("{0} is immutable".format(type(self).__name__))
+
+    def _values(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __reduce__(self):
+        return type(self), self._values()
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._values() == other._values()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._values())
+
+    def __repr__(self):
+        fields = ", ".join("{0}={1!r}".format(name, getattr(self, name))
+                           for name in self.__slots__)
+        return "{0}({1})".format(type(self).__name__, fields)
+
+
+class ParsedDepositScript(_ScriptRecord):
+    """ Fields of a validated deposit script.
+
+    Attributes:
+        script (bytes): The binary deposit script.
+        payer_pubkey (bytes): Payer public key in sec format.
+        payee_pubkey (bytes): Payee public key in sec format.
+        spend_secret_hash (bytes): Hash160 of the spend secret.
+        expire_time (int): Channel expire time in blocks.
+    """
+
+    __slots__ = ("script", "payer_pubkey", "payee_pubkey",
+                 "spend_secret_hash", "expire_time")
+
+
+class ParsedCommitScript(_ScriptRecord):
+    """ Fields of a validated commit script.
+
+    Attributes:
+        script (bytes): The binary commit script.
+        payer_pubkey (bytes): Payer public key in sec format.
+        payee_pubkey (bytes): Payee public key in sec format.
+        spend_secret_hash (bytes): Hash160 of the spend secret.
+        revoke_secret_hash (bytes): Hash160 of the commit revoke secret.
+        delay_time (int): Commit delay time in blocks.
+    """
+
+    __slots__ = ("script", "payer_pubkey", "payee_pubkey",
+                 "spend_secret_hash", "revoke_secret_hash", "delay_time")
+
+
+class _ScriptTemplate(object):
+    """ Fixed opcode and pushdata length layout of a script.
+
+    The template is compiled once from its asm into constant byte fragments
+    separated by variable slots, so matching a script is a sequence of
+    offset driven comparisons without any opcode decoding of the constants,
+    and assembling a script is splicing the slot values between them.
+    """
+
+    PUBKEY = (33, 65)  # allowed push lengths for sec pubkeys
+    HASH160 = (20,)  # allowed push length for hash160 digests
+    SEQUENCE = ()  # small script number, see _parse_sequence_value
+    _MARKERS = {
+        PUBKEY: "OP_PUBKEY",
+        HASH160: "OP_PUBKEYHASH",
+        SEQUENCE: "OP_INVALIDOPCODE",
+    }
+
+    def __init__(self, script_asm, **slots):
+        markers = dict((name, self._MARKERS[kind])
+                       for name, kind in slots.items())
+        template_bin = tools.compile(script_asm.format(**markers))
+        marker_kinds = dict((bytearray(tools.compile(marker))[0], kind)
+                            for kind, marker in self._MARKERS.items())
+        self.layout = []  # [(constant_prefix, slot_kind), ...]
+        self.names = [name for text, name, spec, conversion
+                      in string.Formatter().parse(script_asm) if name]
+        prefix_start = pc = 0
+        while pc < len(template_bin):
+            opcode, data, next_pc = tools.get_opcode(template_bin, pc)
+            if opcode in marker_kinds:
+                prefix = template_bin[prefix_start:pc]
+                self.layout.append((prefix, marker_kinds[opcode]))
+                prefix_start = next_pc
+            pc = next_pc
+        self.suffix = template_bin[prefix_start:]
+        assert(len(self.names) == len(self.layout))
+        self._fixed_layouts = {}
+
+    def assemble(self, **fields):
+        """ Return script with the given field values spliced into the slots.
+
+        Raises:
+            ValueError: If a field has an invalid length or type.
+            InvalidSequenceValue: If a time field is out of range.
+        """
+        return b"".join(self._parts(fields))
+
+    def split(self, name, **fields):
+        """ Return script (prefix, suffix) around the data of slot name.
+
+        The slot must be a fixed length slot occurring once in the script,
+        so prefix + data + suffix is the script for any slot data.
+        """
+        kind = self.layout[self.names.index(name)][1]
+        placeholder = b"\x00" * kind[0]
+        fields[name] = placeholder
+        parts = self._parts(fields)  # [prefix, push, ..., prefix, push, suf]
+        index = 2 * self.names.index(name) + 1
+        push = parts[index][:-len(placeholder)]
+        return b"".join(parts[:index]) + push, b"".join(parts[index + 1:])
+
+    def _parts(self, fields):
+        pushes = {}
+        for name, (prefix, kind) in zip(self.names, self.layout):
+            if name in pushes:  # repeated slot
+                continue
+            value = fields[name]
+            if kind == self.SEQUENCE:
+                if isinstance(value, bool) or not isinstance(value, int):
+                    raise ValueError("{0} must be an int".format(name))
+                if not (MAX_SEQUENCE >= value >= 0):
+                    raise InvalidSequenceValue(value)
+                value = tools.int_to_script_bytes(value)
+            elif not isinstance(value, bytes) or len(value) not in kind:
+                raise ValueError("invalid {0}: {1!r}".format(name, value))
+            pushes[name] = tools.bin_script([value])
+        parts = []
+        for name, (prefix, kind) in zip(self.names, self.layout):
+            parts.append(prefix)
+            parts.append(pushes[name])
+        parts.append(self.suffix)
+        return parts
+
+    def match(self, script):
+        """ Return the (opcode, data) words of the variable slots.
+
+        Repeated slots, such as the payer pubkey of a deposit script, must
+        hold the same data each time.
+
+        Raises:
+            InvalidScript: If the script does not match the template.
+        """
+        view = memoryview(script)
+        size = len(view)
+        words = []
+        slots = {}  # name -> data of the first occurrence
+        pc = 0
+        for name, (prefix, kind) in zip(self.names, self.layout):
+            end = pc + len(prefix)
+            if view[pc:end] != prefix or end >= size:
+                raise InvalidScript(b2h(script))
+            opcode = byte_to_int(view[end])  # str item on python 2
+            pc = end + 1
+            if kind == self.SEQUENCE:
+                if 0 <= opcode < 76:  # OP_0 and direct pushes
+                    data_end = pc + opcode
+                elif 80 < opcode < 97:  # OP_1 - OP_16
+                    words.append((opcode, None))
+                    continue
+                else:
+                    raise InvalidScript(b2h(script))
+            elif opcode in kind:
+                data_end = pc + opcode
+            else:
+                raise InvalidScript(b2h(script))
+            if data_end > size:
+                raise InvalidScript(b2h(script))
+            data = view[pc:data_end].tobytes()
+            if slots.setdefault(name, data) != data:
+                raise InvalidScript(b2h(script))
+            words.append((opcode, data))
+            pc = data_end
+        if view[pc:] != self.suffix:
+            raise InvalidScript(b2h(script))
+        return words
+
+    def fixed_layout(self, length):
+        """ Return byte layout of scripts with given length or None.
+
+        Only the common layout with compressed pubkeys and a script number
+        time of at most three data bytes is described, as a tuple of
+        (mask, expected, sequence_offset, sequence_width, repeats) where mask
+        selects the constant bytes that must equal expected and repeats lists
+        the (first_offset, offset, width) of repeated slots that must equal
+        their first occurrence.
+        """
+        if length not in self._fixed_layouts:
+            self._fixed_layouts[length] = self._build_fixed_layout(length)
+        return self._fixed_layouts[length]
+
+    def _build_fixed_layout(self, length):
+        base_length = len(self.suffix)
+        for prefix, kind in self.layout:
+            base_length += len(prefix)
+            if kind != self.SEQUENCE:
+                base_length += 1 + kind[0]
+        sequence_width = length - base_length
+        if not 1 <= sequence_width <= 4:
+            return None
+        mask = bytearray()
+        expected = bytearray()
+
+        def constant(data):
+            mask.extend(b"\xff" * len(data))
+            expected.extend(data)
+
+        def variable(size):
+            mask.extend(b"\x00" * size)
+            expected.extend(b"\x00" * size)
+
+        sequence_offset = None
+        offsets = {}  # name -> data offset of the first occurrence
+        repeats = []
+        for name, (prefix, kind) in zip(self.names, self.layout):
+            constant(prefix)
+            if kind == self.SEQUENCE:
+                sequence_offset = len(mask)
+                if sequence_width == 1:  # OP_0 or OP_1 - OP_16
+                    variable(1)
+                else:  # direct push of the time bytes
+                    constant(bytearray([sequence_width - 1]))
+                    variable(sequence_width - 1)
+            else:
+                constant(bytearray([kind[0]]))
+                if name in offsets:
+                    repeats.append((offsets[name], len(mask), kind[0]))
+                else:
+                    offsets[name] = len(mask)
+                variable(kind[0])
+        constant(self.suffix)
+        return (numpy.frombuffer(bytes(mask), dtype=numpy.uint8),
+                numpy.frombuffer(bytes(expected), dtype=numpy.uint8),
+                sequence_offset, sequence_width, repeats)
+
+
+_DEPOSIT_TEMPLATE = _ScriptTemplate(
+    DEPOSIT_SCRIPT,
+    payer_pubkey=_ScriptTemplate.PUBKEY,
+    payee_pubkey=_ScriptTemplate.PUBKEY,
+    spend_secret_hash=_ScriptTemplate.HASH160,
+    expire_time=_ScriptTemplate.SEQUENCE
+)
+_COMMIT_TEMPLATE = _ScriptTemplate(
+    COMMIT_SCRIPT,
+    payer_pubkey=_ScriptTemplate.PUBKEY,
+    payee_pubkey=_ScriptTemplate.PUBKEY,
+    spend_secret_hash=_ScriptTemplate.HASH160,
+    revoke_secret_hash=_ScriptTemplate.HASH160,
+    delay_time=_ScriptTemplate.SEQUENCE
+)
+
+
 def validate_deposit_script(deposit_script_hex, validate_expire_time=True):
     """ Validate given script is a depoist script.
 
@@ -86,12 +385,10 @@ def validate_deposit_script(deposit_script_hex, validate_expire_time=True):
         InvalidScript: If the script is not a deposit script.
         InvalidSequenceValue: If the deposit script expire time is invalid.
     """
-    reference_script_hex = compile_deposit_script(
-        "deadbeef", "deadbeef", "deadbeef", "deadbeef"
-    )
-    _validate(reference_script_hex, deposit_script_hex)
     if validate_expire_time:
-        get_deposit_expire_time(deposit_script_hex)  # has valid sequence value
+        parse_deposit_script(deposit_script_hex)  # has valid sequence value
+    else:
+        _deposit_script_words(_script_bin(deposit_script_hex))
 
 
 def validate_commit_script(commit_script_hex, validate_delay_time=True):
@@ -105,19 +402,216 @@ def validate_commit_script(commit_script_hex, validate_delay_time=True):
         InvalidScript: If the script is not a deposit script.
         InvalidSequenceValue: If the commit script delay time is invalid.
     """
-    reference_script_hex = compile_commit_script(
-        "deadbeef", "deadbeef", "deadbeef", "deadbeef", "deadbeef"
-    )
-    _validate(reference_script_hex, commit_script_hex)
     if validate_delay_time:
-        get_commit_delay_time(commit_script_hex)  # has valid sequence value
+        parse_commit_script(commit_script_hex)  # has valid sequence value
+    else:
+        _commit_script_words(_script_bin(commit_script_hex))
+
 
+def validate_deposit_scripts(deposit_scripts, validate_expire_time=True):
+    """ Validate many deposit scripts at once.
+
+    If numpy is available, scripts are grouped by length and the constant
+    bytes of each group are checked with one masked comparison, as is the
+    expire time column. Scripts not confirmed this way, such as scripts
+    with uncompressed pubkeys or invalid scripts, are checked one by one.
+
+    Args:
+        deposit_scripts (iterable): Hex encoded or binary deposit scripts.
+        validate_expire_time (bool): Validate script expire times.
+
+    Return:
+        list: None for each valid script, otherwise the raised exception.
+    """
+    return _validate_scripts(_DEPOSIT_TEMPLATE, validate_deposit_script,
+                             deposit_scripts, validate_expire_time)
+
+
+def validate_commit_scripts(commit_scripts, validate_delay_time=True):
+    """ Validate many commit scripts at once.
+
+    See validate_deposit_scripts.
+
+    Args:
+        commit_scripts (iterable): Hex encoded or binary commit scripts.
+        validate_delay_time (bool): Validate script delay times.
+
+    Return:
+        list: None for each valid script, otherwise the raised exception.
+    """
+    return _validate_scripts(_COMMIT_TEMPLATE, validate_commit_script,
+                             commit_scripts, validate_delay_time)
+
+
+def _validate_scripts(template, validate_func, scripts, validate_time):
+    scripts_bin = [_script_bin(script) for script in scripts]
+    confirmed = [False] * len(scripts_bin)
+    if numpy is not None:
+        by_length = {}
+        for index, script_bin in enumerate(scripts_bin):
+            by_length.setdefault(len(script_bin), []).append(index)
+        for length, indexes in by_length.items():
+            layout = template.fixed_layout(length)
+            if layout is None:
+                continue
+            valid = _match_fixed_layout(
+                layout, [scripts_bin[i] for i in indexes], validate_time
+            )
+            for index, is_valid in zip(indexes, valid):
+                confirmed[index] = bool(is_valid)
+
+    results = []
+    for script_bin, is_confirmed in zip(scripts_bin, confirmed):
+        result = None
+        if not is_confirmed:
+            try:
+                validate_func(script_bin, validate_time)
+            except (InvalidScript, InvalidSequenceValue) as e:
+                result = e
+        results.append(result)
+    return results
+
+
+def _match_fixed_layout(layout, scripts_bin, validate_time):
+    mask, expected, sequence_offset, sequence_width, repeats = layout
+    matrix = numpy.frombuffer(b"".join(scripts_bin), dtype=numpy.uint8)
+    matrix = matrix.reshape(len(scripts_bin), len(mask))
+    valid = ((matrix & mask) == expected).all(axis=1)
+    for first_offset, offset, width in repeats:
+        first = matrix[:, first_offset:first_offset + width]
+        valid &= (matrix[:, offset:offset + width] == first).all(axis=1)
+
+    sequence = matrix[:, sequence_offset:sequence_offset + sequence_width]
+    if sequence_width == 1:  # OP_0 or OP_1 - OP_16, always in range
+        opcode = sequence[:, 0]
+        valid &= (opcode == 0) | ((opcode > 80) & (opcode < 97))
+    elif validate_time:  # little endian script number, no sign bit
+        data = sequence[:, 1:].astype(numpy.int64)
+        value = numpy.zeros(len(scripts_bin), dtype=numpy.int64)
+        for shift in range(sequence_width - 1):
+            value |= data[:, shift] << (8 * shift)
+        valid &= (data[:, -1] & 0x80) == 0
+        valid &= value <= MAX_SEQUENCE
+    return valid
+
+
+def enable_script_cache(maxsize=1024):
+    """ Memoize validated deposit and commit scripts.
+
+    Successfully parsed scripts are kept in a bounded LRU cache keyed by
+    the script bytes, so validating or reading fields of an already
+    accepted script no longer repeats the validation.
+
+    Args:
+        maxsize (int): Maximum number of scripts cached.
+    """
+    global _SCRIPT_CACHE
+    _SCRIPT_CACHE = LRUCache(maxsize=maxsize)
 
-def _validate_payout_scriptsig(payout_script_hex, commit_script_hex):
-    reference_script_hex = _compile_payout_scriptsig(
-        "deadbeef", "deadbeef", commit_script_hex
+
+def disable_script_cache():
+    """ Disable and drop the script cache. """
+    global _SCRIPT_CACHE
+    _SCRIPT_CACHE = None
+
+
+def script_cache_stats():
+    """ Return script cache statistics.
+
+    Return:
+        dict: hits, misses, evictions, size and maxsize or None if disabled.
+    """
+    cache = _SCRIPT_CACHE
+    return cache.stats() if cache is not None else None
+
+
+def parse_deposit_script(deposit_script):
+    """ Validate deposit script and extract all its fields in a single pass.
+
+    Args:
+        deposit_script (str, bytes or memoryview): Hex encoded or binary
+            deposit script.
+
+    Return:
+        ParsedDepositScript: Immutable record of the deposit script fields.
+
+    Raises:
+        InvalidScript: If the script is not a deposit script.
+        InvalidSequenceValue: If the deposit script expire time is invalid.
+    """
+    return _cached_parse(_script_bin(deposit_script), _parse_deposit_script)
+
+
+def parse_commit_script(commit_script):
+    """ Validate commit script and extract all its fields in a single pass.
+
+    Args:
+        commit_script (str, bytes or memoryview): Hex encoded or binary
+            commit script.
+
+    Return:
+        ParsedCommitScript: Immutable record of the commit script fields.
+
+    Raises:
+        InvalidScript: If the script is not a commit script.
+        InvalidSequenceValue: If the commit script delay time is invalid.
+    """
+    return _cached_parse(_script_bin(commit_script), _parse_commit_script)
+
+
+def _cached_parse(script_bin, parse_func):
+    cache = _SCRIPT_CACHE
+    if cache is None:
+        return parse_func(script_bin)
+    key = (parse_func, script_bin)
+    parsed = cache.get(key)
+    if parsed is None:
+        parsed = parse_func(script_bin)  # only valid scripts get cached
+        cache.put(key, parsed)
+    return parsed
+
+
+def _parse_deposit_script(script_bin):
+    words = _deposit_script_words(script_bin)
+    payer_pubkey, payee_pubkey, spend_secret_hash = words[0:3]
+    expire_time = _parse_sequence_word(*words[4])
+    return ParsedDepositScript(
+        script_bin, payer_pubkey[1], payee_pubkey[1],
+        spend_secret_hash[1], expire_time
     )
-    _validate(reference_script_hex, payout_script_hex)
+
+
+def _parse_commit_script(script_bin):
+    words = _commit_script_words(script_bin)
+    delay_time, spend_secret_hash, payee_pubkey = words[0:3]
+    revoke_secret_hash, payer_pubkey = words[3:5]
+    return ParsedCommitScript(
+        script_bin, payer_pubkey[1], payee_pubkey[1], spend_secret_hash[1],
+        revoke_secret_hash[1], _parse_sequence_word(*delay_time)
+    )
+
+
+def _deposit_script_words(script_bin):
+    return _DEPOSIT_TEMPLATE.match(script_bin)
+
+
+def _commit_script_words(script_bin):
+    return _COMMIT_TEMPLATE.match(script_bin)
+
+
+def _script_bin(script):
+    if isinstance(script, memoryview):
+        return script.tobytes()  # bytes(view) is its repr on python 2
+    if isinstance(script, (bytes, bytearray)):
+        return bytes(script)
+    return h2b(script)
+
+
+def _validate_payout_scriptsig(payout_script_bin, commit_script_bin):
+    reference_script_bin = _assemble_script(
+        _PLACEHOLDER, _PLACEHOLDER, opcodes.OP_1, commit_script_bin
+    )
+    _match(reference_script_bin, payout_script_bin)
 
 
 def get_spend_secret(payout_rawtx, commit_script_hex):
@@ -130,79 +624,271 @@ def get_spend_secret(payout_rawtx, commit_script_hex):
     Return:
         str: Hex spend secret or None if not a payout for given commit script.
     """
-    validate_commit_script(commit_script_hex)
-    tx = Tx.from_hex(payout_rawtx)
+    spend_secret = get_spend_secret_bytes(h2b(payout_rawtx),
+                                          h2b(commit_script_hex))
+    return None if spend_secret is None else b2h(spend_secret)
+
+
+def get_spend_secret_bytes(payout_rawtx_bin, commit_script_bin):
+    """ Get spend secret for given binary payout transaction.
+
+    Args:
+        payout_rawtx_bin (bytes): Binary payout raw transaction.
+        commit_script_bin (bytes): Binary commit script.
+
+    Return:
+        bytes: Spend secret or None if not a payout for given commit script.
+    """
+    parse_commit_script(commit_script_bin)
+    Tx.ALLOW_SEGWIT = False  # FIXME remove on next pycoin version
+    tx = Tx.from_bin(payout_rawtx_bin)
     spend_script_bin = tx.txs_in[0].script
     try:
-        _validate_payout_scriptsig(b2h(spend_script_bin), commit_script_hex)
+        _validate_payout_scriptsig(spend_script_bin, commit_script_bin)
     except InvalidScript:
         return None
-    opcode, data, disassembled = get_word(spend_script_bin, 3)
-    opcode, spend_secret, disassembled = get_word(spend_script_bin, 1)
-    return b2h(spend_secret)
+    return ScriptView(spend_script_bin).data(1).tobytes()
+
+
+class PayoutScanner(object):
+    """ Extract spend secrets from payouts of many commits in one pass.
+
+    Commit scripts are indexed by their bytes, which a payout scriptsig
+    pushes as its last word, so each transaction input is checked with a
+    single lookup regardless of the number of commits watched.
+
+    Args:
+        commit_scripts (iterable): Hex encoded commit scripts to watch.
+    """
+
+    def __init__(self, commit_scripts=()):
+        self._commit_scripts = {}  # commit_script_bin -> commit_script_hex
+        for commit_script_hex in commit_scripts:
+            self.add(commit_script_hex)
+
+    def __len__(self):
+        return len(self._commit_scripts)
+
+    def add(self, commit_script_hex):
+        """ Watch for payouts of given commit script.
+
+        Raises:
+            InvalidScript: If the script is not a commit script.
+            InvalidSequenceValue: If the commit script delay time is invalid.
+        """
+        commit_script_bin = parse_commit_script(commit_script_hex).script
+        self._commit_scripts[commit_script_bin] = commit_script_hex
+
+    def remove(self, commit_script_hex):
+        """ Stop watching for payouts of given commit script. """
+        self._commit_scripts.pop(h2b(commit_script_hex), None)
+
+    def scan(self, rawtxs):
+        """ Find payouts of the watched commits in given transactions.
+
+        Args:
+            rawtxs (iterable): Raw transactions hex.
+
+        Return:
+            generator: (txid, input_index, commit_script_hex, spend_secret)
+        """
+        Tx.ALLOW_SEGWIT = False  # FIXME remove on next pycoin version
+        for rawtx in rawtxs:
+            tx = Tx.from_hex(rawtx)
+            for index, tx_in in enumerate(tx.txs_in):
+                result = self._match_payout(tx_in.script)
+                if result is not None:
+                    commit_script_hex, spend_secret = result
+                    yield (b2h_rev(tx.hash()), index,
+                           commit_script_hex, b2h(spend_secret))
+
+    def _match_payout(self, script_bin):
+        try:
+            view = ScriptView(script_bin)
+        except ScriptError:
+            return None
+        if len(view) != 4 or view.data(3) is None:
+            return None
+        commit_script_bin = view.data(3).tobytes()
+        commit_script_hex = self._commit_scripts.get(commit_script_bin)
+        if commit_script_hex is None:
+            return None
+        try:
+            _validate_payout_scriptsig(script_bin, commit_script_bin)
+        except InvalidScript:
+            return None
+        spend_secret = view.data(1)
+        if spend_secret is None:
+            return None
+        return commit_script_hex, spend_secret.tobytes()
+
+
+class CommitIndex(object):
+    """ Index of commits by p2sh hash160 and revoke secret hash.
+
+    Answers which held commit a published output pays to and whether its
+    revoke secret is known, in constant time for any number of commits.
+
+    Args:
+        commit_scripts (iterable): Hex encoded commit scripts to index.
+    """
+
+    def __init__(self, commit_scripts=()):
+        self._commits = {}  # p2sh hash160 -> (script_hex, revoke_hash)
+        self._hash160s = {}  # revoke_secret_hash -> [p2sh hash160, ...]
+        self._revoke_secrets = {}  # revoke_secret_hash -> revoke_secret_bin
+        for commit_script_hex in commit_scripts:
+            self.add(commit_script_hex)
+
+    def __len__(self):
+        return len(self._commits)
+
+    def add(self, commit_script_hex, revoke_secret=None):
+        """ Add commit script and optionally its revoke secret.
+
+        Raises:
+            InvalidScript: If the script is not a commit script.
+            InvalidSequenceValue: If the commit script delay time is invalid.
+        """
+        commit_script = parse_commit_script(commit_script_hex)
+        hash160 = encoding.hash160(commit_script.script)
+        revoke_secret_hash = commit_script.revoke_secret_hash
+        self._commits[hash160] = (b2h(commit_script.script),
+                                  revoke_secret_hash)
+        hash160s = self._hash160s.setdefault(revoke_secret_hash, [])
+        if hash160 in hash160s:
+            hash160s.remove(hash160)
+        hash160s.append(hash160)  # in order added
+        if revoke_secret is not None:
+            self.add_revoke_secret(revoke_secret)
+
+    def remove(self, commit_script_hex):
+        """ Remove commit script and its revoke secret from the index. """
+        hash160 = encoding.hash160(h2b(commit_script_hex))
+        commit = self._commits.pop(hash160, None)
+        if commit is None:
+            return
+        revoke_secret_hash = commit[1]
+        hash160s = self._hash160s[revoke_secret_hash]
+        hash160s.remove(hash160)
+        if not hash160s:  # last commit with this revoke secret hash
+            del self._hash160s[revoke_secret_hash]
+            self._revoke_secrets.pop(revoke_secret_hash, None)
+
+    def add_revoke_secret(self, revoke_secret):
+        """ Record revealed revoke secret of an indexed commit.
+
+        Args:
+            revoke_secret (str): Hex encoded revoke secret.
+
+        Return:
+            bool: True if the secret revokes an indexed commit.
+        """
+        revoke_secret_bin = h2b(revoke_secret)
+        revoke_secret_hash = encoding.hash160(revoke_secret_bin)
+        if revoke_secret_hash not in self._hash160s:
+            return False
+        self._revoke_secrets[revoke_secret_hash] = revoke_secret_bin
+        return True
+
+    def find_by_hash160(self, hash160):
+        """ Find commit paid to by given p2sh hash160.
+
+        Args:
+            hash160 (str): Hex encoded p2sh hash160.
+
+        Return:
+            tuple: (commit_script_hex, revoke_secret or None) or None.
+        """
+        commit = self._commits.get(h2b(hash160))
+        if commit is None:
+            return None
+        commit_script_hex, revoke_secret_hash = commit
+        revoke_secret = self._revoke_secrets.get(revoke_secret_hash)
+        return (commit_script_hex,
+                None if revoke_secret is None else b2h(revoke_secret))
+
+    def find_by_address(self, address):
+        """ Find commit paid to by given p2sh address, see find_by_hash160. """
+        data = base58.a2b_hashed_base58(address)
+        return self.find_by_hash160(b2h(data[1:]))
+
+    def find_by_revoke_secret_hash(self, revoke_secret_hash):
+        """ Find commit with given hex revoke secret hash, see find_by_hash160.
+
+        If several commits share the revoke secret hash, the one added last
+        is returned.
+        """
+        hash160s = self._hash160s.get(h2b(revoke_secret_hash))
+        if not hash160s:
+            return None
+        return self.find_by_hash160(b2h(hash160s[-1]))
+
+    def scan_tx(self, rawtx):
+        """ Find outputs of given transaction paying to indexed commits.
+
+        Args:
+            rawtx (str): Raw transaction hex.
+
+        Return:
+            list: (output_index, commit_script_hex, revoke_secret or None)
+        """
+        Tx.ALLOW_SEGWIT = False  # FIXME remove on next pycoin version
+        results = []
+        for index, tx_out in enumerate(Tx.from_hex(rawtx).txs_out):
+            script = tx_out.script
+            if len(script) != 23 or script[:2] != b"\xa9\x14" or \
+                    script[22:] != b"\x87":  # OP_HASH160 <20> OP_EQUAL
+                continue
+            commit = self.find_by_hash160(b2h(script[2:22]))
+            if commit is not None:
+                results.append((index,) + commit)
+        return results
 
 
 def get_commit_payer_pubkey(script_hex):
     """ Return payer pubkey for given commit script. """
-    validate_commit_script(script_hex)
-    opcode, data, disassembled = get_word(h2b(script_hex), 13)
-    return b2h(data)
+    return b2h(parse_commit_script(script_hex).payer_pubkey)
 
 
 def get_commit_payee_pubkey(script_hex):
     """ Return payee pubkey for given commit script. """
-    validate_commit_script(script_hex)
-    opcode, data, disassembled = get_word(h2b(script_hex), 7)
-    return b2h(data)
+    return b2h(parse_commit_script(script_hex).payee_pubkey)
 
 
 def get_commit_delay_time(script_hex):
     """ Return delay time for given commit script. """
-    validate_commit_script(script_hex, validate_delay_time=False)
-    opcode, data, disassembled = get_word(h2b(script_hex), 1)
-    return _parse_sequence_value(opcode, data, disassembled)
+    return parse_commit_script(script_hex).delay_time
 
 
 def get_commit_spend_secret_hash(script_hex):
     """ Return spend secret for given commit script. """
-    validate_commit_script(script_hex)
-    opcode, data, disassembled = get_word(h2b(script_hex), 5)
-    return b2h(data)
+    return b2h(parse_commit_script(script_hex).spend_secret_hash)
 
 
 def get_commit_revoke_secret_hash(script_hex):
     """ Return revoke secret hash for given commit script. """
-    validate_commit_script(script_hex)
-    opcode, data, disassembled = get_word(h2b(script_hex), 11)
-    return b2h(data)
+    return b2h(parse_commit_script(script_hex).revoke_secret_hash)
 
 
 def get_deposit_payer_pubkey(script_hex):
     """ Return payer pubkey for given deposit script. """
-    validate_deposit_script(script_hex)
-    opcode, data, disassembled = get_word(h2b(script_hex), 2)
-    return b2h(data)
+    return b2h(parse_deposit_script(script_hex).payer_pubkey)
 
 
 def get_deposit_payee_pubkey(script_hex):
     """ Return payee pubkey for given deposit script. """
-    validate_deposit_script(script_hex)
-    opcode, data, disassembled = get_word(h2b(script_hex), 3)
-    return b2h(data)
+    return b2h(parse_deposit_script(script_hex).payee_pubkey)
 
 
 def get_deposit_expire_time(script_hex):
     """ Return expire time for given deposit script. """
-    validate_deposit_script(script_hex, validate_expire_time=False)
-    opcode, data, disassembled = get_word(h2b(script_hex), 14)
-    return _parse_sequence_value(opcode, data, disassembled)
+    return parse_deposit_script(script_hex).expire_time
 
 
 def get_deposit_spend_secret_hash(script_hex):
     """ Return spend secret hash for given deposit script. """
-    validate_deposit_script(script_hex)
-    opcode, data, disassembled = get_word(h2b(script_hex), 9)
-    return b2h(data)
+    return b2h(parse_deposit_script(script_hex).spend_secret_hash)
 
 
 def compile_deposit_script(payer_pubkey, payee_pubkey,
@@ -218,6 +904,13 @@ def compile_deposit_script(payer_pubkey, payee_pubkey,
     Return:
         Compiled hex encoded deposit script.
     """
+    try:
+        return b2h(compile_deposit_script_bytes(
+            h2b(payer_pubkey), h2b(payee_pubkey),
+            h2b(spend_secret_hash), expire_time
+        ))
+    except (TypeError, ValueError, InvalidSequenceValue):
+        pass  # not hex or not well formed, e.g. asm template placeholders
     script_asm = DEPOSIT_SCRIPT.format(
         payer_pubkey=payer_pubkey,
         payee_pubkey=payee_pubkey,
@@ -227,6 +920,29 @@ def compile_deposit_script(payer_pubkey, payee_pubkey,
     return b2h(tools.compile(script_asm))
 
 
+def compile_deposit_script_bytes(payer_pubkey, payee_pubkey,
+                                 spend_secret_hash, expire_time):
+    """ Assemble binary deposit script directly from its fields.
+
+    Args:
+        payer_pubkey (bytes): Public key in sec format.
+        payee_pubkey (bytes): Public key in sec format.
+        spend_secret_hash (bytes): Hash160 of spend secret.
+        expire_time (int): Channel expire time in blocks given as int.
+
+    Return:
+        bytes: Deposit script, identical to compile_deposit_script.
+
+    Raises:
+        ValueError: If a pubkey or hash has an invalid length.
+        InvalidSequenceValue: If the expire time is out of range.
+    """
+    return _DEPOSIT_TEMPLATE.assemble(
+        payer_pubkey=payer_pubkey, payee_pubkey=payee_pubkey,
+        spend_secret_hash=spend_secret_hash, expire_time=expire_time
+    )
+
+
 def compile_commit_script(payer_pubkey, payee_pubkey, spend_secret_hash,
                           revoke_secret_hash, delay_time):
     """ Compile commit script for given requirements.
@@ -241,6 +957,13 @@ def compile_commit_script(payer_pubkey, payee_pubkey, spend_secret_hash,
     Return:
         Compiled hex encoded commit script.
     """
+    try:
+        return b2h(compile_commit_script_bytes(
+            h2b(payer_pubkey), h2b(payee_pubkey), h2b(spend_secret_hash),
+            h2b(revoke_secret_hash), delay_time
+        ))
+    except (TypeError, ValueError, InvalidSequenceValue):
+        pass  # not hex or not well formed, e.g. asm template placeholders
     script_asm = COMMIT_SCRIPT.format(
         payer_pubkey=payer_pubkey,
         payee_pubkey=payee_pubkey,
@@ -251,6 +974,98 @@ def compile_commit_script(payer_pubkey, payee_pubkey, spend_secret_hash,
     return b2h(tools.compile(script_asm))
 
 
+def compile_commit_script_bytes(payer_pubkey, payee_pubkey, spend_secret_hash,
+                                revoke_secret_hash, delay_time):
+    """ Assemble binary commit script directly from its fields.
+
+    Args:
+        payer_pubkey (bytes): Public key in sec format.
+        payee_pubkey (bytes): Public key in sec format.
+        spend_secret_hash (bytes): Hash160 of spend secret.
+        revoke_secret_hash (bytes): Hash160 of commit revoke secret.
+        delay_time (int): Commit delay time in blocks given as int.
+
+    Return:
+        bytes: Commit script, identical to compile_commit_script.
+
+    Raises:
+        ValueError: If a pubkey or hash has an invalid length.
+        InvalidSequenceValue: If the delay time is out of range.
+    """
+    return _COMMIT_TEMPLATE.assemble(
+        payer_pubkey=payer_pubkey, payee_pubkey=payee_pubkey,
+        spend_secret_hash=spend_secret_hash,
+        revoke_secret_hash=revoke_secret_hash, delay_time=delay_time
+    )
+
+
+class CommitChain(object):
+    """ Generator for the commit scripts of a payer channel.
+
+    All commits of a channel share payer and payee pubkey, spend secret
+    hash and delay time, only the revoke secret hash differs. The script
+    prefix and suffix around the revoke secret hash are compiled once, so
+    each commit costs one splice and one hash160.
+
+    Args:
+        payer_pubkey (str): Hex encoded public key in sec format.
+        payee_pubkey (str): Hex encoded public key in sec format.
+        spend_secret_hash (str): Hex encoded hash160 of spend secret.
+        delay_time (int): Commit delay time in blocks given as int.
+        netcode (str): Netcode for resulting p2sh addresses.
+
+    Raises:
+        ValueError: If the netcode is unknown.
+    """
+
+    def __init__(self, payer_pubkey, payee_pubkey, spend_secret_hash,
+                 delay_time, netcode="BTC"):
+        address_prefix = networks.pay_to_script_prefix_for_netcode(netcode)
+        if address_prefix is None:
+            raise ValueError("Unknown netcode: {0}".format(netcode))
+        self.prefix, self.suffix = _COMMIT_TEMPLATE.split(
+            "revoke_secret_hash", payer_pubkey=h2b(payer_pubkey),
+            payee_pubkey=h2b(payee_pubkey),
+            spend_secret_hash=h2b(spend_secret_hash), delay_time=delay_time
+        )
+        self.netcode = netcode
+        self._address_prefix = address_prefix
+
+    def commit(self, revoke_secret_hash):
+        """ Return commit for given revoke secret hash.
+
+        Args:
+            revoke_secret_hash (str): Hex encoded hash160 of revoke secret.
+
+        Return:
+            tuple: (commit_script_hex, p2sh_address, revoke_secret_hash)
+        """
+        revoke_secret_hash_bin = h2b(revoke_secret_hash)
+        if len(revoke_secret_hash_bin) != 20:
+            raise ValueError("invalid revoke_secret_hash: {0}".format(
+                revoke_secret_hash
+            ))
+        script_bin = self.prefix + revoke_secret_hash_bin + self.suffix
+        address = base58.b2a_hashed_base58(
+            self._address_prefix + encoding.hash160(script_bin)
+        )
+        return b2h(script_bin), address, revoke_secret_hash
+
+    def stream(self, revoke_secret_hashes, count=None):
+        """ Lazily yield commits for the given revoke secret hashes.
+
+        Args:
+            revoke_secret_hashes (iterable): Hex encoded revoke secret hashes.
+            count (int): Stop after count commits, all if None.
+
+        Return:
+            generator: (commit_script_hex, p2sh_address, revoke_secret_hash)
+        """
+        for revoke_secret_hash in itertools.islice(revoke_secret_hashes,
+                                                   count):
+            yield self.commit(revoke_secret_hash)
+
+
 def sign_deposit(get_txs_func, payer_wif, rawtx):
     """ Sign deposit transaction.
 
@@ -262,11 +1077,23 @@ def sign_deposit(get_txs_func, payer_wif, rawtx):
     Return:
         Signed deposit raw transaction.
     """
-    tx = load_tx(get_txs_func, rawtx)
-    key = Key.from_text(payer_wif)
-    with xxx_capture_out():
-        tx.sign(build_hash160_lookup([key.secret_exponent()]))
-    return tx.as_hex()
+    return b2h(sign_deposit_bytes(get_txs_func, payer_wif, h2b(rawtx)))
+
+
+def sign_deposit_bytes(get_txs_func, payer_wif, rawtx_bin):
+    """ Sign binary deposit transaction.
+
+    Args:
+        get_txs_func (function): txid list -> matching raw transactions.
+        payer_wif (str): Payer wif used for signing.
+        rawtx_bin (bytes): Binary deposit raw transaction to be signed.
+
+    Return:
+        bytes: Signed deposit raw transaction.
+    """
+    tx = load_tx_bytes(get_txs_func, rawtx_bin)
+    tx.sign(_hash160_lookup(payer_wif))
+    return tx.as_bin()
 
 
 def sign_created_commit(get_txs_func, payer_wif, rawtx, deposit_script_hex):
@@ -281,16 +1108,27 @@ def sign_created_commit(get_txs_func, payer_wif, rawtx, deposit_script_hex):
     Return:
         Partially signed commit raw transaction.
     """
-    validate_deposit_script(deposit_script_hex)
-    tx = load_tx(get_txs_func, rawtx)
-    expire_time = get_deposit_expire_time(deposit_script_hex)
-    hash160_lookup, p2sh_lookup = _make_lookups(payer_wif, deposit_script_hex)
-    hash160_lookup, p2sh_lookup = _make_lookups(payer_wif, deposit_script_hex)
-    with _DepositScriptHandler(expire_time):
-        with xxx_capture_out():
-            tx.sign(hash160_lookup, p2sh_lookup=p2sh_lookup,
-                    spend_type="create_commit", spend_secret=None)
-    return tx.as_hex()
+    return b2h(sign_created_commit_bytes(
+        get_txs_func, payer_wif, h2b(rawtx), h2b(deposit_script_hex)
+    ))
+
+
+def sign_created_commit_bytes(get_txs_func, payer_wif, rawtx_bin,
+                              deposit_script_bin):
+    """ Sign binary created commit transaction.
+
+    Args:
+        get_txs_func (function): txid list -> matching raw transactions.
+        payer_wif (str): Payer wif used for signing.
+        rawtx_bin (bytes): Binary commit raw transaction to be signed.
+        deposit_script_bin (bytes): Matching deposit script for given commit.
+
+    Return:
+        bytes: Partially signed commit raw transaction.
+    """
+    deposit = _ScriptSpend(parse_deposit_script(deposit_script_bin))
+    tx = load_tx_bytes(get_txs_func, rawtx_bin)
+    return _sign_created_commit(tx, _hash160_lookup(payer_wif), deposit)
 
 
 def sign_finalize_commit(get_txs_func, payee_wif, rawtx, deposit_script_hex):
@@ -305,16 +1143,27 @@ def sign_finalize_commit(get_txs_func, payee_wif, rawtx, deposit_script_hex):
     Return:
         Fully signed commit raw transaction.
     """
-    validate_deposit_script(deposit_script_hex)
-    tx = load_tx(get_txs_func, rawtx)
-    expire_time = get_deposit_expire_time(deposit_script_hex)
-    hash160_lookup, p2sh_lookup = _make_lookups(payee_wif, deposit_script_hex)
-    with _DepositScriptHandler(expire_time):
-        with xxx_capture_out():
-            tx.sign(hash160_lookup, p2sh_lookup=p2sh_lookup,
-                    spend_type="finalize_commit", spend_secret=None)
-    assert(tx.bad_signature_count() == 0)
-    return tx.as_hex()
+    return b2h(sign_finalize_commit_bytes(
+        get_txs_func, payee_wif, h2b(rawtx), h2b(deposit_script_hex)
+    ))
+
+
+def sign_finalize_commit_bytes(get_txs_func, payee_wif, rawtx_bin,
+                               deposit_script_bin):
+    """ Finalize binary commit transaction signature.
+
+    Args:
+        get_txs_func (function): txid list -> matching raw transactions.
+        payee_wif (str): Payee wif used for signing.
+        rawtx_bin (bytes): Binary commit raw transaction to be signed.
+        deposit_script_bin (bytes): Matching deposit script for given commit.
+
+    Return:
+        bytes: Fully signed commit raw transaction.
+    """
+    deposit = _ScriptSpend(parse_deposit_script(deposit_script_bin))
+    tx = load_tx_bytes(get_txs_func, rawtx_bin)
+    return _sign_finalize_commit(tx, _hash160_lookup(payee_wif), deposit)
 
 
 def sign_revoke_recover(get_txs_func, payer_wif, rawtx,
@@ -331,10 +1180,30 @@ def sign_revoke_recover(get_txs_func, payer_wif, rawtx,
     Return:
         Signed revoke raw transaction.
     """
-    validate_commit_script(commit_script_hex)
-    return _sign_commit_recover(get_txs_func, payer_wif, rawtx,
-                                commit_script_hex, "revoke",
-                                None, revoke_secret)
+    return b2h(sign_revoke_recover_bytes(
+        get_txs_func, payer_wif, h2b(rawtx), h2b(commit_script_hex),
+        h2b(revoke_secret)
+    ))
+
+
+def sign_revoke_recover_bytes(get_txs_func, payer_wif, rawtx_bin,
+                              commit_script_bin, revoke_secret_bin):
+    """ Sign binary revoke recover transaction.
+
+    Args:
+        get_txs_func (function): txid list -> matching raw transactions.
+        payer_wif (str): Payer wif used for signing.
+        rawtx_bin (bytes): Binary revoke raw transaction to be signed.
+        commit_script_bin (bytes): Matching commit script for transaction.
+        revoke_secret_bin (bytes): Revoke secret for commit script.
+
+    Return:
+        bytes: Signed revoke raw transaction.
+    """
+    commit = _ScriptSpend(parse_commit_script(commit_script_bin))
+    tx = load_tx_bytes(get_txs_func, rawtx_bin)
+    return _sign_revoke_recover(tx, _hash160_lookup(payer_wif),
+                                commit, revoke_secret_bin)
 
 
 def sign_payout_recover(get_txs_func, payee_wif, rawtx,
@@ -350,10 +1219,30 @@ def sign_payout_recover(get_txs_func, payee_wif, rawtx,
     Return:
         Signed payout raw transaction.
     """
-    validate_commit_script(commit_script_hex)
-    return _sign_commit_recover(get_txs_func, payee_wif, rawtx,
-                                commit_script_hex, "payout",
-                                spend_secret, None)
+    return b2h(sign_payout_recover_bytes(
+        get_txs_func, payee_wif, h2b(rawtx), h2b(commit_script_hex),
+        h2b(spend_secret)
+    ))
+
+
+def sign_payout_recover_bytes(get_txs_func, payee_wif, rawtx_bin,
+                              commit_script_bin, spend_secret_bin):
+    """ Sign binary payout recover transaction.
+
+    Args:
+        get_txs_func (function): txid list -> matching raw transactions.
+        payee_wif (str): Payee wif used for signing.
+        rawtx_bin (bytes): Binary payout raw transaction to be signed.
+        commit_script_bin (bytes): Matching commit script for transaction.
+        spend_secret_bin (bytes): Deposit spend secret.
+
+    Return:
+        bytes: Signed payout raw transaction.
+    """
+    commit = _ScriptSpend(parse_commit_script(commit_script_bin))
+    tx = load_tx_bytes(get_txs_func, rawtx_bin)
+    return _sign_payout_recover(tx, _hash160_lookup(payee_wif),
+                                commit, spend_secret_bin)
 
 
 def sign_change_recover(get_txs_func, payer_wif, rawtx,
@@ -370,14 +1259,30 @@ def sign_change_recover(get_txs_func, payer_wif, rawtx,
     Return:
         Signed change raw transaction.
     """
-    validate_deposit_script(deposit_script_hex)
-    spend_secret_hash = get_deposit_spend_secret_hash(deposit_script_hex)
-    provided_spend_secret_hash = b2h(encoding.hash160(h2b(spend_secret)))
-    assert provided_spend_secret_hash == spend_secret_hash
-    return _sign_deposit_recover(
-        get_txs_func, payer_wif, rawtx,
-        deposit_script_hex, "change", spend_secret
-    )
+    return b2h(sign_change_recover_bytes(
+        get_txs_func, payer_wif, h2b(rawtx), h2b(deposit_script_hex),
+        h2b(spend_secret)
+    ))
+
+
+def sign_change_recover_bytes(get_txs_func, payer_wif, rawtx_bin,
+                              deposit_script_bin, spend_secret_bin):
+    """ Sign binary change recover transaction.
+
+    Args:
+        get_txs_func (function): txid list -> matching raw transactions.
+        payer_wif (str): Payer wif used for signing.
+        rawtx_bin (bytes): Binary change raw transaction to be signed.
+        deposit_script_bin (bytes): Matching deposit script for transaction.
+        spend_secret_bin (bytes): Deposit spend secret to recover change.
+
+    Return:
+        bytes: Signed change raw transaction.
+    """
+    deposit = _ScriptSpend(parse_deposit_script(deposit_script_bin))
+    tx = load_tx_bytes(get_txs_func, rawtx_bin)
+    return _sign_change_recover(tx, _hash160_lookup(payer_wif),
+                                deposit, spend_secret_bin)
 
 
 def sign_expire_recover(get_txs_func, payer_wif, rawtx, deposit_script_hex):
@@ -392,45 +1297,559 @@ def sign_expire_recover(get_txs_func, payer_wif, rawtx, deposit_script_hex):
     Return:
         Signed expire raw transaction.
     """
-    validate_deposit_script(deposit_script_hex)
-    return _sign_deposit_recover(
-        get_txs_func, payer_wif, rawtx, deposit_script_hex, "expire", None
-    )
+    return b2h(sign_expire_recover_bytes(
+        get_txs_func, payer_wif, h2b(rawtx), h2b(deposit_script_hex)
+    ))
 
 
-def _sign_deposit_recover(get_txs_func, wif, rawtx, script_hex,
-                          spend_type, spend_secret):
-    tx = load_tx(get_txs_func, rawtx)
-    expire_time = get_deposit_expire_time(script_hex)
-    hash160_lookup, p2sh_lookup = _make_lookups(wif, script_hex)
-    with _DepositScriptHandler(expire_time):
-        with xxx_capture_out():
-            tx.sign(hash160_lookup, p2sh_lookup=p2sh_lookup,
-                    spend_type=spend_type, spend_secret=spend_secret)
+def sign_expire_recover_bytes(get_txs_func, payer_wif, rawtx_bin,
+                              deposit_script_bin):
+    """ Sign binary expire recover transaction.
+
+    Args:
+        get_txs_func (function): txid list -> matching raw transactions.
+        payer_wif (str): Payer wif used for signing.
+        rawtx_bin (bytes): Binary expire raw transaction to be signed.
+        deposit_script_bin (bytes): Matching deposit script for transaction.
+
+    Return:
+        bytes: Signed expire raw transaction.
+    """
+    deposit = _ScriptSpend(parse_deposit_script(deposit_script_bin))
+    tx = load_tx_bytes(get_txs_func, rawtx_bin)
+    return _sign_expire_recover(tx, _hash160_lookup(payer_wif), deposit)
+
+
+class ChannelSigner(object):
+    """ Signs the transactions of one channel with one key.
+
+    The wif, the deposit script and their lookups are parsed once, so each
+    signature only costs the sighash and the ECDSA signing itself. Parsed
+    commit scripts are kept in a bounded cache for the recover methods.
+    """
+
+    def __init__(self, wif, deposit_script_hex, commit_cache_size=256):
+        """ Create a signer for a channel.
+
+        Args:
+            wif (str): Payer or payee wif used for signing.
+            deposit_script_hex (str): Deposit script of the channel.
+            commit_cache_size (int): Max number of parsed commit scripts.
+
+        Raises:
+            InvalidScript: If the deposit script is invalid.
+        """
+        self.deposit_script = parse_deposit_script(deposit_script_hex)
+        self._deposit = _ScriptSpend(self.deposit_script)
+        self._hash160_lookup = _hash160_lookup(wif)
+        self._commits = LRUCache(maxsize=commit_cache_size)
+
+    def create_commit(self, get_txs_func, rawtx):
+        """ Sign created commit transaction, see sign_created_commit. """
+        tx = load_tx_bytes(get_txs_func, h2b(rawtx))
+        return b2h(_sign_created_commit(tx, self._hash160_lookup,
+                                        self._deposit))
+
+    def finalize_commit(self, get_txs_func, rawtx):
+        """ Finalize commit transaction, see sign_finalize_commit. """
+        tx = load_tx_bytes(get_txs_func, h2b(rawtx))
+        return b2h(_sign_finalize_commit(tx, self._hash160_lookup,
+                                         self._deposit))
+
+    def recover_revoke(self, get_txs_func, rawtx, commit_script_hex,
+                       revoke_secret):
+        """ Sign revoke recover transaction, see sign_revoke_recover. """
+        commit = self._commit(commit_script_hex)
+        tx = load_tx_bytes(get_txs_func, h2b(rawtx))
+        return b2h(_sign_revoke_recover(tx, self._hash160_lookup, commit,
+                                        h2b(revoke_secret)))
+
+    def recover_payout(self, get_txs_func, rawtx, commit_script_hex,
+                       spend_secret):
+        """ Sign payout recover transaction, see sign_payout_recover. """
+        commit = self._commit(commit_script_hex)
+        tx = load_tx_bytes(get_txs_func, h2b(rawtx))
+        return b2h(_sign_payout_recover(tx, self._hash160_lookup, commit,
+                                        h2b(spend_secret)))
+
+    def recover_change(self, get_txs_func, rawtx, spend_secret):
+        """ Sign change recover transaction, see sign_change_recover. """
+        tx = load_tx_bytes(get_txs_func, h2b(rawtx))
+        return b2h(_sign_change_recover(tx, self._hash160_lookup,
+                                        self._deposit, h2b(spend_secret)))
+
+    def recover_expire(self, get_txs_func, rawtx):
+        """ Sign expire recover transaction, see sign_expire_recover. """
+        tx = load_tx_bytes(get_txs_func, h2b(rawtx))
+        return b2h(_sign_expire_recover(tx, self._hash160_lookup,
+                                        self._deposit))
+
+    def _commit(self, commit_script_hex):
+        script_bin = _script_bin(commit_script_hex)
+        commit = self._commits.get(script_bin)
+        if commit is None:
+            commit = _ScriptSpend(parse_commit_script(script_bin))
+            self._commits.put(script_bin, commit)
+        return commit
+
+
+class _ScriptSpend(object):
+
+    def __init__(self, parsed_script):
+        self.parsed = parsed_script
+        self.p2sh_lookup = build_p2sh_lookup([parsed_script.script])
+        if isinstance(parsed_script, ParsedCommitScript):
+            script_type = _commit_script_type(parsed_script.delay_time)
+        else:
+            script_type = _deposit_script_type(parsed_script.expire_time)
+        self.solvers = _ScriptSolvers(script_type)
+
+    def sign(self, tx, hash160_lookup, **kwargs):
+        self.solvers.sign(tx, hash160_lookup, p2sh_lookup=self.p2sh_lookup,
+                          **kwargs)
+
+
+def _sign_created_commit(tx, hash160_lookup, deposit):
+    deposit.sign(tx, hash160_lookup, spend_type="create_commit",
+                 spend_secret=None)
+    return tx.as_bin()
+
+
+def _sign_finalize_commit(tx, hash160_lookup, deposit):
+    deposit.sign(tx, hash160_lookup, spend_type="finalize_commit",
+                 spend_secret=None)
     assert(tx.bad_signature_count() == 0)
-    return tx.as_hex()
-
-
-def _sign_commit_recover(get_txs_func, wif, rawtx, script_hex, spend_type,
-                         spend_secret, revoke_secret):
-    tx = load_tx(get_txs_func, rawtx)
-    delay_time = get_commit_delay_time(script_hex)
-    hash160_lookup, p2sh_lookup = _make_lookups(wif, script_hex)
-    with _CommitScriptHandler(delay_time):
-        with xxx_capture_out():
-            tx.sign(hash160_lookup, p2sh_lookup=p2sh_lookup,
-                    spend_type=spend_type, spend_secret=spend_secret,
-                    revoke_secret=revoke_secret)
+    return tx.as_bin()
+
+
+def _sign_revoke_recover(tx, hash160_lookup, commit, revoke_secret):
+    commit.sign(tx, hash160_lookup, spend_type="revoke",
+                spend_secret=None, revoke_secret=revoke_secret)
+    assert(tx.bad_signature_count() == 0)
+    return tx.as_bin()
+
+
+def _sign_payout_recover(tx, hash160_lookup, commit, spend_secret):
+    commit.sign(tx, hash160_lookup, spend_type="payout",
+                spend_secret=spend_secret, revoke_secret=None)
     assert(tx.bad_signature_count() == 0)
-    return tx.as_hex()
+    return tx.as_bin()
+
+
+def _sign_change_recover(tx, hash160_lookup, deposit, spend_secret):
+    provided_spend_secret_hash = encoding.hash160(spend_secret)
+    assert provided_spend_secret_hash == deposit.parsed.spend_secret_hash
+    deposit.sign(tx, hash160_lookup, spend_type="change",
+                 spend_secret=spend_secret)
+    assert(tx.bad_signature_count() == 0)
+    return tx.as_bin()
+
+
+def _sign_expire_recover(tx, hash160_lookup, deposit):
+    deposit.sign(tx, hash160_lookup, spend_type="expire", spend_secret=None)
+    assert(tx.bad_signature_count() == 0)
+    return tx.as_bin()
+
+
+def _hash160_lookup(wif):
+    # same as build_hash160_lookup but using the key derivation cache
+    secret_exponent = encoding.from_bytes_32(keys.wif_to_privkey_bytes(wif))
+    public_pair, sec, hash160 = keys.derive_public_key(secret_exponent)
+    uncompressed_hash160 = encoding.public_pair_to_hash160_sec(
+        public_pair, compressed=False
+    )
+    return {
+        hash160: (secret_exponent, public_pair, True),
+        uncompressed_hash160: (secret_exponent, public_pair, False),
+    }
+
+
+def sign_created_commits(get_txs_func, batch, workers=None, chunksize=None):
+    """ Sign a batch of created commit transactions in parallel.
+
+    Args:
+        get_txs_func (function): txid list -> matching raw transactions.
+        batch (list): Dicts of sign_created_commit arguments payer_wif,
+                      rawtx and deposit_script_hex.
+        workers (int): Number of worker processes, cpu count if None.
+        chunksize (int): Items per worker task, chosen if None.
+
+    Return:
+        list: Partially signed commit raw transaction or raised exception
+              for each batch item, in input order.
+    """
+    return _sign_batch("created_commit", get_txs_func, batch,
+                       workers, chunksize)
+
+
+def sign_created_commits_bytes(get_txs_func, batch, workers=None,
+                               chunksize=None):
+    """ Sign a batch of binary created commit transactions in parallel.
+
+    Args:
+        get_txs_func (function): txid list -> matching raw transactions.
+        batch (list): Dicts of sign_created_commit_bytes arguments
+                      payer_wif, rawtx_bin and deposit_script_bin.
+        workers (int): Number of worker processes, cpu count if None.
+        chunksize (int): Items per worker task, chosen if None.
+
+    Return:
+        list: Partially signed commit raw transaction bytes or raised
+              exception for each batch item, in input order.
+    """
+    return _sign_batch("created_commit", get_txs_func, batch,
+                       workers, chunksize, binary=True)
+
+
+def sign_finalize_commits(get_txs_func, batch, workers=None, chunksize=None):
+    """ Finalize a batch of commit transaction signatures in parallel.
+
+    Args:
+        get_txs_func (function): txid list -> matching raw transactions.
+        batch (list): Dicts of sign_finalize_commit arguments payee_wif,
+                      rawtx and deposit_script_hex.
+        workers (int): Number of worker processes, cpu count if None.
+        chunksize (int): Items per worker task, chosen if None.
+
+    Return:
+        list: Fully signed commit raw transaction or raised exception
+              for each batch item, in input order.
+    """
+    return _sign_batch("finalize_commit", get_txs_func, batch,
+                       workers, chunksize)
+
+
+def sign_finalize_commits_bytes(get_txs_func, batch, workers=None,
+                                chunksize=None):
+    """ Finalize a batch of binary commit transaction signatures in parallel.
+
+    Args:
+        get_txs_func (function): txid list -> matching raw transactions.
+        batch (list): Dicts of sign_finalize_commit_bytes arguments payee_wif,
+                      rawtx_bin and deposit_script_bin.
+        workers (int): Number of worker processes, cpu count if None.
+        chunksize (int): Items per worker task, chosen if None.
+
+    Return:
+        list: Fully signed commit raw transaction bytes or raised
+              exception for each batch item, in input order.
+    """
+    return _sign_batch("finalize_commit", get_txs_func, batch,
+                       workers, chunksize, binary=True)
+
+
+def sign_revoke_recovers(get_txs_func, batch, workers=None, chunksize=None):
+    """ Sign a batch of revoke recover transactions in parallel.
+
+    Args:
+        get_txs_func (function): txid list -> matching raw transactions.
+        batch (list): Dicts of sign_revoke_recover arguments payer_wif,
+                      rawtx, commit_script_hex and revoke_secret.
+        workers (int): Number of worker processes, cpu count if None.
+        chunksize (int): Items per worker task, chosen if None.
+
+    Return:
+        list: Signed revoke raw transaction or raised exception
+              for each batch item, in input order.
+    """
+    return _sign_batch("revoke_recover", get_txs_func, batch,
+                       workers, chunksize)
+
+
+def sign_revoke_recovers_bytes(get_txs_func, batch, workers=None,
+                               chunksize=None):
+    """ Sign a batch of binary revoke recover transactions in parallel.
+
+    Args:
+        get_txs_func (function): txid list -> matching raw transactions.
+        batch (list): Dicts of sign_revoke_recover_bytes arguments payer_wif,
+                      rawtx_bin, commit_script_bin and revoke_secret_bin.
+        workers (int): Number of worker processes, cpu count if None.
+        chunksize (int): Items per worker task, chosen if None.
+
+    Return:
+        list: Signed revoke raw transaction bytes or raised
+              exception for each batch item, in input order.
+    """
+    return _sign_batch("revoke_recover", get_txs_func, batch,
+                       workers, chunksize, binary=True)
+
+
+def sign_payout_recovers(get_txs_func, batch, workers=None, chunksize=None):
+    """ Sign a batch of payout recover transactions in parallel.
+
+    Args:
+        get_txs_func (function): txid list -> matching raw transactions.
+        batch (list): Dicts of sign_payout_recover arguments payee_wif,
+                      rawtx, commit_script_hex and spend_secret.
+        workers (int): Number of worker processes, cpu count if None.
+        chunksize (int): Items per worker task, chosen if None.
+
+    Return:
+        list: Signed payout raw transaction or raised exception
+              for each batch item, in input order.
+    """
+    return _sign_batch("payout_recover", get_txs_func, batch,
+                       workers, chunksize)
+
+
+def sign_payout_recovers_bytes(get_txs_func, batch, workers=None,
+                               chunksize=None):
+    """ Sign a batch of binary payout recover transactions in parallel.
+
+    Args:
+        get_txs_func (function): txid list -> matching raw transactions.
+        batch (list): Dicts of sign_payout_recover_bytes arguments payee_wif,
+                      rawtx_bin, commit_script_bin and spend_secret_bin.
+        workers (int): Number of worker processes, cpu count if None.
+        chunksize (int): Items per worker task, chosen if None.
+
+    Return:
+        list: Signed payout raw transaction bytes or raised
+              exception for each batch item, in input order.
+    """
+    return _sign_batch("payout_recover", get_txs_func, batch,
+                       workers, chunksize, binary=True)
+
+
+def sign_change_recovers(get_txs_func, batch, workers=None, chunksize=None):
+    """ Sign a batch of change recover transactions in parallel.
+
+    Args:
+        get_txs_func (function): txid list -> matching raw transactions.
+        batch (list): Dicts of sign_change_recover arguments payer_wif,
+                      rawtx, deposit_script_hex and spend_secret.
+        workers (int): Number of worker processes, cpu count if None.
+        chunksize (int): Items per worker task, chosen if None.
+
+    Return:
+        list: Signed change raw transaction or raised exception
+              for each batch item, in input order.
+    """
+    return _sign_batch("change_recover", get_txs_func, batch,
+                       workers, chunksize)
+
+
+def sign_change_recovers_bytes(get_txs_func, batch, workers=None,
+                               chunksize=None):
+    """ Sign a batch of binary change recover transactions in parallel.
+
+    Args:
+        get_txs_func (function): txid list -> matching raw transactions.
+        batch (list): Dicts of sign_change_recover_bytes arguments payer_wif,
+                      rawtx_bin, deposit_script_bin and spend_secret_bin.
+        workers (int): Number of worker processes, cpu count if None.
+        chunksize (int): Items per worker task, chosen if None.
+
+    Return:
+        list: Signed change raw transaction bytes or raised
+              exception for each batch item, in input order.
+    """
+    return _sign_batch("change_recover", get_txs_func, batch,
+                       workers, chunksize, binary=True)
+
+
+def sign_expire_recovers(get_txs_func, batch, workers=None, chunksize=None):
+    """ Sign a batch of expire recover transactions in parallel.
+
+    Args:
+        get_txs_func (function): txid list -> matching raw transactions.
+        batch (list): Dicts of sign_expire_recover arguments payer_wif,
+                      rawtx and deposit_script_hex.
+        workers (int): Number of worker processes, cpu count if None.
+        chunksize (int): Items per worker task, chosen if None.
+
+    Return:
+        list: Signed expire raw transaction or raised exception
+              for each batch item, in input order.
+    """
+    return _sign_batch("expire_recover", get_txs_func, batch,
+                       workers, chunksize)
+
+
+def sign_expire_recovers_bytes(get_txs_func, batch, workers=None,
+                               chunksize=None):
+    """ Sign a batch of binary expire recover transactions in parallel.
+
+    Args:
+        get_txs_func (function): txid list -> matching raw transactions.
+        batch (list): Dicts of sign_expire_recover_bytes arguments
+                      payer_wif, rawtx_bin and deposit_script_bin.
+        workers (int): Number of worker processes, cpu count if None.
+        chunksize (int): Items per worker task, chosen if None.
+
+    Return:
+        list: Signed expire raw transaction bytes or raised
+              exception for each batch item, in input order.
+    """
+    return _sign_batch("expire_recover", get_txs_func, batch,
+                       workers, chunksize, binary=True)
+
+
+# kind -> (wif argument, script argument, script parser, signer, secrets),
+# the binary batch functions take the script, secrets and rawtx as *_bin
+_BATCH_SIGNERS = {
+    "created_commit": (
+        "payer_wif", "deposit_script", parse_deposit_script,
+        _sign_created_commit, ()
+    ),
+    "finalize_commit": (
+        "payee_wif", "deposit_script", parse_deposit_script,
+        _sign_finalize_commit, ()
+    ),
+    "revoke_recover": (
+        "payer_wif", "commit_script", parse_commit_script,
+        _sign_revoke_recover, ("revoke_secret",)
+    ),
+    "payout_recover": (
+        "payee_wif", "commit_script", parse_commit_script,
+        _sign_payout_recover, ("spend_secret",)
+    ),
+    "change_recover": (
+        "payer_wif", "deposit_script", parse_deposit_script,
+        _sign_change_recover, ("spend_secret",)
+    ),
+    "expire_recover": (
+        "payer_wif", "deposit_script", parse_deposit_script,
+        _sign_expire_recover, ()
+    ),
+}
+
+
+class _BatchSigner(object):
+    """ Signing state shared by all items of a batch.
+
+    Wifs, scripts and the prefetched input transactions are stored once and
+    referenced by index from the items, so a worker process receives them a
+    single time and parses each key and script at most once.
+    """
+
+    def __init__(self, kind, wifs, scripts, rawtxs):
+        self.kind = kind
+        self.wifs = wifs
+        self.scripts = scripts
+        self.rawtxs = rawtxs
+        self._hash160_lookups = {}
+        self._parsed_scripts = {}
+
+    def __getstate__(self):
+        return (self.kind, self.wifs, self.scripts, self.rawtxs)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def get_txs(self, txids):
+        return dict((txid, self.rawtxs[txid]) for txid in txids)
+
+    def hash160_lookup(self, wif_index):
+        hash160_lookup = self._hash160_lookups.get(wif_index)
+        if hash160_lookup is None:
+            hash160_lookup = _hash160_lookup(self.wifs[wif_index])
+            self._hash160_lookups[wif_index] = hash160_lookup
+        return hash160_lookup
+
+    def parsed_script(self, script_index):
+        parsed_script = self._parsed_scripts.get(script_index)
+        if parsed_script is None:
+            parse_func = _BATCH_SIGNERS[self.kind][2]
+            parsed_script = parse_func(self.scripts[script_index])
+            parsed_script = _ScriptSpend(parsed_script)
+            self._parsed_scripts[script_index] = parsed_script
+        return parsed_script
+
+    def sign(self, item):
+        wif_index, script_index, rawtx, secrets = item
+        sign_func = _BATCH_SIGNERS[self.kind][3]
+        try:
+            parsed_script = self.parsed_script(script_index)
+            tx = load_tx_bytes(self.get_txs, rawtx)
+            hash160_lookup = self.hash160_lookup(wif_index)
+            return sign_func(tx, hash160_lookup, parsed_script, *secrets)
+        except Exception as e:
+            return e
+
+
+_BATCH_WORKER_SIGNER = None  # _BatchSigner of the current worker process
+
+
+def _init_batch_worker(signer):
+    global _BATCH_WORKER_SIGNER
+    _BATCH_WORKER_SIGNER = signer
+
+
+def _sign_batch_item(item):
+    return _BATCH_WORKER_SIGNER.sign(item)
+
 
+def _input_txids(rawtx_bin):
+    Tx.ALLOW_SEGWIT = False  # FIXME remove on next pycoin version
+    tx = Tx.from_bin(rawtx_bin)
+    return [b2h_rev(tx_in.previous_hash) for tx_in in tx.txs_in]
 
-def _make_lookups(wif, script_hex):
-    script_bin = h2b(script_hex)
-    key = Key.from_text(wif)
-    hash160_lookup = build_hash160_lookup([key.secret_exponent()])
-    p2sh_lookup = build_p2sh_lookup([script_bin])
-    return hash160_lookup, p2sh_lookup
+
+def _sign_batch(kind, get_txs_func, batch, workers, chunksize, binary=False):
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if workers < 1:
+        raise ValueError("workers must be at least 1")
+    if chunksize is not None and chunksize < 1:
+        raise ValueError("chunksize must be at least 1")
+    wif_name, script_name, _, _, secret_names = _BATCH_SIGNERS[kind]
+    if binary:
+        script_name += "_bin"
+        secret_names = tuple(name + "_bin" for name in secret_names)
+        rawtx_name, decode = "rawtx_bin", bytes
+    else:
+        script_name += "_hex"
+        rawtx_name, decode = "rawtx", h2b
+
+    # share keys and scripts between items and collect the input txids
+    wifs, scripts, wif_indexes, script_indexes = [], [], {}, {}
+    results, items, positions, txids = [], [], [], set()
+    for position, kwargs in enumerate(batch):
+        try:
+            wif, script_bin = kwargs[wif_name], decode(kwargs[script_name])
+            secrets = tuple(decode(kwargs[name]) for name in secret_names)
+            rawtx_bin = decode(kwargs[rawtx_name])
+            txids.update(_input_txids(rawtx_bin))
+        except Exception as e:
+            results.append(e)
+            continue
+        if wif not in wif_indexes:
+            wif_indexes[wif] = len(wifs)
+            wifs.append(wif)
+        if script_bin not in script_indexes:
+            script_indexes[script_bin] = len(scripts)
+            scripts.append(script_bin)
+        items.append((wif_indexes[wif], script_indexes[script_bin],
+                      rawtx_bin, secrets))
+        positions.append(position)
+        results.append(None)
+    if not items:
+        return results
+
+    rawtxs = get_txs_func(list(txids))
+    signer = _BatchSigner(kind, wifs, scripts, rawtxs)
+    workers = min(workers, len(items))
+    if workers == 1:
+        signed = [signer.sign(item) for item in items]
+    else:
+        if chunksize is None:
+            chunksize = max(1, len(items) // (workers * 4))
+        pool = multiprocessing.Pool(workers, initializer=_init_batch_worker,
+                                    initargs=(signer,))
+        try:
+            signed = pool.map(_sign_batch_item, items, chunksize)
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    for position, result in zip(positions, signed):
+        if not binary and not isinstance(result, Exception):
+            result = b2h(result)
+        results[position] = result
+    return results
 
 
 class _AbsScript(ScriptType):
@@ -444,6 +1863,16 @@ class _AbsScript(ScriptType):
             signature_type, script_to_hash
         )
 
+    def _create_script_signature(self, secret_exponent,
+                                 signature_for_hash_type_f,
+                                 signature_type, script):
+        # as ScriptType._create_script_signature but signing with ecc
+        sign_value = signature_for_hash_type_f(signature_type, script)
+        r, s = ecc.sign(secret_exponent, sign_value)
+        if s + s > ecc.N:
+            s = ecc.N - s
+        return sigencode_der(r, s) + bytes_from_int(signature_type)
+
 
 class _AbsCommitScript(_AbsScript):
 
@@ -454,19 +1883,19 @@ class _AbsCommitScript(_AbsScript):
         self.payee_sec = payee_sec
         self.payer_sec = payer_sec
         self.revoke_secret_hash = revoke_secret_hash
-        self.script = h2b(compile_commit_script(
-            b2h(payer_sec), b2h(payee_sec), spend_secret_hash,
+        self.script = compile_commit_script_bytes(
+            payer_sec, payee_sec, spend_secret_hash,
             revoke_secret_hash, delay_time
-        ))
+        )
 
     @classmethod
     def from_script(cls, script):
         r = cls.match(script)
         if r:
-            delay_time = get_commit_delay_time(b2h(cls.TEMPLATE))
-            spend_secret_hash = b2h(r["PUBKEYHASH_LIST"][0])
+            delay_time = cls.DELAY_TIME
+            spend_secret_hash = r["PUBKEYHASH_LIST"][0]
             payee_sec = r["PUBKEY_LIST"][0]
-            revoke_secret_hash = b2h(r["PUBKEYHASH_LIST"][1])
+            revoke_secret_hash = r["PUBKEYHASH_LIST"][1]
             payer_sec = r["PUBKEY_LIST"][1]
             obj = cls(delay_time, spend_secret_hash,
                       payee_sec, payer_sec, revoke_secret_hash)
@@ -481,9 +1910,8 @@ class _AbsCommitScript(_AbsScript):
         secret_exponent, public_pair, compressed = private_key
 
         sig = self._create_sig(secret_exponent, **kwargs)
-        return tools.compile(PAYOUT_SCRIPTSIG.format(
-            sig=b2h(sig), spend_secret=spend_secret
-        ))
+        # PAYOUT_SCRIPTSIG
+        return _assemble_script(sig, spend_secret, opcodes.OP_1)
 
     def solve_revoke(self, **kwargs):
         hash160_lookup = kwargs["hash160_lookup"]
@@ -491,9 +1919,8 @@ class _AbsCommitScript(_AbsScript):
         private_key = hash160_lookup.get(encoding.hash160(self.payer_sec))
         secret_exponent, public_pair, compressed = private_key
         sig = self._create_sig(secret_exponent, **kwargs)
-        return tools.compile(REVOKE_SCRIPTSIG.format(
-            sig=b2h(sig), revoke_secret=revoke_secret
-        ))
+        # REVOKE_SCRIPTSIG
+        return _assemble_script(sig, revoke_secret, opcodes.OP_0)
 
     def solve(self, **kwargs):
         solve_methods = {
@@ -511,9 +1938,9 @@ class _AbsDepositScript(_AbsScript):
         self.payee_sec = payee_sec
         self.spend_secret_hash = spend_secret_hash
         self.expire_time = expire_time
-        self.script = h2b(compile_deposit_script(
-            b2h(payer_sec), b2h(payee_sec), spend_secret_hash, expire_time
-        ))
+        self.script = compile_deposit_script_bytes(
+            payer_sec, payee_sec, spend_secret_hash, expire_time
+        )
 
     @classmethod
     def from_script(cls, script):
@@ -523,8 +1950,8 @@ class _AbsDepositScript(_AbsScript):
             payee_sec = r["PUBKEY_LIST"][1]
             assert(payer_sec == r["PUBKEY_LIST"][2])
             assert(payer_sec == r["PUBKEY_LIST"][3])
-            spend_secret_hash = b2h(r["PUBKEYHASH_LIST"][0])
-            expire_time = get_deposit_expire_time(b2h(cls.TEMPLATE))
+            spend_secret_hash = r["PUBKEYHASH_LIST"][0]
+            expire_time = cls.EXPIRE_TIME
             obj = cls(payer_sec, payee_sec, spend_secret_hash, expire_time)
             assert(obj.script == script)
             return obj
@@ -535,7 +1962,8 @@ class _AbsDepositScript(_AbsScript):
         private_key = hash160_lookup.get(encoding.hash160(self.payer_sec))
         secret_exponent, public_pair, compressed = private_key
         sig = self._create_sig(secret_exponent, **kwargs)
-        return tools.compile(EXPIRE_SCRIPTSIG.format(sig=b2h(sig)))
+        # EXPIRE_SCRIPTSIG
+        return _assemble_script(sig, opcodes.OP_0, opcodes.OP_0)
 
     def solve_change(self, **kwargs):
         hash160_lookup = kwargs["hash160_lookup"]
@@ -543,13 +1971,12 @@ class _AbsDepositScript(_AbsScript):
         private_key = hash160_lookup.get(encoding.hash160(self.payer_sec))
         secret_exponent, public_pair, compressed = private_key
         sig = self._create_sig(secret_exponent, **kwargs)
-        spend_secret_hash = get_deposit_spend_secret_hash(b2h(self.script))
-        provided_spend_secret_hash = b2h(encoding.hash160(h2b(spend_secret)))
-        assert(spend_secret_hash == provided_spend_secret_hash)
-        script_asm = CHANGE_SCRIPTSIG.format(
-            sig=b2h(sig), secret=spend_secret
+        provided_spend_secret_hash = encoding.hash160(spend_secret)
+        assert(self.spend_secret_hash == provided_spend_secret_hash)
+        # CHANGE_SCRIPTSIG
+        return _assemble_script(
+            sig, spend_secret, opcodes.OP_1, opcodes.OP_0
         )
-        return tools.compile(script_asm)
 
     def solve_create_commit(self, **kwargs):
         hash160_lookup = kwargs["hash160_lookup"]
@@ -558,10 +1985,10 @@ class _AbsDepositScript(_AbsScript):
         sig = self._create_sig(secret_exponent, **kwargs)
         signature_placeholder = kwargs.get("signature_placeholder",
                                            DEFAULT_PLACEHOLDER_SIGNATURE)
-        script_asm = COMMIT_SCRIPTSIG.format(
-            payer_sig=b2h(sig), payee_sig=b2h(signature_placeholder)
+        # COMMIT_SCRIPTSIG
+        return _assemble_script(
+            opcodes.OP_0, sig, signature_placeholder, opcodes.OP_1
         )
-        return tools.compile(script_asm)
 
     def solve_finalize_commit(self, **kwargs):
         hash160_lookup = kwargs.get("hash160_lookup")
@@ -569,31 +1996,27 @@ class _AbsDepositScript(_AbsScript):
         existing_script = kwargs.get("existing_script")
 
         # validate existing script
-        reference_script_hex = _compile_commit_scriptsig(
-            "deadbeef", "deadbeef", b2h(self.script)
+        reference_script_bin = _assemble_script(
+            opcodes.OP_0, _PLACEHOLDER, _PLACEHOLDER, opcodes.OP_1,
+            self.script
         )
-        _validate(reference_script_hex, b2h(existing_script))
+        _match(reference_script_bin, existing_script)
 
         # check provided payer signature
         try:
-            opcode, data, pc = tools.get_opcode(existing_script, 0)  # OP_0
-            opcode, payer_sig, pc = tools.get_opcode(existing_script, pc)
+            payer_sig = ScriptView(existing_script).data(1).tobytes()
 
             # verify signature type
             sig_r_s, actual_signature_type = parse_signature_blob(payer_sig)
             assert(signature_type == actual_signature_type)
 
             # verify payer signature
-            public_pair = encoding.sec_to_public_pair(self.payer_sec)
-            sign_value = kwargs.get("sign_value")
-
-            public_pair = encoding.sec_to_public_pair(self.payer_sec)
+            public_pair = keys.public_pair_from_sec(self.payer_sec)
             sign_value = kwargs["signature_for_hash_type_f"](
                 signature_type, kwargs["script_to_hash"]
             )
 
-            if not ecdsa.verify(ecdsa.generator_secp256k1, public_pair,
-                                sign_value, sig_r_s):
+            if not ecc.verify(public_pair, sign_value, sig_r_s):
                 raise InvalidPayerSignature("invalid r s values")
         except UnexpectedDER:
             raise InvalidPayerSignature("not in DER format")
@@ -603,10 +2026,10 @@ class _AbsDepositScript(_AbsScript):
         secret_exponent, public_pair, compressed = private_key
         payee_sig = self._create_sig(secret_exponent, **kwargs)
 
-        script_asm = COMMIT_SCRIPTSIG.format(
-            payer_sig=b2h(payer_sig), payee_sig=b2h(payee_sig)
+        # COMMIT_SCRIPTSIG
+        return _assemble_script(
+            opcodes.OP_0, payer_sig, payee_sig, opcodes.OP_1
         )
-        return tools.compile(script_asm)
 
     def solve(self, **kwargs):
         solve_methods = {
@@ -619,38 +2042,106 @@ class _AbsDepositScript(_AbsScript):
         return solve_method(**kwargs)
 
 
-class _CommitScriptHandler(object):
+class _ScriptSolvers(object):
+    """ Solver lookup for the p2sh scripts of a single signing call.
 
-    def __init__(self, delay_time):
+    Instead of registering the solver classes in pycoin's process global
+    SUBCLASSES list, the p2sh inputs are solved here with the given script
+    types, so concurrent signing calls cannot see each others solvers.
+    Inputs not spending one of the script types are signed by pycoin.
+    """
+
+    def __init__(self, *script_types):
+        self.script_types = script_types
+
+    def script_obj_from_script(self, script):
+        for script_type in self.script_types:
+            try:
+                return script_type.from_script(script)
+            except ValueError:
+                pass
+        return None
+
+    def sign(self, tx, hash160_lookup, hash_type=None, **kwargs):
+        if hash_type is None:
+            hash_type = Tx.SIGHASH_ALL
+        tx.check_unspents()
+        for tx_in_idx, tx_in in enumerate(tx.txs_in):
+            if tx.is_signature_ok(tx_in_idx) or tx_in.is_coinbase():
+                continue
+            if not tx.unspents[tx_in_idx]:  # skipped like in Tx.sign
+                continue
+            tx_out_script = tx.unspents[tx_in_idx].script
+            solution = self._solve(tx, hash160_lookup, tx_in_idx,
+                                   tx_out_script, hash_type, **kwargs)
+            if solution is not None:
+                tx_in.script = solution
+                continue
+            try:
+                tx.sign_tx_in(hash160_lookup, tx_in_idx, tx_out_script,
+                              hash_type=hash_type, **kwargs)
+            except SolvingError:
+                pass
+        return tx
+
+    def _solve(self, tx, hash160_lookup, tx_in_idx, tx_out_script,
+               hash_type, **kwargs):
+        is_p2sh = (len(tx_out_script) == 23 and
+                   tx_out_script[:2] == b"\xa9\x14" and  # OP_HASH160 <20>
+                   tx_out_script[22:] == b"\x87")  # OP_EQUAL
+        if not is_p2sh:
+            return None
+        script_to_hash = kwargs["p2sh_lookup"].get(tx_out_script[2:22])
+        if script_to_hash is None:
+            return None
+        script_obj = self.script_obj_from_script(script_to_hash)
+        if script_obj is None:
+            return None
+
+        def signature_for_hash_type_f(hash_type, script):
+            return tx.signature_hash(script, tx_in_idx, hash_type)
+
+        tx_in = tx.txs_in[tx_in_idx]
+        solution = script_obj.solve(
+            hash160_lookup=hash160_lookup, signature_type=hash_type,
+            existing_script=tx_in.script, existing_witness=tx_in.witness,
+            script_to_hash=script_to_hash,
+            signature_for_hash_type_f=signature_for_hash_type_f, **kwargs
+        )
+        return solution + tools.bin_script([script_to_hash])
+
+
+_SCRIPT_TYPES = LRUCache(maxsize=256)  # solver classes by script and time
+
+
+def _commit_script_type(delay_time):
+    key = ("commit", delay_time)
+    script_type = _SCRIPT_TYPES.get(key)
+    if script_type is None:
         class CommitScript(_AbsCommitScript):
+            DELAY_TIME = delay_time
             TEMPLATE = h2b(compile_commit_script(
                 "OP_PUBKEY", "OP_PUBKEY", "OP_PUBKEYHASH",
                 "OP_PUBKEYHASH", delay_time
             ))
-        self.script_handler = CommitScript
-
-    def __enter__(self):
-        SUBCLASSES.insert(0, self.script_handler)
-
-    def __exit__(self, type, value, traceback):
-        SUBCLASSES.pop(0)
+        script_type = CommitScript
+        _SCRIPT_TYPES.put(key, script_type)
+    return script_type
 
 
-class _DepositScriptHandler(object):
-
-    def __init__(self, expire_time):
+def _deposit_script_type(expire_time):
+    key = ("deposit", expire_time)
+    script_type = _SCRIPT_TYPES.get(key)
+    if script_type is None:
         class DepositScript(_AbsDepositScript):
+            EXPIRE_TIME = expire_time
             TEMPLATE = h2b(compile_deposit_script(
                 "OP_PUBKEY", "OP_PUBKEY",
                 "OP_PUBKEYHASH", expire_time
             ))
-        self.script_handler = DepositScript
-
-    def __enter__(self):
-        SUBCLASSES.insert(0, self.script_handler)
-
-    def __exit__(self, type, value, traceback):
-        SUBCLASSES.pop(0)
+        script_type = DepositScript
+        _SCRIPT_TYPES.put(key, script_type)
+    return script_type
 
 
 def _parse_sequence_value(opcode, data, disassembled):
@@ -666,37 +2157,129 @@ def _parse_sequence_value(opcode, data, disassembled):
     return value
 
 
+def _parse_sequence_word(opcode, data):
+    disassembled = tools.disassemble_for_opcode_data(opcode, data)
+    return _parse_sequence_value(opcode, data, disassembled)
+
+
+class ScriptView(object):
+    """ Script tokenized once into an offset table for random word access.
+
+    Pushdata is exposed as memoryview slices of the script, so accessing
+    words neither rescans the script nor copies data.
+
+    Args:
+        script (bytes): Binary script.
+
+    Raises:
+        ScriptError: If a pushdata runs past the end of the script.
+    """
+
+    __slots__ = ("script", "_view", "_words")
+
+    def __init__(self, script):
+        self.script = script
+        self._view = memoryview(script)
+        self._words = []  # [(opcode, data_start, data_end), ...]
+        size = len(self._view)
+        pc = 0
+        while pc < size:
+            opcode = byte_to_int(self._view[pc])  # str item on python 2
+            pc += 1
+            if opcode > 78:  # not a pushdata opcode
+                self._words.append((opcode, None, None))
+                continue
+            if opcode < 76:
+                length = opcode
+            else:  # OP_PUSHDATA1, OP_PUSHDATA2, OP_PUSHDATA4
+                width = 1 << (opcode - 76)
+                length = _int_from_le(self._view[pc:pc + width])
+                pc += width
+            if pc + length > size:
+                raise ScriptError(
+                    "unexpected end of data when literal expected",
+                    errno.BAD_OPCODE
+                )
+            self._words.append((opcode, pc, pc + length))
+            pc += length
+
+    def __len__(self):
+        return len(self._words)
+
+    def __getitem__(self, index):
+        """ Return (opcode, data, disassembled) for word at index. """
+        data = self.data(index)
+        return self.opcode(index), data, self.disassemble(index)
+
+    def opcode(self, index):
+        """ Return opcode of word at index. """
+        return self._words[index][0]
+
+    def data(self, index):
+        """ Return pushdata memoryview of word at index or None. """
+        opcode, start, end = self._words[index]
+        return None if start is None else self._view[start:end]
+
+    def disassemble(self, index):
+        """ Return disassembled word at index. """
+        data = self.data(index)
+        return tools.disassemble_for_opcode_data(
+            self.opcode(index), None if data is None else data.tobytes()
+        )
+
+
+def _int_from_le(data):
+    value = 0
+    for shift, byte in enumerate(bytearray(data)):
+        value |= byte << (8 * shift)
+    return value
+
+
 def get_word(script_bin, index):
-    pc = 0
-    i = 0
-    while pc < len(script_bin) and i <= index:
-        opcode, data, pc = tools.get_opcode(script_bin, pc)
-        i += 1
-    if i != index + 1:
+    view = ScriptView(script_bin)
+    if not 0 <= index < len(view):
         raise ValueError(index)
-    return opcode, data, tools.disassemble_for_opcode_data(opcode, data)
+    opcode, data, disassembled = view[index]
+    return opcode, None if data is None else data.tobytes(), disassembled
 
 
 def _validate(reference_script_hex, untrusted_script_hex):
-    ref_script_bin = h2b(reference_script_hex)
-    untrusted_script_bin = h2b(untrusted_script_hex)
-    r_pc = 0
-    u_pc = 0
-    while r_pc < len(ref_script_bin) and u_pc < len(untrusted_script_bin):
-        r_opcode, r_data, r_pc = tools.get_opcode(ref_script_bin, r_pc)
-        u_opcode, u_data, u_pc = tools.get_opcode(untrusted_script_bin, u_pc)
-        if r_data is not None and b2h(r_data) == "deadbeef":
-            continue  # placeholder for expected variable
-        if r_opcode != u_opcode or r_data != u_data:
-            raise InvalidScript(b2h(untrusted_script_bin))
-    if r_pc != len(ref_script_bin) or u_pc != len(untrusted_script_bin):
-        raise InvalidScript(b2h(untrusted_script_bin))
+    _match(h2b(reference_script_hex), h2b(untrusted_script_hex))
+
 
+def _match(ref_script_bin, untrusted_script_bin):
+    """ Match untrusted script against reference script in a single pass.
 
-def _compile_payout_scriptsig(sig, spend_secret, commit_script_hex):
-    validate_commit_script(commit_script_hex)
-    sig_asm = PAYOUT_SCRIPTSIG.format(sig=sig, spend_secret=spend_secret)
-    return b2h(tools.compile("{0} {1}".format(sig_asm, commit_script_hex)))
+    Returns the (opcode, data) words found at the "deadbeef" placeholders
+    of the reference script in order, with data as memoryview slices of the
+    untrusted script, raises InvalidScript if not matching.
+    """
+    ref_view = ScriptView(ref_script_bin)
+    untrusted_view = ScriptView(untrusted_script_bin)
+    if len(ref_view) != len(untrusted_view):
+        raise InvalidScript(b2h(untrusted_script_bin))
+    words = []
+    for index in range(len(ref_view)):
+        r_data = ref_view.data(index)
+        u_data = untrusted_view.data(index)
+        if r_data == _PLACEHOLDER:  # placeholder for expected variable
+            words.append((untrusted_view.opcode(index), u_data))
+            continue
+        if ref_view.opcode(index) != untrusted_view.opcode(index) \
+                or r_data != u_data:
+            raise InvalidScript(b2h(untrusted_script_bin))
+    return words
+
+
+def _assemble_script(*words):
+    """ Assemble script from pushdata bytes and int opcodes. """
+    script = bytearray()
+    for word in words:
+        if isinstance(word, int):
+            script.append(word)
+        else:
+            script.extend(tools.bin_script([bytes(word)]))
+    return bytes(script)
 
 
 def _compile_commit_scriptsig(payer_sig, payee_sig, deposit_script_hex):
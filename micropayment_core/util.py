@@ -4,8 +4,13 @@
 
 
 import codecs
+import collections
 import contextlib
+import os
 import sys
+import tempfile
+import threading
+import time
 from decimal import Decimal
 from io import StringIO
 
@@ -39,22 +44,191 @@ def bytestoint(data):
     return int(codecs.encode(data, 'hex_codec'), 16)
 
 
-def load_tx(get_txs_func, rawtx):
-    Tx.ALLOW_SEGWIT = False  # FIXME remove on next pycoin version
-    tx = Tx.from_hex(rawtx)
+def load_tx(get_txs_func, rawtx, txout_cache=None):
+    return load_tx_bytes(get_txs_func, h2b(rawtx), txout_cache=txout_cache)
 
-    unspent_info = {}  # txid -> index
-    for txin in tx.txs_in:
-        unspent_info[b2h_rev(txin.previous_hash)] = txin.previous_index
-    utxo_rawtxs = get_txs_func(list(unspent_info.keys()))
 
+def load_tx_bytes(get_txs_func, rawtx_bin, txout_cache=None):
+    Tx.ALLOW_SEGWIT = False  # FIXME remove on next pycoin version
+    tx = Tx.from_bin(rawtx_bin)
+    txouts, txids = cached_txouts(tx, txout_cache)
+    utxo_rawtxs = get_txs_func(txids) if txids else {}
+    return add_unspents(tx, txouts, utxo_rawtxs, txout_cache)
+
+
+def cached_txouts(tx, txout_cache=None):
+    # -> ({(txid, vout): TxOut} of cached outputs, txids still to fetch)
+    cache = txout_cache if txout_cache is not None else _TXOUT_CACHE
+    txouts, txids = {}, []
+    for outpoint in _outpoints(tx):
+        txout = cache.get(outpoint) if cache is not None else None
+        if txout is not None:
+            txouts[outpoint] = txout
+        elif outpoint[0] not in txids:
+            txids.append(outpoint[0])
+    return txouts, txids
+
+
+def add_unspents(tx, txouts, utxo_rawtxs, txout_cache=None):
+    cache = txout_cache if txout_cache is not None else _TXOUT_CACHE
+    outpoints = _outpoints(tx)
+    cacheable = dict(txouts)  # put again so outputs in use stay cached
     for utxo_txid, utxo_rawtx in utxo_rawtxs.items():
         utxo_tx = Tx.from_hex(utxo_rawtx)
-        prev_index = unspent_info[utxo_txid]
-        tx.unspents.append(utxo_tx.txs_out[prev_index])
+        valid = b2h_rev(utxo_tx.hash()) == utxo_txid  # don't cache junk
+        for txid, vout in outpoints:
+            if txid == utxo_txid:
+                txouts[(txid, vout)] = utxo_tx.txs_out[vout]
+                if valid:
+                    cacheable[(txid, vout)] = txouts[(txid, vout)]
+    for outpoint in outpoints:  # unspents must match the input order
+        if outpoint in txouts:
+            tx.unspents.append(txouts[outpoint])
+        if cache is not None and outpoint in cacheable:
+            cache.put(outpoint, cacheable[outpoint])
     return tx
 
 
+def _outpoints(tx):
+    return [(b2h_rev(txin.previous_hash), txin.previous_index)
+            for txin in tx.txs_in]
+
+
+def enable_txout_cache(maxsize=4096, ttl=3600):
+    """ Cache parsed outputs of fetched transactions.
+
+    load_tx then only fetches and parses transactions whose spent outputs
+    are not cached, which may return outputs up to ttl seconds old.
+    Disabled by default. Replaces the current cache with an empty one.
+
+    Args:
+        maxsize (int): Maximum number of outputs cached.
+        ttl (float): Seconds an output stays cached, None for no limit.
+    """
+    global _TXOUT_CACHE
+    _TXOUT_CACHE = LRUCache(maxsize=maxsize, ttl=ttl)
+
+
+def disable_txout_cache():
+    """ Disable and drop the transaction output cache. """
+    global _TXOUT_CACHE
+    _TXOUT_CACHE = None
+
+
+def txout_cache_stats():
+    """ Return output cache statistics dict with hit_rate or None. """
+    cache = _TXOUT_CACHE
+    if cache is None:
+        return None
+    stats = cache.stats()
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = float(stats["hits"]) / lookups if lookups else 0.0
+    return stats
+
+
+def write_file(path, data):
+    # write to a temporary file first so readers never see partial data
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.rename(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+class LRUCache(object):
+    """ Thread safe, size bounded, least recently used cache.
+
+    Args:
+        maxsize (int): Maximum number of entries held before evicting.
+        ttl (float): Seconds an entry stays cached, None for no limit.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        if maxsize < 1:
+            raise ValueError("maxsize must be positive: {0}".format(maxsize))
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl must be positive: {0}".format(ttl))
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = collections.OrderedDict()  # key -> (expires, value)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and not self._expired(entry)
+
+    def get(self, key, default=None):
+        """ Return cached value for key and mark it as recently used. """
+        with self._lock:
+            try:
+                entry = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            if self._expired(entry):
+                self.evictions += 1
+                self.misses += 1
+                return default
+            self._data[key] = entry
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        """ Cache value for key, evicting the least recently used entry. """
+        expires = _clock() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (expires, value)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        """ Remove key from the cache and return its value. """
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is None or self._expired(entry):
+                return default
+            return entry[1]
+
+    def clear(self):
+        """ Remove all entries and reset the statistics. """
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """ Return dict with hits, misses, evictions, size and maxsize. """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+            }
+
+    def _expired(self, entry):
+        return entry[0] is not None and entry[0] <= _clock()
+
+
+_clock = getattr(time, "monotonic", time.time)  # python 2 has no monotonic
+_TXOUT_CACHE = None  # opt-in, see enable_txout_cache
+
+
 @contextlib.contextmanager
 def xxx_capture_out():
     oldout, olderr = sys.stdout, sys.stderr
@@ -2,12 +2,34 @@
 # coding: utf-8
 
 
+import sys
 from setuptools import setup, find_packages
+from setuptools.command.build_py import build_py
+from setuptools.command.install_lib import install_lib
 
 
 exec(open('micropayment_core/version.py').read())  # load __version__
 
 
+def _compilable(files):
+    # the asyncio api uses async syntax, which older pythons can't compile
+    if sys.version_info >= (3, 5, 2):
+        return files
+    return [f for f in files if not f.endswith("micropayment_core/aio.py")]
+
+
+class BuildPy(build_py):
+
+    def byte_compile(self, files):
+        build_py.byte_compile(self, _compilable(files))
+
+
+class InstallLib(install_lib):
+
+    def byte_compile(self, files):
+        install_lib.byte_compile(self, _compilable(files))
+
+
 setup(
     name='micropayment-core',
     scripts=[],
@@ -26,6 +48,7 @@ setup(
     install_requires=open("requirements.txt").readlines(),
     tests_require=open("requirements_tests.txt").readlines(),
     packages=find_packages(),
+    cmdclass={"build_py": BuildPy, "install_lib": InstallLib},
     classifiers=[
         # "Development Status :: 1 - Planning",
         "Development Status :: 2 - Pre-Alpha",
@@ -0,0 +1,156 @@
+import json
+import threading
+import unittest
+from micropayment_core import scripts
+from micropayment_core import util
+try:
+    import asyncio
+    from micropayment_core import aio
+except (ImportError, SyntaxError):  # python < 3.5
+    aio = None
+
+
+FIXTURES = json.load(open("tests/fixtures.json"))
+KINDS = ["deposit", "created_commit", "finalize_commit", "revoke_recover",
+         "payout_recover", "change_recover", "expire_recover"]
+
+
+def _get_txs_func(txids):
+    result = {}
+    for txid in txids:
+        result[txid] = FIXTURES["transactions"][txid]
+    return result
+
+
+# no async syntax in here, so the module still loads on older pythons
+@unittest.skipIf(aio is None, "asyncio api requires python 3.5.2")
+class TestAio(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.fetches = []
+
+    def tearDown(self):
+        asyncio.set_event_loop(None)
+        self.loop.close()
+        util.disable_txout_cache()
+
+    def _resolve_soon(self, result=None, error=None):
+        future = self.loop.create_future()
+        if error is not None:
+            self.loop.call_soon(future.set_exception, error)
+        else:
+            self.loop.call_soon(future.set_result, result)
+        return future
+
+    def get_txs(self, txids):
+        self.fetches.append(list(txids))
+        known = [txid for txid in txids if txid in FIXTURES["transactions"]]
+        return self._resolve_soon(_get_txs_func(known))
+
+    def test_load_tx_async(self):
+        rawtx = FIXTURES["sign"]["deposit"]["input"]["rawtx"]
+        tx = self.loop.run_until_complete(
+            aio.load_tx_async(self.get_txs, rawtx)
+        )
+        expected = util.load_tx(_get_txs_func, rawtx)
+        self.assertEqual(tx.as_hex(include_unspents=True),
+                         expected.as_hex(include_unspents=True))
+
+    def test_sign_async(self):
+        for kind in KINDS:
+            kwargs = FIXTURES["sign"][kind]["input"]
+            sign_func = getattr(scripts, "sign_" + kind)
+            sign_async = getattr(aio, "sign_{0}_async".format(kind))
+            rawtx = self.loop.run_until_complete(
+                sign_async(self.get_txs, **kwargs)
+            )
+            self.assertEqual(rawtx, sign_func(_get_txs_func, **kwargs))
+
+    def test_sign_async_in_executor(self):
+        threads = []
+        sign_deposit = scripts.sign_deposit
+
+        def sign(*args):
+            threads.append(threading.current_thread())
+            return sign_deposit(*args)
+        kwargs = FIXTURES["sign"]["deposit"]["input"]
+        scripts.sign_deposit = sign
+        try:
+            rawtx = self.loop.run_until_complete(
+                aio.sign_deposit_async(self.get_txs, **kwargs)
+            )
+        finally:
+            scripts.sign_deposit = sign_deposit
+        self.assertEqual(rawtx, sign_deposit(_get_txs_func, **kwargs))
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], threading.current_thread())
+
+    def test_txout_cache(self):
+        util.enable_txout_cache()
+        kwargs = FIXTURES["sign"]["created_commit"]["input"]
+        expected = scripts.sign_created_commit(_get_txs_func, **kwargs)
+        for _ in range(3):
+            rawtx = self.loop.run_until_complete(
+                aio.sign_created_commit_async(self.get_txs, **kwargs)
+            )
+            self.assertEqual(rawtx, expected)
+        self.assertEqual(self.fetches, [])  # cached by the sync call
+
+    def test_fetcher_coalesces(self):
+        fetcher = aio.TxFetcher(self.get_txs)
+        kwargs = FIXTURES["sign"]["created_commit"]["input"]
+        expected = scripts.sign_created_commit(_get_txs_func, **kwargs)
+        results = self.loop.run_until_complete(asyncio.gather(*[
+            aio.sign_created_commit_async(fetcher, **kwargs)
+            for _ in range(10)
+        ]))
+        self.assertEqual(results, [expected] * 10)
+        self.assertEqual(fetcher.requests, 1)
+        self.assertEqual(len(self.fetches), 1)
+        self.assertEqual(len(self.fetches[0]), len(set(self.fetches[0])))
+
+        # missing transactions are left out like in the sync api
+        missing = self.loop.run_until_complete(fetcher(["00" * 32]))
+        self.assertEqual(missing, {})
+        self.assertEqual(fetcher._tasks, set())
+
+    def test_fetcher_error(self):
+
+        def get_txs(txids):
+            return self._resolve_soon(error=IOError("unavailable"))
+        fetcher = aio.TxFetcher(get_txs)
+        rawtx = FIXTURES["sign"]["deposit"]["input"]["rawtx"]
+        self.assertRaises(IOError, self.loop.run_until_complete,
+                          aio.load_tx_async(fetcher, rawtx))
+        self.assertEqual(fetcher._futures, {})
+
+    def test_fetcher_bad_result(self):
+
+        def get_txs(txids):
+            return self._resolve_soon(list(txids))  # not a dict
+        fetcher = aio.TxFetcher(get_txs)
+        rawtx = FIXTURES["sign"]["deposit"]["input"]["rawtx"]
+        self.assertRaises(AttributeError, self.loop.run_until_complete,
+                          aio.load_tx_async(fetcher, rawtx))
+        self.assertEqual(fetcher._futures, {})
+
+    def test_fetcher_cancelled(self):
+
+        def get_txs(txids):
+            return self.loop.create_future()  # never resolved
+        fetcher = aio.TxFetcher(get_txs)
+        waiter = self.loop.create_task(fetcher(["00" * 32]))
+        while not fetcher._tasks:
+            self.loop.run_until_complete(asyncio.sleep(0))
+        for task in fetcher._tasks:
+            task.cancel()
+        self.assertRaises(asyncio.CancelledError,
+                          self.loop.run_until_complete, waiter)
+        self.assertEqual(fetcher._futures, {})
+        self.assertEqual(fetcher._tasks, set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import unittest
+from pycoin import encoding
+from micropayment_core import base58
+from micropayment_core import keys
+
+
+WIF = "cPvLdJrWg1PeudwB2TyTwf34Fdgn93WtKeB1GbUbfyCoNyc65nkR"
+ADDRESS = "n4Hdm3aPxk8T816q8FGo5BghNLPNDAcX4v"
+
+
+class TestBase58(unittest.TestCase):
+
+    def test_pycoin_compatibility(self):
+        for size in list(range(40)) + [80] * 20:
+            for zeros in range(3):
+                data = b"\0" * zeros + os.urandom(size)
+                text = encoding.b2a_base58(data)
+                self.assertEqual(base58.b2a_base58(data), text)
+                self.assertEqual(base58.a2b_base58(text), data)
+                self.assertEqual(base58.b2a_hashed_base58(data),
+                                 encoding.b2a_hashed_base58(data))
+        for text in [WIF, ADDRESS]:
+            self.assertEqual(base58.a2b_hashed_base58(text),
+                             encoding.a2b_hashed_base58(text))
+
+    def test_invalid(self):
+        for text in ["0", "O", "I", "l", "+", WIF[:-1] + "x", "", "1"]:
+            self.assertRaises(encoding.EncodingError,
+                              base58.a2b_hashed_base58, text)
+
+    def test_batch(self):
+        texts = [WIF, ADDRESS]
+        data = base58.a2b_hashed_base58_batch(texts)
+        self.assertEqual(data, [encoding.a2b_hashed_base58(t) for t in texts])
+        self.assertEqual(base58.b2a_hashed_base58_batch(data), texts)
+        self.assertEqual(base58.a2b_hashed_base58_batch([]), [])
+        self.assertRaises(encoding.EncodingError,
+                          base58.a2b_hashed_base58_batch, [WIF, "0"])
+
+    def test_decode_cache(self):
+        self.assertEqual(base58.decode_cache_stats(), None)
+        base58.enable_decode_cache(maxsize=1)
+        try:
+            data = base58.a2b_hashed_base58(WIF)
+            self.assertEqual(base58.a2b_hashed_base58(WIF), data)
+            base58.a2b_hashed_base58(ADDRESS)
+            self.assertEqual(base58.decode_cache_stats(), {
+                "hits": 1, "misses": 2, "evictions": 1, "size": 1,
+                "maxsize": 1
+            })
+            base58.clear_decode_cache()
+            self.assertEqual(base58.decode_cache_stats()["size"], 0)
+            base58.disable_decode_cache()
+            self.assertEqual(base58.decode_cache_stats(), None)
+            self.assertEqual(base58.a2b_hashed_base58(WIF), data)
+        finally:
+            base58.disable_decode_cache()
+
+    def test_derivation_cache_clears_decode_cache(self):
+        keys.enable_derivation_cache()
+        base58.enable_decode_cache()
+        try:
+            base58.a2b_hashed_base58(WIF)
+            keys.clear_derivation_cache()
+            self.assertEqual(base58.decode_cache_stats()["size"], 0)
+            base58.a2b_hashed_base58(WIF)
+            keys.disable_derivation_cache()
+            self.assertEqual(base58.decode_cache_stats()["size"], 0)
+        finally:
+            keys.disable_derivation_cache()
+            base58.disable_decode_cache()
+
+
+if __name__ == "__main__":
+    unittest.main()
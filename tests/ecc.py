@@ -0,0 +1,190 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+from pycoin import ecdsa
+from pycoin.encoding import from_bytes_32
+from micropayment_core import ecc
+
+
+G = ecdsa.generator_secp256k1
+
+
+def _vectors(count):
+    for i in range(count):
+        seed = hashlib.sha256(str(i).encode("utf-8")).digest()
+        secret_exponent = from_bytes_32(seed) % (ecc.N - 1) + 1
+        val = from_bytes_32(hashlib.sha256(seed).digest())
+        yield secret_exponent, val
+
+
+class _TestBackend(object):
+
+    def setUp(self):
+        self.previous = ecc.get_backend()
+        ecc.set_backend(self.make_backend())
+
+    def tearDown(self):
+        ecc.set_backend(self.previous)
+
+    def test_public_pair(self):
+        for secret_exponent, val in _vectors(10):
+            self.assertEqual(
+                ecc.public_pair(secret_exponent),
+                ecdsa.public_pair_for_secret_exponent(G, secret_exponent)
+            )
+        self.assertEqual(ecc.public_pair(1), ecc.G)
+        self.assertRaises(ValueError, ecc.public_pair, 0)
+        self.assertRaises(ValueError, ecc.public_pair, ecc.N)
+
+    def test_public_pairs(self):
+        secret_exponents = [se for se, val in _vectors(10)] + [1, ecc.N - 1]
+        self.assertEqual(ecc.public_pairs(secret_exponents),
+                         [ecc.public_pair(se) for se in secret_exponents])
+        self.assertEqual(ecc.public_pairs([]), [])
+        self.assertRaises(ValueError, ecc.public_pairs, [1, 0])
+
+    def test_public_pair_for_x(self):
+        for secret_exponent, val in _vectors(10):
+            x, y = ecc.public_pair(secret_exponent)
+            self.assertEqual(ecc.public_pair_for_x(x, y % 2 == 0), (x, y))
+            self.assertEqual(ecc.public_pair_for_x(x, y % 2 == 1),
+                             (x, ecc.P - y))
+        self.assertRaises(ValueError, ecc.public_pair_for_x, 0, True)
+        self.assertRaises(ValueError, ecc.public_pair_for_x, ecc.P, True)
+
+    def test_sign(self):
+        for secret_exponent, val in _vectors(10):
+            self.assertEqual(ecc.sign(secret_exponent, val),
+                             ecdsa.sign(G, secret_exponent, val))
+
+    def test_verify(self):
+        for secret_exponent, val in _vectors(10):
+            public_pair = ecc.public_pair(secret_exponent)
+            r, s = ecdsa.sign(G, secret_exponent, val)
+            self.assertTrue(ecc.verify(public_pair, val, (r, s)))
+            self.assertTrue(ecc.verify(public_pair, val, (r, ecc.N - s)))
+            self.assertFalse(ecc.verify(public_pair, val + 1, (r, s)))
+            self.assertFalse(ecc.verify(public_pair, val, (r, s ^ 1)))
+            self.assertFalse(ecc.verify(public_pair, val, (0, s)))
+            self.assertFalse(ecc.verify(public_pair, val, (r, ecc.N)))
+            self.assertFalse(ecc.verify((public_pair[0], public_pair[1] + 1),
+                                        val, (r, s)))
+
+        # values larger than 32Bytes are reduced like in pycoin
+        public_pair = ecc.public_pair(secret_exponent)
+        val = val << 8
+        signature = ecdsa.sign(G, secret_exponent, val % ecc.N)
+        self.assertEqual(ecdsa.verify(G, public_pair, val, signature),
+                         ecc.verify(public_pair, val, signature))
+
+    def test_verify_batch(self):
+        items, expected = [], []
+        for secret_exponent, val in _vectors(6):
+            public_pair = ecc.public_pair(secret_exponent)
+            r, s = ecdsa.sign(G, secret_exponent, val)
+            items += [
+                (public_pair, val, (r, s)),
+                (public_pair, val, (r, ecc.N - s)),
+                (public_pair, val + 1, (r, s)),
+                (public_pair, val, (0, s)),
+                ((public_pair[0], public_pair[1] + 1), val, (r, s)),
+            ]
+            expected += [True, True, False, False, False]
+        self.assertEqual(ecc.verify_batch(items), expected)
+        self.assertEqual(ecc.verify_batch([]), [])
+
+
+class TestPythonBackend(_TestBackend, unittest.TestCase):
+
+    def make_backend(self):
+        return ecc.PythonBackend()
+
+    def test_key_tables(self):
+        ecc.enable_key_tables(maxsize=1, hot_key_uses=3)
+        try:
+            vectors = list(_vectors(2))
+            items = []
+            for secret_exponent, val in vectors * 2:
+                public_pair = ecc.public_pair(secret_exponent)
+                signature = ecdsa.sign(G, secret_exponent, val)
+                items.append((public_pair, val, signature))
+                items.append((public_pair, val + 1, signature))
+            expected = [True, False] * 4
+            for _ in range(3):
+                self.assertEqual(ecc.verify_batch(items), expected)
+                for item, valid in zip(items, expected):
+                    self.assertEqual(ecc.verify(*item), valid)
+            stats = ecc.key_tables_stats()
+            self.assertEqual((stats["size"], stats["maxsize"]), (1, 1))
+            ecc.disable_key_tables()
+            self.assertEqual(ecc.key_tables_stats(), None)
+            self.assertEqual(ecc.verify_batch(items), expected)
+        finally:
+            ecc.enable_key_tables()
+
+
+class TestCoincurveBackend(_TestBackend, unittest.TestCase):
+
+    def make_backend(self):
+        try:
+            return ecc.CoincurveBackend()
+        except ImportError:  # pragma: no cover
+            self.skipTest("coincurve not installed")
+
+
+class TestGeneratorTable(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, "generator.table")
+        ecc.set_generator_table_file(self.path)
+        ecc._set_generator_table(None)
+
+    def tearDown(self):
+        ecc.set_generator_table_file(None)
+        ecc._set_generator_table(None)
+        shutil.rmtree(self.tempdir)
+
+    def _check_generator_mul(self):
+        for secret_exponent, val in _vectors(5):
+            self.assertEqual(
+                ecc._to_affine(ecc.generator_mul(secret_exponent)),
+                ecdsa.public_pair_for_secret_exponent(G, secret_exponent)
+            )
+        self.assertEqual(ecc.generator_mul(0), ecc._INFINITY)
+
+    def test_persisted(self):
+        self._check_generator_mul()
+        with open(self.path, "rb") as f:
+            data = f.read()
+        table = ecc._G_TABLE
+
+        # loaded from the cache file
+        ecc._set_generator_table(None)
+        self._check_generator_mul()
+        self.assertEqual(ecc._G_TABLE, table)
+        self.assertEqual(ecc._decode_generator_table(data), table)
+
+    def test_invalid_file_replaced(self):
+        with open(self.path, "wb") as f:
+            f.write(b"invalid")
+        self._check_generator_mul()
+        with open(self.path, "rb") as f:
+            data = f.read()
+        self.assertEqual(ecc._decode_generator_table(data), ecc._G_TABLE)
+
+        # other points are rejected even if valid curve points
+        body = bytearray(data[len(ecc._G_TABLE_MAGIC):])
+        body[64:128] = body[128:192]
+        tampered = ecc._G_TABLE_MAGIC + bytes(body)
+        self.assertEqual(ecc._decode_generator_table(tampered), None)
+
+    def test_unwritable_file(self):
+        ecc.set_generator_table_file(os.path.join(self.tempdir, "x", "y"))
+        self._check_generator_mul()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import time
+import unittest
+from micropayment_core import keys
+from micropayment_core import keypool
+
+
+class TestKeyPool(unittest.TestCase):
+
+    def _wait_filled(self, pool, size):
+        for _ in range(500):
+            if len(pool) >= size:
+                return
+            time.sleep(0.01)
+        self.fail("KeyPool not refilled")
+
+    def test_get(self):
+        with keypool.KeyPool(size=4, netcode="XTN") as pool:
+            self._wait_filled(pool, pool.size)
+            seen = set()
+            for _ in range(6):
+                privkey, pubkey, wif, address = pool.get()
+                self.assertEqual(keys.pubkey_from_privkey(privkey), pubkey)
+                self.assertEqual(keys.wif_to_privkey(wif), privkey)
+                self.assertEqual(keys.netcode_from_wif(wif), "XTN")
+                self.assertEqual(keys.address_from_wif(wif), address)
+                seen.add(privkey)
+            self.assertEqual(len(seen), 6)
+
+            # refilled above the low-water mark, gets may race the top up
+            self._wait_filled(pool, pool.refill_at + 1)
+            stats = pool.stats()
+            self.assertEqual(stats["hits"] + stats["misses"], 6)
+            self.assertTrue(pool.refill_at < stats["size"] <= 4)
+            self.assertEqual(stats["maxsize"], 4)
+
+    def test_get_empty(self):
+        with keypool.KeyPool(size=2, netcode="XTN") as pool:
+            self._wait_filled(pool, pool.size)
+            with pool._condition:  # reentrant, holds off the refill thread
+                while pool._keys:
+                    keypool._zeroize(pool._keys.popleft())
+                privkey, pubkey, wif, address = pool.get()  # generated inline
+            self.assertEqual(keys.wif_to_privkey(wif), privkey)
+            self.assertEqual(keys.address_from_wif(wif), address)
+            self.assertEqual(pool.stats()["misses"], 1)
+            self.assertEqual(pool.stats()["hits"], 0)
+
+    def test_close_zeroizes(self):
+        pool = keypool.KeyPool(size=3)
+        self._wait_filled(pool, pool.size)
+        entries = list(pool._keys)
+        pool.close()
+        self.assertEqual(len(pool), 0)
+        for privkey_bin, pubkey_bin, wif, address in entries:
+            self.assertEqual(privkey_bin, bytearray(32))
+            self.assertEqual(wif, bytearray(len(wif)))
+        self.assertRaises(ValueError, pool.get)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, keypool.KeyPool, size=0)
+        self.assertRaises(ValueError, keypool.KeyPool, size=2, refill_at=2)
+        self.assertRaises(ValueError, keypool.KeyPool, netcode="INVALID")
+
+
+if __name__ == "__main__":
+    unittest.main()
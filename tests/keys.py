@@ -1,6 +1,12 @@
+import io
 import json
+import os
+import shutil
+import tempfile
 import unittest
+from micropayment_core import ecc
 from micropayment_core import keys
+from pycoin.key.BIP32Node import BIP32Node
 
 
 FIXTURES = json.load(open("tests/fixtures.json"))
@@ -70,11 +76,72 @@ class TestKeys(unittest.TestCase):
         privkey = keys.generate_privkey()
         self.assertEqual(len(privkey), 64)
 
+    def test_bulk_conversion(self):
+        privkeys = [PRIVKEY] + [keys.generate_privkey() for _ in range(5)]
+        pubkeys = [keys.pubkey_from_privkey(p) for p in privkeys]
+        uncompressed = [keys.uncompress_pubkey(p) for p in pubkeys]
+        addresses = [keys.address_from_pubkey(p, NETCODE) for p in pubkeys]
+        self.assertEqual(keys.pubkeys_from_privkeys(privkeys), pubkeys)
+        self.assertEqual(keys.addresses_from_privkeys(privkeys, NETCODE),
+                         addresses)
+        self.assertEqual(keys.addresses_from_pubkeys(pubkeys, NETCODE),
+                         addresses)
+        self.assertEqual(keys.addresses_from_pubkeys(uncompressed, NETCODE),
+                         addresses)
+        self.assertEqual(keys.uncompress_pubkeys(pubkeys), uncompressed)
+        self.assertEqual(keys.compress_pubkeys(uncompressed), pubkeys)
+        self.assertEqual(keys.pubkeys_from_privkeys([]), [])
+        self.assertRaises(keys.encoding.EncodingError,
+                          keys.uncompress_pubkeys, ["02" + "00" * 32])
+
+    def test_bulk_conversion_numpy(self):
+        try:
+            import numpy
+        except ImportError:  # pragma: no cover
+            self.skipTest("numpy not installed")
+        privkeys = [keys.generate_privkey() for _ in range(4)]
+        pubkeys = keys.pubkeys_from_privkeys(privkeys)
+
+        def column(hexdata):
+            return numpy.array([bytearray(keys.h2b(h)) for h in hexdata],
+                               dtype=numpy.uint8)
+
+        result = keys.pubkeys_from_privkeys_bytes(column(privkeys))
+        self.assertEqual(result.shape, (4, 33))
+        self.assertTrue((result == column(pubkeys)).all())
+        result = keys.uncompress_pubkeys_bytes(column(pubkeys))
+        uncompressed = keys.uncompress_pubkeys(pubkeys)
+        self.assertTrue((result == column(uncompressed)).all())
+        result = keys.compress_pubkeys_bytes(column(uncompressed))
+        self.assertTrue((result == column(pubkeys)).all())
+        addresses = keys.addresses_from_privkeys(privkeys, NETCODE)
+        result = keys.addresses_from_pubkeys_bytes(column(pubkeys), NETCODE)
+        self.assertEqual([a.decode("ascii") for a in result], addresses)
+        result = keys.addresses_from_privkeys_bytes(column(privkeys), NETCODE)
+        self.assertEqual([a.decode("ascii") for a in result], addresses)
+        self.assertRaises(ValueError, keys.pubkeys_from_privkeys_bytes,
+                          column(privkeys).ravel())  # not a key per row
+        self.assertRaises(ValueError, keys.pubkeys_from_privkeys_bytes,
+                          column(privkeys).astype(numpy.int64))
+
     def test_pem_serialization(self):
         pem = keys.privkey_to_pem(PRIVKEY)
         privkey = keys.pem_to_privkey(pem)
         self.assertEqual(privkey, PRIVKEY)
 
+    def test_bytes_api(self):
+        privkey_bin = keys.h2b(PRIVKEY)
+        pubkey_bin = keys.pubkey_from_privkey_bytes(privkey_bin)
+        self.assertEqual(pubkey_bin, keys.h2b(PUBKEY))
+        self.assertEqual(keys.wif_to_privkey_bytes(WIF), privkey_bin)
+        self.assertEqual(keys.der_to_privkey_bytes(DER), privkey_bin)
+        self.assertEqual(keys.pubkey_from_wif_bytes(WIF), pubkey_bin)
+        address = keys.address_from_pubkey_bytes(pubkey_bin, netcode=NETCODE)
+        self.assertEqual(address, ADDRESS)
+        uncompressed = keys.uncompress_pubkey_bytes(pubkey_bin)
+        self.assertEqual(len(uncompressed), 65)
+        self.assertEqual(keys.compress_pubkey_bytes(uncompressed), pubkey_bin)
+
     def test_pubkey_compression(self):
         uncompressed = keys.uncompress_pubkey(PUBKEY)
         self.assertEqual(len(uncompressed), 65 * 2)  # 65bytes
@@ -111,6 +178,207 @@ class TestAuth(unittest.TestCase):
         valid = keys.verify_sha256(pubkey, signature, data)
         self.assertTrue(valid)
 
+    def test_consistancy_bytes(self):
+        privkey_bin = keys.generate_privkey_bytes()
+        pubkey_bin = keys.pubkey_from_privkey_bytes(privkey_bin)
+        signature = keys.sign_sha256_bytes(privkey_bin, b"f483")
+        self.assertTrue(keys.verify_sha256_bytes(pubkey_bin, signature,
+                                                 b"f483"))
+        self.assertEqual(keys.b2h(signature),
+                         keys.sign_sha256(keys.b2h(privkey_bin), b"f483"))
+
+    def test_derivation_cache(self):
+        self.assertEqual(keys.derivation_cache_stats(), None)
+        keys.enable_derivation_cache(maxsize=2)
+        try:
+            self.assertEqual(keys.pubkey_from_privkey(PRIVKEY), PUBKEY)
+            self.assertEqual(keys.pubkey_from_wif(WIF), PUBKEY)
+            self.assertEqual(keys.address_from_wif(WIF), ADDRESS)
+            self.assertEqual(keys.address_from_privkey(PRIVKEY, NETCODE),
+                             ADDRESS)
+            keys.pubkey_from_privkey(keys.generate_privkey())
+            keys.pubkey_from_privkey(keys.generate_privkey())
+            self.assertEqual(keys.derivation_cache_stats(), {
+                "hits": 3, "misses": 3, "evictions": 1, "size": 2,
+                "maxsize": 2
+            })
+            keys.clear_derivation_cache()
+            self.assertEqual(keys.derivation_cache_stats()["size"], 0)
+            keys.disable_derivation_cache()
+            self.assertEqual(keys.derivation_cache_stats(), None)
+            self.assertEqual(keys.pubkey_from_wif(WIF), PUBKEY)
+            self.assertEqual(keys.address_from_wif(WIF), ADDRESS)
+        finally:
+            keys.disable_derivation_cache()
+
+    def test_uncompressed_wif(self):
+        privkey_bin = keys.h2b(PRIVKEY)
+        wif = keys.encoding.secret_exponent_to_wif(
+            keys.encoding.from_bytes_32(privkey_bin), compressed=False,
+            wif_prefix=keys.networks.wif_prefix_for_netcode(NETCODE)
+        )
+        key = keys.Key.from_text(wif)
+        self.assertEqual(keys.pubkey_from_wif_bytes(wif), key.sec())
+        self.assertEqual(keys.address_from_wif(wif), key.address())
+        self.assertEqual(keys.wif_to_privkey_bytes(wif), privkey_bin)
+        self.assertEqual(keys.netcode_from_wif(wif), NETCODE)
+
+    def test_bip32_wif(self):
+        node = BIP32Node.from_master_secret(b"micropayment", netcode=NETCODE)
+        wif = node.hwif(as_private=True)
+        self.assertEqual(keys.pubkey_from_wif_bytes(wif), node.sec())
+        self.assertEqual(keys.address_from_wif(wif), node.address())
+        self.assertEqual(keys.wif_to_privkey_bytes(wif),
+                         keys.encoding.to_bytes_32(node.secret_exponent()))
+        self.assertEqual(keys.netcode_from_wif(wif), NETCODE)
+
+    def test_invalid_secret_exponent_wif(self):
+        wif = keys.encoding.secret_exponent_to_wif(
+            0, wif_prefix=keys.networks.wif_prefix_for_netcode(NETCODE)
+        )
+        self.assertRaises(keys.InvalidSecretExponentError,
+                          keys.pubkey_from_wif, wif)
+
+    def test_sign_invalid_secret_exponent(self):
+        order = keys.b2h(keys.encoding.to_bytes_32(keys.G.order()))
+        for privkey in ["00" * 32, "ff" * 32, order]:
+            self.assertRaises(keys.InvalidSecretExponentError,
+                              keys.sign, privkey, "f483")
+            self.assertRaises(ValueError, keys.sign_sha256, privkey, "f483")
+
+    def test_verify_batch(self):
+        privkeys = [keys.generate_privkey() for _ in range(3)]
+        pubkeys = [keys.pubkey_from_privkey(p) for p in privkeys]
+        items, expected = [], []
+        for i in range(12):
+            privkey, pubkey = privkeys[i % 3], pubkeys[i % 3]
+            data = "f483{0:02x}".format(i)
+            signature = keys.sign(privkey, data)
+            if i % 4 == 1:  # signed by another key
+                pubkey = pubkeys[(i + 1) % 3]
+            elif i % 4 == 2:  # other data
+                data = "deadbeef"
+            items.append((pubkey, signature, data))
+            expected.append(keys.verify(pubkey, signature, data))
+        self.assertEqual(expected.count(True), 6)
+        items += [
+            ("02" + "00" * 32, items[0][1], items[0][2]),  # invalid pubkey
+            ("02" + "00" * 32, items[1][1], items[1][2]),  # parsed once
+            (items[0][0], "3006020101020101", items[0][2]),  # invalid r s
+            (items[0][0], "deadbeef", items[0][2]),  # invalid DER
+            (items[0][0], "xx", items[0][2]),  # invalid hex
+        ]
+        expected += [False] * 5
+        self.assertEqual(keys.verify_batch(items), expected)
+        self.assertEqual(keys.verify_batch([]), [])
+
+        # bytearray pubkeys, also invalid ones, like the other bytes apis
+        signature, data = keys.h2b(items[0][1]), keys.h2b(items[0][2])
+        invalid = bytearray(keys.h2b("02" + "00" * 32))
+        self.assertEqual(keys.verify_batch_bytes([
+            (bytearray(keys.h2b(items[0][0])), signature, data),
+            (invalid, signature, data), (invalid, signature, data),
+        ]), [True, False, False])
+
+        previous = ecc.get_backend()
+        ecc.set_backend(ecc.PythonBackend())
+        try:
+            self.assertEqual(keys.verify_batch(items), expected)
+        finally:
+            ecc.set_backend(previous)
+
+    def test_verify_sha256_batch(self):
+        pubkey = keys.pubkey_from_privkey(PRIVKEY)
+        signature = keys.sign_sha256(PRIVKEY, u"f483")
+        results = keys.verify_sha256_batch([
+            (pubkey, signature, u"f483"),
+            (pubkey, signature, b"f483"),
+            (pubkey, signature, u"deadbeef"),
+        ])
+        self.assertEqual(results, [True, True, False])
+
+    def test_pubkey_cache(self):
+        keys.enable_pubkey_cache(maxsize=2)
+        try:
+            uncompressed = keys.uncompress_pubkey(PUBKEY)
+            self.assertEqual(keys.compress_pubkey(uncompressed), PUBKEY)
+            self.assertEqual(keys.address_from_pubkey(PUBKEY, NETCODE),
+                             ADDRESS)
+            signature = keys.sign_sha256(PRIVKEY, u"f483")
+            self.assertTrue(keys.verify_sha256(PUBKEY, signature, u"f483"))
+            self.assertEqual(keys.pubkey_cache_stats(), {
+                "hits": 2, "misses": 2, "evictions": 0, "size": 2,
+                "maxsize": 2
+            })
+            keys.disable_pubkey_cache()
+            self.assertEqual(keys.pubkey_cache_stats(), None)
+            self.assertEqual(keys.uncompress_pubkey(PUBKEY), uncompressed)
+        finally:
+            keys.enable_pubkey_cache()
+
+    def test_invalid_pubkey(self):
+        public_pair = keys.public_pair_from_sec(keys.h2b(PUBKEY))
+        off_curve = (b"\x04" + keys.encoding.to_bytes_32(public_pair[0]) +
+                     keys.encoding.to_bytes_32(public_pair[1] + 1))
+        for pubkey_bin in [off_curve, b"\x02" + b"\x00" * 32]:
+            self.assertRaises(keys.encoding.EncodingError,
+                              keys.public_pair_from_sec, pubkey_bin)
+            self.assertRaises(keys.encoding.EncodingError,
+                              keys.compress_pubkey_bytes, pubkey_bin)
+
+    def test_sha256_stream(self):
+        data = os.urandom(3 * keys._STREAM_CHUNK_SIZE + 7)
+        signature = keys.sign_sha256(PRIVKEY, data)
+
+        class Reader(object):  # file like object without readinto
+
+            def __init__(self, data):
+                self.read = io.BytesIO(data).read
+
+        sources = [
+            lambda: data,
+            lambda: bytearray(data),
+            lambda: memoryview(data),
+            lambda: io.BytesIO(data),
+            lambda: Reader(data),
+            lambda: [data[:5], memoryview(data)[5:10], data[10:]],
+        ]
+        for source in sources:
+            self.assertEqual(keys.sign_sha256_stream(PRIVKEY, source()),
+                             signature)
+            self.assertTrue(keys.verify_sha256_stream(PUBKEY, signature,
+                                                      source()))
+        self.assertFalse(keys.verify_sha256_stream(PUBKEY, signature,
+                                                   [data, b"x"]))
+
+        # str chunks are utf-8 encoded like in sign_sha256
+        signature = keys.sign_sha256(PRIVKEY, u"f483\u20ac")
+        chunks = [u"f4", u"83\u20ac"]
+        self.assertEqual(keys.sign_sha256_stream(PRIVKEY, chunks), signature)
+
+    def test_sha256_files(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            contents = [b"", b"f483", os.urandom(keys._STREAM_CHUNK_SIZE + 1)]
+            paths = []
+            for i, content in enumerate(contents):
+                paths.append(os.path.join(tempdir, str(i)))
+                with open(paths[-1], "wb") as f:
+                    f.write(content)
+            expected = [keys.sign_sha256(PRIVKEY, c) for c in contents]
+            self.assertEqual(keys.sign_sha256_files(PRIVKEY, paths), expected)
+            self.assertEqual(keys.sign_sha256_files(PRIVKEY, paths, workers=1),
+                             expected)
+            for path, signature in zip(paths, expected):
+                self.assertEqual(keys.sign_sha256_file(PRIVKEY, path),
+                                 signature)
+                self.assertTrue(keys.verify_sha256_file(PUBKEY, signature,
+                                                        path))
+            self.assertFalse(keys.verify_sha256_file(PUBKEY, expected[0],
+                                                     paths[1]))
+        finally:
+            shutil.rmtree(tempdir)
+
     def test_compatibility(self):
 
         # https://github.com/Storj/service-middleware/blob/master/test/authenticate.unit.js#L476
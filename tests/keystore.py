@@ -0,0 +1,138 @@
+import os
+import shutil
+import tempfile
+import unittest
+from micropayment_core import keys
+from micropayment_core import keystore
+
+
+STORE_KEY = "11" * 32
+
+
+class TestKeyStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, "keys.store")
+        self.privkeys = [keys.generate_privkey() for _ in range(20)]
+        self.pubkeys = keys.pubkeys_from_privkeys(self.privkeys)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _check_lookups(self, store):
+        self.assertEqual(len(store), len(self.privkeys))
+        for privkey, pubkey in zip(self.privkeys, self.pubkeys):
+            hash160 = keys.b2h(keys.encoding.hash160(keys.h2b(pubkey)))
+            self.assertEqual(store.privkey_for_pubkey(pubkey), privkey)
+            self.assertEqual(store.privkey_for_hash160(hash160), privkey)
+        self.assertEqual(store.privkey_for_pubkey("02" + "00" * 32), None)
+        self.assertEqual(store.privkey_for_hash160("00" * 20), None)
+        self.assertEqual(sorted(p for p, _, _ in store), sorted(self.privkeys))
+
+    def test_create(self):
+        count = keystore.create(self.path, self.privkeys + self.privkeys[:3])
+        self.assertEqual(count, len(self.privkeys))
+        with keystore.KeyStore(self.path) as store:
+            self._check_lookups(store)
+
+    def test_encrypted(self):
+        keystore.create(self.path, self.privkeys, key=STORE_KEY)
+        with open(self.path, "rb") as f:
+            data = f.read()
+        for privkey in self.privkeys:
+            self.assertNotIn(keys.h2b(privkey), data)
+        with keystore.KeyStore(self.path, key=STORE_KEY) as store:
+            self._check_lookups(store)
+        self.assertRaises(ValueError, keystore.KeyStore, self.path)
+        self.assertRaises(ValueError, keystore.KeyStore, self.path,
+                          key="22" * 32)
+
+    def test_invalid_key_length(self):
+        for key in ["", "11" * 16, "11" * 33]:
+            self.assertRaises(ValueError, keystore.create, self.path,
+                              self.privkeys, key=key)
+            self.assertRaises(ValueError, keystore.import_keys, self.path,
+                              key=key)
+        self.assertFalse(os.path.exists(self.path))
+        keystore.create(self.path, self.privkeys, key=STORE_KEY)
+        self.assertRaises(ValueError, keystore.KeyStore, self.path,
+                          key="11" * 16)
+
+    def test_import_keys(self):
+        wifs = [keys.privkey_to_wif(p) for p in self.privkeys[:10]]
+        pems = [keys.privkey_to_pem(p) for p in self.privkeys[10:15]]
+        ders = [keys.privkey_to_der(p) for p in self.privkeys[15:]]
+        keystore.import_keys(self.path, wifs=wifs, pems=pems, ders=ders,
+                             key=STORE_KEY)
+        with keystore.KeyStore(self.path, key=STORE_KEY) as store:
+            self._check_lookups(store)
+
+    def test_empty(self):
+        self.privkeys, self.pubkeys = [], []
+        keystore.create(self.path, [])
+        with keystore.KeyStore(self.path) as store:
+            self._check_lookups(store)
+
+    def _corrupt(self, offset):
+        with open(self.path, "r+b") as f:
+            f.seek(offset)
+            byte = bytearray(f.read(1))[0]
+            f.seek(offset)
+            f.write(bytearray([byte ^ 1]))
+
+    def test_corrupted_record(self):
+        for key in [None, STORE_KEY]:
+            keystore.create(self.path, self.privkeys, key=key)
+            with keystore.KeyStore(self.path, key=key) as store:
+                pubkey = list(store)[0][1]
+            self._corrupt(keystore._HEADER.size)  # secret of record 0
+            with keystore.KeyStore(self.path, key=key) as store:
+                self.assertRaises(ValueError, store.privkey_for_pubkey,
+                                  pubkey)
+                self.assertRaises(ValueError, list, store)
+                # other records are still readable
+                index = 1 if self.pubkeys[0] == pubkey else 0
+                self.assertEqual(
+                    store.privkey_for_pubkey(self.pubkeys[index]),
+                    self.privkeys[index]
+                )
+
+    def test_encrypted_record_tag(self):
+        keystore.create(self.path, self.privkeys, key=STORE_KEY)
+        with keystore.KeyStore(self.path, key=STORE_KEY) as store:
+            record_size = store._record_size
+        self.assertEqual(record_size, keystore._RECORD_SIZE + 32)
+
+        # encrypted records are checked by tag, without deriving pubkeys
+        public_key = keystore._public_key
+        keystore._public_key = None
+        try:
+            with keystore.KeyStore(self.path, key=STORE_KEY) as store:
+                self._check_lookups(store)
+            for offset in [32, keystore._RECORD_SIZE]:  # pubkey and tag
+                keystore.create(self.path, self.privkeys, key=STORE_KEY)
+                self._corrupt(keystore._HEADER.size + offset)
+                with keystore.KeyStore(self.path, key=STORE_KEY) as store:
+                    self.assertRaises(ValueError, list, store)
+        finally:
+            keystore._public_key = public_key
+
+    def test_corrupted_index(self):
+        keystore.create(self.path, self.privkeys, key=STORE_KEY)
+        with keystore.KeyStore(self.path, key=STORE_KEY) as store:
+            index_offset = store._index_offset
+        self._corrupt(index_offset + keystore._INDEX_ENTRY.size - 1)
+        with keystore.KeyStore(self.path, key=STORE_KEY) as store:
+            hash160 = keys.b2h(store._index_hash160(0))
+            self.assertRaises(ValueError, store.privkey_for_hash160, hash160)
+
+    def test_invalid_file(self):
+        for data in [b"", b"invalid", keystore._MAGIC + b"\0" * 100]:
+            with open(self.path, "wb") as f:
+                f.write(data)
+            self.assertRaises(ValueError, keystore.KeyStore, self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,17 @@
+import copy
 import json
+import pickle
+import threading
 import unittest
+from micropayment_core import keys
 from micropayment_core import scripts
 from micropayment_core import util
+from pycoin import encoding
+from pycoin.serialize import b2h, h2b
+from pycoin.tx import Tx, TxIn, TxOut
+from pycoin.tx.pay_to import ScriptPayToAddress, ScriptPayToScript
+from pycoin.tx.pay_to import SUBCLASSES
+from pycoin.tx.script import tools
 
 
 FIXTURES = json.load(open("tests/fixtures.json"))
@@ -14,11 +24,25 @@ def _get_txs_func(txids):
     return result
 
 
+def _sign_argument_order(name):
+    order = ["payer_wif", "payee_wif", "rawtx", "deposit_script_hex",
+             "commit_script_hex", "revoke_secret", "spend_secret"]
+    return order.index(name)
+
+
 class TestScripts(unittest.TestCase):
 
     def test_validate_deposit_script(self):
         scripts.validate_deposit_script(FIXTURES["deposit"]["script_hex"])
 
+    def test_validate_deposit_script_without_expire_time(self):
+        scripts.validate_deposit_script(FIXTURES["deposit"]["script_hex"],
+                                        validate_expire_time=False)
+        self.assertRaises(scripts.InvalidScript,
+                          scripts.validate_deposit_script,
+                          FIXTURES["commit"]["script_hex"],
+                          validate_expire_time=False)
+
     def test_validate_commit_script(self):
         scripts.validate_commit_script(FIXTURES["commit"]["script_hex"])
 
@@ -42,6 +66,199 @@ class TestScripts(unittest.TestCase):
             scripts._validate(reference_script_hex, deposit_script_hex)
         self.assertRaises(scripts.InvalidScript, function)
 
+    def test_parse_deposit_script(self):
+        deposit = FIXTURES["deposit"]
+        parsed = scripts.parse_deposit_script(deposit["script_hex"])
+        self.assertEqual(util.b2h(parsed.script), deposit["script_hex"])
+        self.assertEqual(util.b2h(parsed.payer_pubkey),
+                         deposit["payer_pubkey"])
+        self.assertEqual(util.b2h(parsed.payee_pubkey),
+                         deposit["payee_pubkey"])
+        self.assertEqual(util.b2h(parsed.spend_secret_hash),
+                         deposit["spend_secret_hash"])
+        self.assertEqual(parsed.expire_time, deposit["expire_time"])
+
+        # accepts binary scripts and is immutable
+        same = scripts.parse_deposit_script(util.h2b(deposit["script_hex"]))
+        self.assertEqual(parsed, same)
+        view = memoryview(util.h2b(deposit["script_hex"]))
+        self.assertEqual(scripts.parse_deposit_script(view), parsed)
+        self.assertEqual(scripts.validate_deposit_scripts([view]), [None])
+
+        def function():
+            parsed.expire_time = 0
+        self.assertRaises(AttributeError, function)
+
+    def test_parse_deposit_script_mismatched_payer_pubkey(self):
+        deposit = FIXTURES["deposit"]
+        payer_pubkey = deposit["payer_pubkey"]
+        other_pubkey = keys.pubkey_from_privkey(keys.generate_privkey())
+        script_hex = deposit["script_hex"]
+        index = script_hex.rindex(payer_pubkey)  # expire branch checksig
+        script_hex = (script_hex[:index] + other_pubkey +
+                      script_hex[index + len(payer_pubkey):])
+        self.assertRaises(scripts.InvalidScript,
+                          scripts.parse_deposit_script, script_hex)
+        self.assertRaises(scripts.InvalidScript,
+                          scripts.validate_deposit_script, script_hex,
+                          validate_expire_time=False)
+        results = scripts.validate_deposit_scripts([script_hex])
+        self.assertTrue(isinstance(results[0], scripts.InvalidScript))
+
+    def test_parsed_script_record(self):
+        deposit = FIXTURES["deposit"]
+        parsed = scripts.parse_deposit_script(deposit["script_hex"])
+        commit = scripts.parse_commit_script(FIXTURES["commit"]["script_hex"])
+        self.assertEqual(pickle.loads(pickle.dumps(parsed)), parsed)
+        self.assertEqual(hash(copy.copy(parsed)), hash(parsed))
+        self.assertFalse(parsed != copy.copy(parsed))
+        self.assertTrue(parsed != commit)
+        self.assertTrue(repr(parsed).startswith(
+            "ParsedDepositScript(script="
+        ))
+        self.assertIn("expire_time={0}".format(deposit["expire_time"]),
+                      repr(parsed))
+
+        def function():
+            del parsed.expire_time
+        self.assertRaises(AttributeError, function)
+        self.assertRaises(TypeError, scripts.ParsedDepositScript, b"")
+
+    def test_parse_commit_script(self):
+        commit = FIXTURES["commit"]
+        parsed = scripts.parse_commit_script(commit["script_hex"])
+        self.assertEqual(util.b2h(parsed.script), commit["script_hex"])
+        self.assertEqual(util.b2h(parsed.payer_pubkey), commit["payer_pubkey"])
+        self.assertEqual(util.b2h(parsed.payee_pubkey), commit["payee_pubkey"])
+        self.assertEqual(util.b2h(parsed.spend_secret_hash),
+                         commit["spend_secret_hash"])
+        self.assertEqual(util.b2h(parsed.revoke_secret_hash),
+                         commit["revoke_secret_hash"])
+        self.assertEqual(parsed.delay_time, commit["delay_time"])
+        view = memoryview(util.h2b(commit["script_hex"]))
+        self.assertEqual(scripts.parse_commit_script(view), parsed)
+
+    def test_parse_commit_script_invalid(self):
+
+        def function():
+            scripts.parse_commit_script(FIXTURES["deposit"]["script_hex"])
+        self.assertRaises(scripts.InvalidScript, function)
+
+    def test_validate_uncompressed_pubkeys(self):
+        deposit = FIXTURES["deposit"]
+        uncompressed = keys.uncompress_pubkey(deposit["payer_pubkey"])
+        deposit_script_hex = scripts.compile_deposit_script(
+            uncompressed, deposit["payee_pubkey"],
+            deposit["spend_secret_hash"], deposit["expire_time"]
+        )
+        payer_pubkey = scripts.get_deposit_payer_pubkey(deposit_script_hex)
+        self.assertEqual(payer_pubkey, uncompressed)
+
+    def test_validate_incorrect_push_length(self):
+        commit = FIXTURES["commit"]
+
+        def function():
+            commit_script_hex = scripts.compile_commit_script(
+                commit["payer_pubkey"], commit["payee_pubkey"],
+                commit["spend_secret_hash"] + "f4",
+                commit["revoke_secret_hash"], commit["delay_time"]
+            )
+            scripts.validate_commit_script(commit_script_hex)
+        self.assertRaises(scripts.InvalidScript, function)
+
+    def test_validate_invalid_sequence_opcode(self):
+        commit = FIXTURES["commit"]
+        commit_script_hex = scripts.compile_commit_script(
+            commit["payer_pubkey"], commit["payee_pubkey"],
+            commit["spend_secret_hash"], commit["revoke_secret_hash"], 5
+        )
+        # OP_5 OP_CHECKSEQUENCEVERIFY -> OP_1NEGATE OP_CHECKSEQUENCEVERIFY
+        commit_script_hex = commit_script_hex.replace("55b2", "4fb2")
+        self.assertRaises(scripts.InvalidScript,
+                          scripts.validate_commit_script, commit_script_hex)
+        self.assertRaises(scripts.InvalidScript, scripts.parse_commit_script,
+                          bytearray(util.h2b(commit_script_hex)))
+
+    def test_validate_truncated_script(self):
+
+        def function():
+            deposit_script_hex = FIXTURES["deposit"]["script_hex"][:-10]
+            scripts.validate_deposit_script(deposit_script_hex)
+        self.assertRaises(scripts.InvalidScript, function)
+
+    def test_script_cache(self):
+        deposit_script_hex = FIXTURES["deposit"]["script_hex"]
+        commit_script_hex = FIXTURES["commit"]["script_hex"]
+        self.assertEqual(scripts.script_cache_stats(), None)
+        scripts.enable_script_cache(maxsize=1)
+        try:
+            scripts.validate_deposit_script(deposit_script_hex)
+            scripts.get_deposit_payer_pubkey(deposit_script_hex)
+            scripts.get_deposit_expire_time(deposit_script_hex)
+            scripts.get_commit_delay_time(commit_script_hex)
+            self.assertRaises(scripts.InvalidScript,
+                              scripts.validate_deposit_script,
+                              commit_script_hex)
+            stats = scripts.script_cache_stats()
+        finally:
+            scripts.disable_script_cache()
+        self.assertEqual(stats, {
+            "hits": 2, "misses": 3, "evictions": 1, "size": 1, "maxsize": 1
+        })
+
+    def _batch_commit_scripts(self):
+        commit = FIXTURES["commit"]
+        delay_times = [0, 5, 16, 17, 255, 256, 0xFFFF]
+        valid = [scripts.compile_commit_script(
+            commit["payer_pubkey"], commit["payee_pubkey"],
+            commit["spend_secret_hash"], commit["revoke_secret_hash"], t
+        ) for t in delay_times]
+        valid.append(scripts.compile_commit_script(
+            keys.uncompress_pubkey(commit["payer_pubkey"]),
+            commit["payee_pubkey"], commit["spend_secret_hash"],
+            commit["revoke_secret_hash"], 5
+        ))
+        invalid = [
+            commit["script_hex_gt_max_sequence"],
+            commit["script_hex_lt_min_sequence"],
+            commit["script_hex"][:-2],
+            FIXTURES["deposit"]["script_hex"],
+        ]
+        return valid, invalid
+
+    def _check_batch_commit_scripts(self):
+        valid, invalid = self._batch_commit_scripts()
+        results = scripts.validate_commit_scripts(valid + invalid)
+        self.assertEqual(results[:len(valid)], [None] * len(valid))
+        self.assertEqual([type(e) for e in results[len(valid):]], [
+            scripts.InvalidSequenceValue, scripts.InvalidSequenceValue,
+            scripts.InvalidScript, scripts.InvalidScript
+        ])
+        results = scripts.validate_commit_scripts(
+            invalid[:2], validate_delay_time=False
+        )
+        self.assertEqual(results, [None, None])
+
+    def test_validate_commit_scripts(self):
+        self._check_batch_commit_scripts()
+
+    def test_validate_commit_scripts_without_numpy(self):
+        numpy = scripts.numpy
+        scripts.numpy = None
+        try:
+            self._check_batch_commit_scripts()
+        finally:
+            scripts.numpy = numpy
+
+    def test_validate_deposit_scripts(self):
+        deposit_script_hex = FIXTURES["deposit"]["script_hex"]
+        results = scripts.validate_deposit_scripts([
+            deposit_script_hex, util.h2b(deposit_script_hex),
+            FIXTURES["commit"]["script_hex"]
+        ])
+        self.assertEqual(results[:2], [None, None])
+        self.assertTrue(isinstance(results[2], scripts.InvalidScript))
+
     def test_get_spend_secret_revoke_rawtx(self):
         rr = FIXTURES["sign"]["revoke_recover"]
         revoke_rawtx = rr["expected"]
@@ -63,6 +280,122 @@ class TestScripts(unittest.TestCase):
                                                 commit_script_hex)
         self.assertEqual(spend_secret, expected)
 
+    def test_get_spend_secret_bytes(self):
+        expected = FIXTURES["payout"]["spend_secret"]
+        payout_rawtx = util.h2b(FIXTURES["payout"]["rawtx"])
+        commit_script = util.h2b(FIXTURES["payout"]["commit_script_hex"])
+        spend_secret = scripts.get_spend_secret_bytes(payout_rawtx,
+                                                      commit_script)
+        self.assertEqual(util.b2h(spend_secret), expected)
+
+    def test_payout_scanner(self):
+        payout_rawtx = FIXTURES["payout"]["rawtx"]
+        commit_script_hex = FIXTURES["payout"]["commit_script_hex"]
+        scanner = scripts.PayoutScanner([
+            commit_script_hex, FIXTURES["commit"]["script_hex"]
+        ])
+        self.assertEqual(len(scanner), 2)
+        rawtxs = [
+            FIXTURES["sign"]["revoke_recover"]["expected"],
+            FIXTURES["payout"]["bad_rawtx"],
+            payout_rawtx,
+        ]
+        results = list(scanner.scan(iter(rawtxs)))
+        self.assertEqual(results, [(
+            util.gettxid(payout_rawtx), 0, commit_script_hex,
+            FIXTURES["payout"]["spend_secret"]
+        )])
+
+        scanner.remove(commit_script_hex)
+        self.assertEqual(list(scanner.scan(rawtxs)), [])
+
+    def test_payout_scanner_invalid_scriptsig(self):
+        commit_script_hex = FIXTURES["payout"]["commit_script_hex"]
+        scanner = scripts.PayoutScanner([commit_script_hex])
+        self.assertEqual(scanner._match_payout(util.h2b("4c05f483")), None)
+
+        # spend secret pushed as small number opcode
+        tx = Tx.from_hex(FIXTURES["payout"]["rawtx"])
+        sig = scripts.ScriptView(tx.txs_in[0].script).data(0).tobytes()
+        script_bin = (tools.bin_script([sig]) + b"\x51\x51" +
+                      tools.bin_script([util.h2b(commit_script_hex)]))
+        self.assertEqual(scanner._match_payout(script_bin), None)
+
+    def test_commit_index(self):
+        rr = FIXTURES["sign"]["revoke_recover"]["input"]
+        commit_script_hex = rr["commit_script_hex"]
+        commit_txid = ("d8a547711721625dd19afcea56233bc9"
+                       "a96d315bf3e6e0cf3a8193c59c9b7f32")
+        commit_rawtx = FIXTURES["transactions"][commit_txid]
+        commit = FIXTURES["commit"]
+        other_commit_script_hex = scripts.compile_commit_script(
+            commit["payer_pubkey"], commit["payee_pubkey"],
+            commit["spend_secret_hash"], util.hash160hex("f483"),
+            commit["delay_time"]
+        )
+        index = scripts.CommitIndex([other_commit_script_hex])
+        index.add(commit_script_hex)
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.scan_tx(commit_rawtx),
+                         [(0, commit_script_hex, None)])
+
+        # revoke secret revealed
+        self.assertFalse(index.add_revoke_secret("deadbeef"))
+        self.assertTrue(index.add_revoke_secret(rr["revoke_secret"]))
+        address = util.script_address(commit_script_hex, netcode="XTN")
+        expected = (commit_script_hex, rr["revoke_secret"])
+        self.assertEqual(index.find_by_address(address), expected)
+        revoke_secret_hash = util.hash160hex(rr["revoke_secret"])
+        self.assertEqual(index.find_by_revoke_secret_hash(revoke_secret_hash),
+                         expected)
+
+        index.remove(commit_script_hex)
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.scan_tx(commit_rawtx), [])
+        self.assertEqual(index.find_by_address(address), None)
+        self.assertEqual(index.find_by_revoke_secret_hash(revoke_secret_hash),
+                         None)
+
+        # revoke secret given with the commit, returned as lowercase hex
+        index.add(commit_script_hex.upper(),
+                  revoke_secret=rr["revoke_secret"].upper())
+        self.assertEqual(index.scan_tx(commit_rawtx),
+                         [(0, commit_script_hex, rr["revoke_secret"])])
+
+    def test_commit_index_reused_revoke_secret_hash(self):
+        rr = FIXTURES["sign"]["revoke_recover"]["input"]
+        commit_script_hex = rr["commit_script_hex"]
+        commit = scripts.parse_commit_script(commit_script_hex)
+        newer_commit_script_hex = scripts.compile_commit_script(
+            util.b2h(commit.payer_pubkey), util.b2h(commit.payee_pubkey),
+            util.b2h(commit.spend_secret_hash),
+            util.b2h(commit.revoke_secret_hash), commit.delay_time + 1
+        )
+        revoke_secret_hash = util.hash160hex(rr["revoke_secret"])
+
+        # remove the older commit
+        index = scripts.CommitIndex([commit_script_hex])
+        index.add(newer_commit_script_hex, revoke_secret=rr["revoke_secret"])
+        index.remove(commit_script_hex)
+        self.assertEqual(index.find_by_revoke_secret_hash(revoke_secret_hash),
+                         (newer_commit_script_hex, rr["revoke_secret"]))
+
+        # remove the newer commit
+        index = scripts.CommitIndex([commit_script_hex])
+        index.add(newer_commit_script_hex, revoke_secret=rr["revoke_secret"])
+        index.remove(newer_commit_script_hex)
+        expected = (commit_script_hex, rr["revoke_secret"])
+        self.assertEqual(index.find_by_revoke_secret_hash(revoke_secret_hash),
+                         expected)
+        self.assertEqual(index.find_by_hash160(
+            util.hash160hex(commit_script_hex)), expected)
+
+        # revoke entry dropped with the last commit using it
+        index.remove(commit_script_hex)
+        self.assertEqual(index.find_by_revoke_secret_hash(revoke_secret_hash),
+                         None)
+        self.assertFalse(index.add_revoke_secret(rr["revoke_secret"]))
+
     def test_get_commit_payer_pubkey(self):
         commit_script_hex = FIXTURES["commit"]["script_hex"]
         expected = FIXTURES["commit"]["payer_pubkey"]
@@ -128,6 +461,88 @@ class TestScripts(unittest.TestCase):
         )
         self.assertEqual(deposit_script, expected)
 
+    def test_compile_script_bytes_matches_asm(self):
+        commit = FIXTURES["commit"]
+        payer_pubkey = keys.uncompress_pubkey(commit["payer_pubkey"])
+        for delay_time in [0, 1, 16, 17, 127, 128, 255, 256, 32767, 32768,
+                           0xFFFF]:
+            script_asm = scripts.COMMIT_SCRIPT.format(
+                payer_pubkey=payer_pubkey,
+                payee_pubkey=commit["payee_pubkey"],
+                spend_secret_hash=commit["spend_secret_hash"],
+                revoke_secret_hash=commit["revoke_secret_hash"],
+                delay_time=str(delay_time)
+            )
+            commit_script = scripts.compile_commit_script_bytes(
+                util.h2b(payer_pubkey), util.h2b(commit["payee_pubkey"]),
+                util.h2b(commit["spend_secret_hash"]),
+                util.h2b(commit["revoke_secret_hash"]), delay_time
+            )
+            self.assertEqual(commit_script, scripts.tools.compile(script_asm))
+
+    def test_compile_deposit_script_bytes(self):
+        deposit = FIXTURES["deposit"]
+        deposit_script = scripts.compile_deposit_script_bytes(
+            util.h2b(deposit["payer_pubkey"]),
+            util.h2b(deposit["payee_pubkey"]),
+            util.h2b(deposit["spend_secret_hash"]), deposit["expire_time"]
+        )
+        self.assertEqual(util.b2h(deposit_script), deposit["script_hex"])
+
+    def test_compile_script_bytes_strict(self):
+        deposit = FIXTURES["deposit"]
+        payer_pubkey = util.h2b(deposit["payer_pubkey"])
+        payee_pubkey = util.h2b(deposit["payee_pubkey"])
+        spend_secret_hash = util.h2b(deposit["spend_secret_hash"])
+        self.assertRaises(
+            ValueError, scripts.compile_deposit_script_bytes,
+            payer_pubkey[:32], payee_pubkey, spend_secret_hash, 5
+        )
+        self.assertRaises(
+            ValueError, scripts.compile_deposit_script_bytes,
+            payer_pubkey, payee_pubkey, spend_secret_hash + b"\x00", 5
+        )
+        self.assertRaises(
+            ValueError, scripts.compile_deposit_script_bytes,
+            payer_pubkey, payee_pubkey, spend_secret_hash, "5"
+        )
+        self.assertRaises(
+            scripts.InvalidSequenceValue, scripts.compile_deposit_script_bytes,
+            payer_pubkey, payee_pubkey, spend_secret_hash, 0xFFFF + 1
+        )
+
+    def test_commit_chain(self):
+        commit = FIXTURES["commit"]
+        chain = scripts.CommitChain(
+            commit["payer_pubkey"], commit["payee_pubkey"],
+            commit["spend_secret_hash"], commit["delay_time"], netcode="XTN"
+        )
+        commit_script_hex, address, revoke_secret_hash = chain.commit(
+            commit["revoke_secret_hash"]
+        )
+        self.assertEqual(commit_script_hex, commit["script_hex"])
+        self.assertEqual(address, util.script_address(commit_script_hex,
+                                                      netcode="XTN"))
+        self.assertEqual(revoke_secret_hash, commit["revoke_secret_hash"])
+
+        revoke_secret_hashes = (util.hash160hex("{0:04x}".format(i))
+                                for i in range(10))
+        commits = list(chain.stream(revoke_secret_hashes, count=3))
+        self.assertEqual(len(commits), 3)
+        for commit_script_hex, address, revoke_secret_hash in commits:
+            expected = scripts.compile_commit_script(
+                commit["payer_pubkey"], commit["payee_pubkey"],
+                commit["spend_secret_hash"], revoke_secret_hash,
+                commit["delay_time"]
+            )
+            self.assertEqual(commit_script_hex, expected)
+        self.assertRaises(ValueError, chain.commit, "f483")
+        self.assertRaises(
+            ValueError, scripts.CommitChain, commit["payer_pubkey"],
+            commit["payee_pubkey"], commit["spend_secret_hash"],
+            commit["delay_time"], netcode="UNKNOWN"
+        )
+
     def test_get_commit_delay_time_gt_max_sequence(self):
 
         def function():
@@ -251,6 +666,283 @@ class TestScripts(unittest.TestCase):
         )
         self.assertTrue(rawtx, FIXTURES["sign"]["expire_recover"]["expected"])
 
+    def test_sign_bytes(self):
+        sign_funcs = [
+            ("deposit", scripts.sign_deposit,
+             scripts.sign_deposit_bytes),
+            ("created_commit", scripts.sign_created_commit,
+             scripts.sign_created_commit_bytes),
+            ("finalize_commit", scripts.sign_finalize_commit,
+             scripts.sign_finalize_commit_bytes),
+            ("revoke_recover", scripts.sign_revoke_recover,
+             scripts.sign_revoke_recover_bytes),
+            ("payout_recover", scripts.sign_payout_recover,
+             scripts.sign_payout_recover_bytes),
+            ("change_recover", scripts.sign_change_recover,
+             scripts.sign_change_recover_bytes),
+            ("expire_recover", scripts.sign_expire_recover,
+             scripts.sign_expire_recover_bytes),
+        ]
+        for name, sign_func, sign_bytes_func in sign_funcs:
+            kwargs = FIXTURES["sign"][name]["input"]
+            args = [kwargs[key] if key.endswith("_wif") else h2b(kwargs[key])
+                    for key in sorted(kwargs, key=_sign_argument_order)]
+            rawtx_bin = sign_bytes_func(_get_txs_func, *args)
+            self.assertTrue(isinstance(rawtx_bin, bytes))
+            self.assertEqual(b2h(rawtx_bin),
+                             sign_func(_get_txs_func, **kwargs))
+
+    def test_sign_concurrent(self):
+        names = ["created_commit", "finalize_commit", "revoke_recover",
+                 "payout_recover", "change_recover", "expire_recover"]
+        sign_funcs = {
+            "created_commit": scripts.sign_created_commit,
+            "finalize_commit": scripts.sign_finalize_commit,
+            "revoke_recover": scripts.sign_revoke_recover,
+            "payout_recover": scripts.sign_payout_recover,
+            "change_recover": scripts.sign_change_recover,
+            "expire_recover": scripts.sign_expire_recover,
+        }
+
+        def sign(name):
+            kwargs = FIXTURES["sign"][name]["input"]
+            return sign_funcs[name](_get_txs_func, **kwargs)
+
+        expected = dict((name, sign(name)) for name in names)
+        subclasses = list(SUBCLASSES)
+        results = []
+        lock = threading.Lock()
+
+        def worker():
+            for name in names:
+                rawtx = sign(name)
+                with lock:
+                    results.append((name, rawtx))
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), len(names) * 4)
+        for name, rawtx in results:
+            self.assertEqual(rawtx, expected[name])
+        self.assertEqual(subclasses, list(SUBCLASSES))
+
+    def test_sign_mixed_inputs(self):
+        kwargs = FIXTURES["sign"]["expire_recover"]["input"]
+        tx = util.load_tx(_get_txs_func, kwargs["rawtx"])
+        deposit = scripts.parse_deposit_script(kwargs["deposit_script_hex"])
+        spend = scripts._ScriptSpend(deposit)
+        hash160_lookup = scripts._hash160_lookup(kwargs["payer_wif"])
+        pubkey_bin = util.h2b(keys.pubkey_from_wif(kwargs["payer_wif"]))
+        commit_script_bin = util.h2b(FIXTURES["commit"]["script_hex"])
+        commit_hash160 = encoding.hash160(commit_script_bin)
+        spend.p2sh_lookup[commit_hash160] = commit_script_bin
+        tx_out_scripts = [
+            ScriptPayToAddress(encoding.hash160(pubkey_bin)).script(),
+            ScriptPayToAddress(b"\x11" * 20).script(),  # unknown key
+            ScriptPayToScript(commit_hash160).script(),  # other script type
+        ]
+        for index, tx_out_script in enumerate(tx_out_scripts):
+            tx.txs_in.append(TxIn(bytes(bytearray([index + 1] * 32)), 0))
+            tx.unspents.append(TxOut(1000, tx_out_script))
+
+        # p2sh deposit input and p2pkh input signed, others left unsigned
+        spend.sign(tx, hash160_lookup, spend_type="expire", spend_secret=None)
+        signed = [tx.is_signature_ok(i) for i in range(len(tx.txs_in))]
+        self.assertEqual(signed, [True, True, False, False])
+        rawtx = tx.as_hex()
+        spend.sign(tx, hash160_lookup, spend_type="expire", spend_secret=None)
+        self.assertEqual(tx.as_hex(), rawtx)
+
+        # p2sh inputs of unknown scripts are left to pycoin
+        tx.txs_in.append(TxIn(b"\x04" * 32, 0))
+        tx_out_script = ScriptPayToScript(b"\x22" * 20).script()
+        tx.unspents.append(TxOut(1000, tx_out_script))
+
+        def function():
+            spend.sign(tx, hash160_lookup, spend_type="expire",
+                       spend_secret=None)
+        self.assertRaises(ValueError, function)
+
+    def test_sign_skips_empty_unspent(self):
+
+        class EmptyTxOut(TxOut):
+
+            def __bool__(self):
+                return False
+            __nonzero__ = __bool__  # python 2
+
+        kwargs = FIXTURES["sign"]["expire_recover"]["input"]
+        tx = util.load_tx(_get_txs_func, kwargs["rawtx"])
+        deposit = scripts.parse_deposit_script(kwargs["deposit_script_hex"])
+        spend = scripts._ScriptSpend(deposit)
+        hash160_lookup = scripts._hash160_lookup(kwargs["payer_wif"])
+        pubkey_bin = util.h2b(keys.pubkey_from_wif(kwargs["payer_wif"]))
+        tx_out_script = ScriptPayToAddress(encoding.hash160(pubkey_bin))
+        tx.txs_in.append(TxIn(b"\x01" * 32, 0))
+        tx.unspents.append(EmptyTxOut(1000, tx_out_script.script()))
+        spend.sign(tx, hash160_lookup, spend_type="expire", spend_secret=None)
+        self.assertTrue(tx.is_signature_ok(0))
+        self.assertEqual(tx.txs_in[1].script, b"")
+
+    def test_sign_batch(self):
+        batch_funcs = [
+            ("created_commit", scripts.sign_created_commit,
+             scripts.sign_created_commits),
+            ("finalize_commit", scripts.sign_finalize_commit,
+             scripts.sign_finalize_commits),
+            ("revoke_recover", scripts.sign_revoke_recover,
+             scripts.sign_revoke_recovers),
+            ("payout_recover", scripts.sign_payout_recover,
+             scripts.sign_payout_recovers),
+            ("change_recover", scripts.sign_change_recover,
+             scripts.sign_change_recovers),
+            ("expire_recover", scripts.sign_expire_recover,
+             scripts.sign_expire_recovers),
+        ]
+        for name, sign_func, batch_func in batch_funcs:
+            kwargs = FIXTURES["sign"][name]["input"]
+            expected = sign_func(_get_txs_func, **kwargs)
+            for workers in [1, 2]:
+                results = batch_func(_get_txs_func, [kwargs] * 3,
+                                     workers=workers)
+                self.assertEqual(results, [expected] * 3)
+
+            # binary batch, same arguments as bytes named *_bin
+            bytes_batch_func = getattr(scripts, batch_func.__name__ + "_bytes")
+            kwargs_bin = dict(
+                (key, value) if key.endswith("_wif") else
+                (key.replace("_hex", "") + "_bin", h2b(value))
+                for key, value in kwargs.items()
+            )
+            results = bytes_batch_func(_get_txs_func, [kwargs_bin] * 2,
+                                       workers=1)
+            self.assertEqual(results, [h2b(expected)] * 2)
+
+    def test_channel_signer(self):
+        sign = FIXTURES["sign"]
+        deposit_script_hex = FIXTURES["deposit"]["script_hex"]
+
+        kwargs = sign["created_commit"]["input"]
+        signer = scripts.ChannelSigner(kwargs["payer_wif"],
+                                       kwargs["deposit_script_hex"])
+        self.assertEqual(
+            signer.create_commit(_get_txs_func, kwargs["rawtx"]),
+            scripts.sign_created_commit(_get_txs_func, **kwargs)
+        )
+
+        kwargs = sign["finalize_commit"]["input"]
+        signer = scripts.ChannelSigner(kwargs["payee_wif"],
+                                       kwargs["deposit_script_hex"])
+        self.assertEqual(
+            signer.finalize_commit(_get_txs_func, kwargs["rawtx"]),
+            scripts.sign_finalize_commit(_get_txs_func, **kwargs)
+        )
+        kwargs = sign["finalize_commit_bad_sigvalue"]["input"]
+        self.assertRaises(scripts.InvalidPayerSignature,
+                          signer.finalize_commit, _get_txs_func,
+                          kwargs["rawtx"])
+
+        kwargs = sign["revoke_recover"]["input"]
+        signer = scripts.ChannelSigner(kwargs["payer_wif"],
+                                       deposit_script_hex)
+        for _ in range(2):  # second call uses the cached commit script
+            self.assertEqual(
+                signer.recover_revoke(_get_txs_func, kwargs["rawtx"],
+                                      kwargs["commit_script_hex"],
+                                      kwargs["revoke_secret"]),
+                scripts.sign_revoke_recover(_get_txs_func, **kwargs)
+            )
+
+        kwargs = sign["payout_recover"]["input"]
+        signer = scripts.ChannelSigner(kwargs["payee_wif"],
+                                       deposit_script_hex)
+        self.assertEqual(
+            signer.recover_payout(_get_txs_func, kwargs["rawtx"],
+                                  kwargs["commit_script_hex"],
+                                  kwargs["spend_secret"]),
+            scripts.sign_payout_recover(_get_txs_func, **kwargs)
+        )
+
+        kwargs = sign["change_recover"]["input"]
+        signer = scripts.ChannelSigner(kwargs["payer_wif"],
+                                       kwargs["deposit_script_hex"])
+        self.assertEqual(
+            signer.recover_change(_get_txs_func, kwargs["rawtx"],
+                                  kwargs["spend_secret"]),
+            scripts.sign_change_recover(_get_txs_func, **kwargs)
+        )
+
+        kwargs = sign["expire_recover"]["input"]
+        signer = scripts.ChannelSigner(kwargs["payer_wif"],
+                                       kwargs["deposit_script_hex"])
+        self.assertEqual(
+            signer.recover_expire(_get_txs_func, kwargs["rawtx"]),
+            scripts.sign_expire_recover(_get_txs_func, **kwargs)
+        )
+
+        self.assertRaises(scripts.InvalidScript, scripts.ChannelSigner,
+                          kwargs["payer_wif"],
+                          FIXTURES["commit"]["script_hex"])
+
+    def test_sign_batch_errors(self):
+        valid = FIXTURES["sign"]["finalize_commit"]["input"]
+        batch = [
+            valid,
+            FIXTURES["sign"]["finalize_commit_bad_sigvalue"]["input"],
+            valid,
+            FIXTURES["sign"]["finalize_commit_unsigned"]["input"],
+            {"payee_wif": valid["payee_wif"]},
+        ]
+        expected = scripts.sign_finalize_commit(_get_txs_func, **valid)
+        messages = [str(e) for e in scripts.sign_finalize_commits(
+            _get_txs_func, batch, workers=1
+        )[1::2]]
+        for workers in [1, 2]:
+            results = scripts.sign_finalize_commits(
+                _get_txs_func, batch, workers=workers, chunksize=1
+            )
+            self.assertEqual(results[0], expected)
+            self.assertEqual(results[2], expected)
+            self.assertIsInstance(results[1], scripts.InvalidPayerSignature)
+            self.assertIsInstance(results[3], scripts.InvalidScript)
+            self.assertIsInstance(results[4], KeyError)
+            self.assertEqual([str(e) for e in results[1::2]], messages)
+        self.assertTrue(messages[0].startswith("Invalid payer signature: "))
+        self.assertTrue(messages[1].startswith("Invalid script: '"))
+        self.assertFalse(messages[1].startswith("Invalid script: 'Invalid"))
+        self.assertEqual(scripts.sign_finalize_commits(_get_txs_func, []), [])
+        self.assertRaises(ValueError, scripts.sign_finalize_commits,
+                          _get_txs_func, batch, workers=0)
+        self.assertRaises(ValueError, scripts.sign_finalize_commits,
+                          _get_txs_func, batch, chunksize=0)
+        for e in [scripts.InvalidScript("f483"),
+                  scripts.InvalidPayerSignature("invalid signature"),
+                  scripts.InvalidSequenceValue(-1)]:
+            self.assertEqual(str(pickle.loads(pickle.dumps(e))), str(e))
+
+    def test_batch_worker(self):
+        kwargs = FIXTURES["sign"]["finalize_commit"]["input"]
+        tx = util.load_tx(_get_txs_func, kwargs["rawtx"])
+        txids = [util.b2h_rev(tx_in.previous_hash) for tx_in in tx.txs_in]
+        signer = scripts._BatchSigner(
+            "finalize_commit", [kwargs["payee_wif"]],
+            [h2b(kwargs["deposit_script_hex"])], _get_txs_func(txids)
+        )
+
+        # worker processes get the signer pickled, without its caches
+        scripts._init_batch_worker(pickle.loads(pickle.dumps(signer)))
+        try:
+            rawtx = scripts._sign_batch_item((0, 0, h2b(kwargs["rawtx"]), ()))
+        finally:
+            scripts._init_batch_worker(None)
+        self.assertEqual(b2h(rawtx), scripts.sign_finalize_commit(
+            _get_txs_func, **kwargs
+        ))
+
     def test_get_word(self):
 
         deposit_script = util.h2b(FIXTURES["deposit"]["script_hex"])
@@ -261,5 +953,24 @@ class TestScripts(unittest.TestCase):
             scripts.get_word(deposit_script, 21)
         self.assertRaises(ValueError, function)
 
+    def test_script_view(self):
+        deposit = FIXTURES["deposit"]
+        view = scripts.ScriptView(bytearray(util.h2b(deposit["script_hex"])))
+        self.assertEqual(len(view), 21)
+        self.assertEqual(view.opcode(0), 99)  # OP_IF
+        self.assertEqual(view.data(0), None)
+        self.assertEqual(view.data(2), util.h2b(deposit["payer_pubkey"]))
+        self.assertTrue(isinstance(view.data(2), memoryview))  # not copied
+        self.assertEqual(view.disassemble(20), "OP_ENDIF")
+        opcode, data, asm = view[9]
+        self.assertEqual(asm, "[{0}]".format(deposit["spend_secret_hash"]))
+
+    def test_script_view_truncated(self):
+
+        def function():
+            scripts.ScriptView(util.h2b("4c05f483"))  # OP_PUSHDATA1 5
+        self.assertRaises(scripts.ScriptError, function)
+
+
 if __name__ == "__main__":
     unittest.main()
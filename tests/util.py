@@ -1,4 +1,8 @@
 import json
+import os
+import shutil
+import tempfile
+import time
 import unittest
 from micropayment_core import util
 
@@ -6,6 +10,10 @@ from micropayment_core import util
 FIXTURES = json.load(open("tests/fixtures.json"))
 
 
+def _get_txs_func(txids):
+    return dict((txid, FIXTURES["transactions"][txid]) for txid in txids)
+
+
 class TestUtils(unittest.TestCase):
 
     def test_gettxid(self):
@@ -23,6 +31,92 @@ class TestUtils(unittest.TestCase):
         expected = "4e0123796bee558240c5945ac9aff553fcc6256d"
         self.assertEqual(hex_digest, expected)
 
+    def test_lru_cache(self):
+        cache = util.LRUCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(cache.get("a"), 1)  # "b" now least recently used
+        cache.put("c", 3)
+        self.assertEqual(cache.get("b"), None)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(cache.stats(), {
+            "hits": 2, "misses": 1, "evictions": 1, "size": 2, "maxsize": 2
+        })
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.stats()["hits"], 0)
+
+    def test_lru_cache_invalid_size(self):
+
+        def function():
+            util.LRUCache(maxsize=0)
+        self.assertRaises(ValueError, function)
+
+    def test_lru_cache_ttl(self):
+        cache = util.LRUCache(maxsize=2, ttl=0.05)
+        cache.put("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertTrue("a" in cache)
+        time.sleep(0.1)
+        self.assertFalse("a" in cache)
+        self.assertEqual(cache.get("a"), None)
+        self.assertEqual(cache.stats(), {
+            "hits": 1, "misses": 1, "evictions": 1, "size": 0, "maxsize": 2
+        })
+        self.assertRaises(ValueError, util.LRUCache, ttl=0)
+
+    def test_load_tx_txout_cache(self):
+        fetched = []
+
+        def get_txs_func(txids):
+            fetched.extend(txids)
+            return dict((txid, FIXTURES["transactions"][txid])
+                        for txid in txids)
+
+        rawtx = FIXTURES["sign"]["created_commit"]["input"]["rawtx"]
+        self.assertEqual(util.txout_cache_stats(), None)  # opt-in
+        util.enable_txout_cache(maxsize=8)
+        try:
+            expected = util.load_tx(get_txs_func, rawtx)
+            self.assertEqual(len(fetched), 1)
+            for _ in range(3):
+                tx = util.load_tx(get_txs_func, rawtx)
+                self.assertEqual(tx.as_hex(include_unspents=True),
+                                 expected.as_hex(include_unspents=True))
+            self.assertEqual(len(fetched), 1)
+            stats = util.txout_cache_stats()
+            self.assertEqual((stats["hits"], stats["misses"]), (3, 1))
+            self.assertEqual(stats["hit_rate"], 0.75)
+
+            # explicit caches are used instead of the default one
+            cache = util.LRUCache(maxsize=8, ttl=60)
+            util.load_tx(get_txs_func, rawtx, txout_cache=cache)
+            util.load_tx(get_txs_func, rawtx, txout_cache=cache)
+            self.assertEqual(len(fetched), 2)
+            self.assertEqual(cache.stats()["hits"], 1)
+
+            util.disable_txout_cache()
+            self.assertEqual(util.txout_cache_stats(), None)
+            util.load_tx(get_txs_func, rawtx)
+            self.assertEqual(len(fetched), 3)
+        finally:
+            util.disable_txout_cache()
+
+    def test_load_tx_unverified_not_cached(self):
+        rawtx = FIXTURES["sign"]["created_commit"]["input"]["rawtx"]
+        tx = util.load_tx(_get_txs_func, rawtx)
+        txid = util.b2h_rev(tx.txs_in[0].previous_hash)
+        other = [t for t in FIXTURES["transactions"] if t != txid][0]
+        cache = util.LRUCache(maxsize=8)
+
+        def wrong_txs_func(txids):
+            return {txid: FIXTURES["transactions"][other]}
+        try:
+            util.load_tx(wrong_txs_func, rawtx, txout_cache=cache)
+        except IndexError:  # output index may not exist in the wrong tx
+            pass
+        self.assertEqual(len(cache), 0)
+
     def test_to_satoshis(self):
         satoshis = util.to_satoshis(1.0)
         self.assertEqual(satoshis, 100000000)
@@ -31,6 +125,24 @@ class TestUtils(unittest.TestCase):
         amounts_sum = sum(util.to_satoshis(x) for x in amounts)
         self.assertEqual(amounts_sum, 102029371)
 
+    def test_write_file(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tempdir, "data")
+            util.write_file(path, b"f483")
+            util.write_file(path, b"f4")
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), b"f4")
+
+            # failed writes leave no temporary files behind
+            directory = os.path.join(tempdir, "directory")
+            os.mkdir(directory)
+            self.assertRaises(OSError, util.write_file, directory, b"f483")
+            self.assertEqual(sorted(os.listdir(tempdir)),
+                             ["data", "directory"])
+        finally:
+            shutil.rmtree(tempdir)
+
 
 if __name__ == "__main__":
     unittest.main()